@@ -0,0 +1,104 @@
+"""Microbenchmark for draining jobs out of the JobContainer.
+
+Compares the old approach of rescanning every job for one not yet accessed
+against the pending queue used by JobContainer.pop_next.
+
+Usage:
+
+    python contrib/benchmark_job_dispatch.py 10000 100000
+
+Note that the old scanning approach is quadratic so 100000 jobs takes a
+long time with it.
+"""
+
+import argparse
+import dataclasses
+import datetime
+import time
+import typing
+
+from speedcloud.api import schema
+from speedcloud.job_manager import JobContainer, JobQueueItem
+
+
+@dataclasses.dataclass
+class _ScannedJob:
+    data: JobQueueItem
+    accessed: bool = False
+
+
+class ScanningJobContainer:
+    """Copy of the previous JobContainer dispatch strategy."""
+
+    def __init__(self) -> None:
+        self._job_queue: typing.List[_ScannedJob] = []
+
+    def add(self, item: JobQueueItem) -> None:
+        self._job_queue.append(_ScannedJob(data=item))
+
+    def pop_next(self) -> typing.Iterator[JobQueueItem]:
+        for job in self._job_queue:
+            if job.accessed:
+                continue
+            job.accessed = True
+            yield job.data
+
+
+def create_jobs(count: int) -> typing.List[JobQueueItem]:
+    now = datetime.datetime.now()
+    return [
+        JobQueueItem(
+            job={"details": {}, "workflow": {"id": 0, "name": "dummy"}},
+            state=schema.JobState.QUEUED,
+            order=i,
+            job_id=str(i),
+            time_submitted=now,
+        )
+        for i in range(count)
+    ]
+
+
+def drain_scanning(jobs: typing.List[JobQueueItem]) -> float:
+    container = ScanningJobContainer()
+    for job in jobs:
+        container.add(job)
+    start = time.perf_counter()
+    while True:
+        try:
+            next(container.pop_next())
+        except StopIteration:
+            break
+    return time.perf_counter() - start
+
+
+def drain_pending_queue(jobs: typing.List[JobQueueItem]) -> float:
+    container = JobContainer()
+    for job in jobs:
+        container.add(job)
+    start = time.perf_counter()
+    while container.pop_next() is not None:
+        pass
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "sizes", type=int, nargs="*", default=[10_000, 100_000]
+    )
+    parser.add_argument(
+        "--skip-scanning",
+        action="store_true",
+        help="only time the current pending queue implementation",
+    )
+    args = parser.parse_args()
+    for size in args.sizes:
+        pending_time = drain_pending_queue(create_jobs(size))
+        print(f"{size:>8} jobs  pending queue: {pending_time:10.4f}s")
+        if not args.skip_scanning:
+            scanning_time = drain_scanning(create_jobs(size))
+            print(f"{size:>8} jobs  scanning:      {scanning_time:10.4f}s")
+
+
+if __name__ == "__main__":
+    main()
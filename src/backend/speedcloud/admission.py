@@ -0,0 +1,244 @@
+"""Admission control.
+
+Limits how many jobs can be waiting in the queue and how quickly each
+client can submit them, so that a runaway client can't fill the memory of
+the server with queued jobs.
+"""
+
+from __future__ import annotations
+
+import collections
+import dataclasses
+import time
+from typing import Callable, Deque, Dict, Mapping, Optional
+
+from speedcloud.exceptions import JobAdmissionRejected, JobBatchTooLarge
+
+__all__ = [
+    "AdmissionPolicy",
+    "AdmissionController",
+    "DrainRateMeter",
+    "TokenBucket",
+]
+
+Clock = Callable[[], float]
+
+
+@dataclasses.dataclass
+class AdmissionPolicy:
+    """Limits on the jobs accepted. Limits set to None are not enforced."""
+
+    # maximum number of jobs waiting in the queue
+    max_queued_jobs: Optional[int] = None
+
+    # maximum number of jobs of a workflow waiting in the queue, keyed by
+    # workflow name
+    max_queued_per_workflow: Optional[Mapping[str, int]] = None
+
+    # jobs per second each client can submit over time
+    client_rate: Optional[float] = None
+
+    # jobs a client can submit at once after being idle
+    client_burst: int = 100
+
+    # seconds clients are asked to wait if nothing has left the queue
+    # recently to estimate from
+    idle_retry_after: float = 60.0
+
+
+class TokenBucket:
+    """Token bucket rate limiter.
+
+    Tokens are added at a fixed rate up to the capacity of the bucket. A
+    request larger than the capacity is let through once the bucket is full,
+    leaving it in debt until enough tokens have been added again.
+    """
+
+    def __init__(
+        self, rate: float, capacity: int, clock: Clock = time.monotonic
+    ) -> None:
+        """Create a new full bucket.
+
+        Args:
+            rate: tokens added per second.
+            capacity: maximum number of tokens in the bucket.
+            clock: source of the current time in seconds.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    @property
+    def is_full(self) -> bool:
+        """Check if the bucket has filled back up to its capacity."""
+        self._refill()
+        return self._tokens >= self.capacity
+
+    def wait_time(self, count: int = 1) -> float:
+        """Get how many seconds until count tokens can be taken."""
+        self._refill()
+        needed = min(count, self.capacity) - self._tokens
+        return max(0.0, needed / self.rate)
+
+    def take(self, count: int = 1) -> None:
+        """Take tokens out of the bucket."""
+        self._refill()
+        self._tokens -= count
+
+
+class DrainRateMeter:
+    """Rate at which jobs are leaving the queue."""
+
+    def __init__(self, window: float = 60.0, clock: Clock = time.monotonic):
+        """Create a new meter.
+
+        Args:
+            window: how many seconds of history the rate is taken over.
+            clock: source of the current time in seconds.
+        """
+        self.window = window
+        self._clock = clock
+        self._times: Deque[float] = collections.deque()
+
+    def _expire(self, now: float) -> None:
+        while self._times and now - self._times[0] > self.window:
+            self._times.popleft()
+
+    def record(self) -> None:
+        """Record a job leaving the queue."""
+        now = self._clock()
+        self._times.append(now)
+        self._expire(now)
+
+    @property
+    def rate(self) -> float:
+        """Get the number of jobs leaving the queue per second."""
+        self._expire(self._clock())
+        return len(self._times) / self.window
+
+
+class AdmissionController:
+    """Decide if new jobs are accepted."""
+
+    # Idle clients with a full bucket are forgotten once there are this many
+    max_idle_clients = 1000
+
+    def __init__(
+        self,
+        policy: AdmissionPolicy,
+        drain_rate: Optional[DrainRateMeter] = None,
+        clock: Clock = time.monotonic,
+    ) -> None:
+        """Create a new admission controller.
+
+        Args:
+            policy: limits to enforce.
+            drain_rate: meter used to estimate how long clients should wait
+                before retrying.
+            clock: source of the current time in seconds.
+        """
+        self.policy = policy
+        self.drain_rate = drain_rate or DrainRateMeter(clock=clock)
+        self._clock = clock
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _retry_after_draining(self, excess: int) -> float:
+        rate = self.drain_rate.rate
+        if rate <= 0:
+            return self.policy.idle_retry_after
+        return excess / rate
+
+    def _bucket(self, client: str, rate: float) -> TokenBucket:
+        if (bucket := self._buckets.get(client)) is not None:
+            return bucket
+        if len(self._buckets) >= self.max_idle_clients:
+            self._buckets = {
+                name: bucket
+                for name, bucket in self._buckets.items()
+                if not bucket.is_full
+            }
+        bucket = TokenBucket(
+            rate,
+            self.policy.client_burst,
+            clock=self._clock,
+        )
+        self._buckets[client] = bucket
+        return bucket
+
+    def _check_batch_size(
+        self, new_jobs: Mapping[str, int], total: int
+    ) -> None:
+        # These would be rejected however long the client waits
+        policy = self.policy
+        if policy.max_queued_jobs is not None and \
+                total > policy.max_queued_jobs:
+            raise JobBatchTooLarge(
+                f"{total} jobs submitted at once but only "
+                f"{policy.max_queued_jobs} can be queued"
+            )
+        for workflow_name, count in new_jobs.items():
+            limit = (policy.max_queued_per_workflow or {}).get(workflow_name)
+            if limit is not None and count > limit:
+                raise JobBatchTooLarge(
+                    f"{count} {workflow_name} jobs submitted at once but "
+                    f"only {limit} can be queued"
+                )
+
+    def admit(
+        self,
+        new_jobs: Mapping[str, int],
+        queued: int,
+        queued_per_workflow: Mapping[str, int],
+        client: Optional[str] = None,
+    ) -> None:
+        """Accept new jobs or raise an exception if they are over a limit.
+
+        Args:
+            new_jobs: number of jobs being submitted, by workflow name.
+            queued: number of jobs already waiting in the queue.
+            queued_per_workflow: number of jobs waiting in the queue, by
+                workflow name.
+            client: who is submitting the jobs.
+
+        Raises:
+            JobBatchTooLarge: if there are more jobs than a limit allows
+                even with an empty queue.
+            JobAdmissionRejected: if accepting the jobs would go over a
+                limit.
+        """
+        total = sum(new_jobs.values())
+        policy = self.policy
+        self._check_batch_size(new_jobs, total)
+        if policy.max_queued_jobs is not None:
+            excess = queued + total - policy.max_queued_jobs
+            if excess > 0:
+                raise JobAdmissionRejected(
+                    "Too many jobs in the queue",
+                    retry_after=self._retry_after_draining(excess),
+                )
+        for workflow_name, count in new_jobs.items():
+            limit = (policy.max_queued_per_workflow or {}).get(workflow_name)
+            if limit is None:
+                continue
+            excess = queued_per_workflow.get(workflow_name, 0) + count - limit
+            if excess > 0:
+                raise JobAdmissionRejected(
+                    f"Too many {workflow_name} jobs in the queue",
+                    retry_after=self._retry_after_draining(excess),
+                )
+        if policy.client_rate is not None and client is not None:
+            bucket = self._bucket(client, policy.client_rate)
+            if (wait_time := bucket.wait_time(total)) > 0:
+                raise JobAdmissionRejected(
+                    "Jobs submitted too quickly", retry_after=wait_time
+                )
+            bucket.take(total)
@@ -26,7 +26,7 @@ if TYPE_CHECKING:
     from speedwagon.workflow import UserDataType as SpeedwagonParamsType
 
 
-__all__ = ["PacketBuilder"]
+__all__ = ["PacketBuilder", "LogCursor"]
 
 T = TypeVar("T")
 
@@ -94,6 +94,10 @@ class PacketBuilder:
 
 
 class MemorizedPacketBuilder(PacketBuilder):
+    # Values of these keys are always sent, the caller makes sure that they
+    # are new.
+    unmemorized_keys = frozenset(["logs"])
+
     def __init__(self) -> None:
         super().__init__()
         self._data_already_sent: DefaultDict[
@@ -107,7 +111,7 @@ class MemorizedPacketBuilder(PacketBuilder):
             existing_data = self._data_already_sent.get(key)
             update_function = self._update_strategies[key]
             data = update_function(existing_data, value)
-            if existing_data != data:
+            if key in self.unmemorized_keys or existing_data != data:
                 self._data[key] = data  # type: ignore[literal-required]
 
     def reset_memory(self) -> None:
@@ -118,7 +122,10 @@ class MemorizedPacketBuilder(PacketBuilder):
         for key, value in self._data.items():
             if key not in PacketDataStructure.__annotations__.keys():
                 raise ValueError(f"{key} is not a valid packet")
-            if self._data_already_sent[key] != value:
+            if (
+                key in self.unmemorized_keys
+                or self._data_already_sent[key] != value
+            ):
                 existing_data = self._data_already_sent[key]
                 results = None if existing_data == new_data else value
                 if results is not None:
@@ -131,7 +138,8 @@ class MemorizedPacketBuilder(PacketBuilder):
         new_data = self.prepare_new_data_packet()
         result = self.serialize(new_data)
         for key, value in new_data.items():
-            self._data_already_sent[key] = value  # type: ignore[assignment]
+            if key not in self.unmemorized_keys:
+                self._data_already_sent[key] = value  # type: ignore
 
         self._data = PacketDataStructure()
         # self._data.clear()
@@ -157,6 +165,29 @@ class LogMemorizer:
         self._hashes.clear()
 
 
+class LogCursor:
+    """Position in the logs of a job up to which they have been sent.
+
+    Only the log messages added since the last read are looked at, so the
+    cost of a read doesn't grow with the number of messages already sent.
+    Unlike LogMemorizer, messages that repeat an earlier one are kept.
+    """
+
+    def __init__(self, position: int = 0) -> None:
+        """Create a new cursor.
+
+        Args:
+            position: number of messages already sent.
+        """
+        self.position = position
+
+    def read_new(self, logs: typing.Sequence[JobLog]) -> List[JobLog]:
+        """Get the messages added since the last read and move past them."""
+        new_logs = list(logs[self.position:])
+        self.position += len(new_logs)
+        return new_logs
+
+
 @contextlib.contextmanager
 def log_de_dup() -> typing.Generator[LogMemorizer, None, None]:
     memorizer = LogMemorizer()
@@ -3,16 +3,20 @@
 from __future__ import annotations
 
 from typing import List, Optional, Dict, Any, TYPE_CHECKING
-import json
+import asyncio
+import contextlib
 import os
 from importlib.metadata import version
-from fastapi import APIRouter, UploadFile, Depends, Request
+from fastapi import APIRouter, UploadFile, Depends, Request, Query, Response
 from fastapi.encoders import jsonable_encoder
 from fastapi import HTTPException
 from sse_starlette.sse import EventSourceResponse
 import aiofiles
 
 import speedcloud.job_manager
+from speedcloud.job_logs import JobLogs
+from speedcloud.job_manager import NewJob, inject_storage_root
+from speedcloud.runtime_history import measure_input_size
 from speedcloud.workflow_manager import WorkflowData
 from speedcloud.exceptions import SpeedCloudException
 from speedcloud.config import Settings, get_settings
@@ -23,8 +27,11 @@ from . import storage
 from . import stream
 
 if TYPE_CHECKING:
-    from speedcloud.job_manager import JobManager, JobRunner
-    from speedcloud.workflow_manager import AbsWorkflowManager
+    from speedcloud.job_manager import JobManager, AbsJobRunner
+    from speedcloud.workflow_manager import (
+        AbsWorkflowManager,
+        WorkflowValues,
+    )
 
 __all__ = ['api']
 
@@ -219,14 +226,38 @@ async def get_workflow(
     return {}
 
 
+async def get_input_size(
+        workflow_values: WorkflowValues,
+        details: Dict[str, Any],
+        storage_root: str
+) -> Optional[int]:
+    """Get the number of bytes in the files and folders selected for a job."""
+    paths = [
+        inject_storage_root(storage_root, details[param["label"]])
+        for param in workflow_values["parameters"]
+        if param["widget_type"] in ("DirectorySelect", "FileSelect")
+        and isinstance(details.get(param["label"]), str)
+    ]
+    return await asyncio.to_thread(measure_input_size, paths)
+
+
 @api.post('/submitJob')
-async def submit_job(job: schema.Job, request: Request):
+async def submit_job(
+        job: schema.Job,
+        request: Request,
+        settings: Settings = Depends(get_settings)
+):
     job_manager: JobManager = request.state.job_manager
     workflow_manager: AbsWorkflowManager = request.state.workflow_manager
     workflow_values = workflow_manager.get_workflow_info_by_id(job.workflow_id)
     new_job_item = await job_manager.add_job(
         WorkflowData(job.workflow_id, workflow_values['name']),
-        job.details
+        job.details,
+        priority=job.priority,
+        submitter=request.client.host if request.client else None,
+        input_size=await get_input_size(
+            workflow_values, job.details, settings.storage
+        ) if job_manager.uses_input_size else None,
     )
     job_id = new_job_item.job_id
     return {
@@ -239,6 +270,84 @@ async def submit_job(job: schema.Job, request: Request):
     }
 
 
+@api.post('/submitJobs', description="Submit several jobs at once")
+async def submit_jobs(
+        jobs: List[schema.Job],
+        request: Request,
+        settings: Settings = Depends(get_settings)
+):
+    job_manager: JobManager = request.state.job_manager
+    workflow_manager: AbsWorkflowManager = request.state.workflow_manager
+
+    # Every job is checked before any of them are added so that either all
+    # of the jobs are queued or none of them are.
+    workflows: Dict[int, Any] = {}
+    for index, job in enumerate(jobs):
+        if job.workflow_id not in workflows:
+            try:
+                workflows[job.workflow_id] = \
+                    workflow_manager.get_workflow_info_by_id(job.workflow_id)
+            except (KeyError, ValueError) as error:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Job {index}: unknown workflow id "
+                           f"{job.workflow_id}"
+                ) from error
+        parameters = {
+            param["label"]
+            for param in workflows[job.workflow_id]["parameters"]
+        }
+        if unknown := set(job.details) - parameters:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Job {index}: unknown parameters "
+                       f"{', '.join(sorted(unknown))}"
+            )
+
+    # Input folders can be large, so they are measured all at once, and only
+    # if the scheduler uses the sizes.
+    input_sizes: List[Optional[int]] = (
+        list(
+            await asyncio.gather(
+                *[
+                    get_input_size(
+                        workflows[job.workflow_id],
+                        job.details,
+                        settings.storage
+                    )
+                    for job in jobs
+                ]
+            )
+        )
+        if job_manager.uses_input_size else [None] * len(jobs)
+    )
+    new_job_items = await job_manager.add_jobs(
+        [
+            NewJob(
+                WorkflowData(
+                    job.workflow_id, workflows[job.workflow_id]['name']
+                ),
+                job.details,
+                priority=job.priority,
+                input_size=input_size,
+            )
+            for job, input_size in zip(jobs, input_sizes)
+        ],
+        submitter=request.client.host if request.client else None
+    )
+    return [
+        {
+            "status": new_job_item.state,
+            "metadata": {
+                "id": new_job_item.job_id,
+                "workflow_id": job.workflow_id,
+                "properties": job.details,
+            }
+        }
+        for job, new_job_item in zip(jobs, new_job_items)
+    ]
+
+
 @api.get('/info')
 async def info(request: Request) -> Dict[str, Any]:
     """Get info."""
@@ -269,65 +378,153 @@ def get_job_status(request: Request, job_id: str) -> schema.JobInfo:
     )
 
 
-@api.get('/jobLogs', description="Get the logs of a single job")
-def get_job_logs(request: Request, job_id: str) -> List[schema.LogData]:
+@api.get(
+    '/jobLogs',
+    description="Get the logs of a single job, optionally starting from the "
+                "index given by since and returning at most limit messages",
+    response_model=List[schema.LogData]
+)
+async def get_job_logs(
+        request: Request,
+        job_id: str,
+        since: int = Query(default=0, ge=0),
+        limit: Optional[int] = Query(default=None, ge=0)
+) -> Response:
     job_manager: JobManager = request.state.job_manager
     job = job_manager.get_job_queue_item(job_id)
-
-    return [
-        schema.LogData(**log_entry)
-        for log_entry in job.status.get('logs', [])
-    ]
+    logs = job.status.get('logs', [])
+    if not isinstance(logs, JobLogs):
+        logs = JobLogs(logs)
+
+    # The messages are already stored as json so they are sent as they are.
+    # Older messages are read from a file so keep that off the event loop.
+    messages = await asyncio.to_thread(logs.read_raw, since, limit)
+    return Response(
+        content=b"[" + b",".join(messages) + b"]",
+        media_type="application/json"
+    )
 
 
 @api.get('/jobAbort', description="Abort running job")
 async def abort_job(request: Request, job_id: str):
     job_manager: JobManager = request.state.job_manager
-    job_runner: JobRunner = request.state.job_runner
-    job_manager.set_job_state(job_id, schema.JobState.STOPPING)
-    job_runner.abort(job_id)
+    job_runner: AbsJobRunner = request.state.job_runner
+    job = job_manager.get_job_queue_item(job_id)
+    if job.state == schema.JobState.QUEUED:
+        # Not sent to a runner yet so there is nothing to stop.
+        await job_manager.abort_queued(job_id)
+    else:
+        job_manager.set_job_state(job_id, schema.JobState.STOPPING)
+        job_runner.abort(job_id)
     return jsonable_encoder({
         "job_id": job_id,
         "status": job_manager.get_job_queue_item(job_id).state.value
     })
 
 
+@api.post(
+    '/jobResume',
+    description="Run a job that stopped before finishing again. If "
+                "checkpoints are turned on, the subtasks it already finished "
+                "are skipped"
+)
+async def resume_job(request: Request, job_id: str):
+    job_manager: JobManager = request.state.job_manager
+    await job_manager.resume(job_id)
+    return {
+        "job_id": job_id,
+        "status": job_manager.get_job_queue_item(job_id).state.value
+    }
+
+
+@api.post('/jobPriority', description="Change the priority of a queued job")
+async def set_job_priority(request: Request, job_id: str, priority: int):
+    job_manager: JobManager = request.state.job_manager
+    await job_manager.reprioritize(job_id, priority)
+    return {
+        "job_id": job_id,
+        "priority": job_manager.get_job_queue_item(job_id).priority
+    }
+
+
 @api.get('/followJobStatus')
-async def follow_job_sse(request: Request, job_id: str) -> EventSourceResponse:
+async def follow_job_sse(
+        request: Request,
+        job_id: str,
+        settings: Settings = Depends(get_settings)
+) -> EventSourceResponse:
 
-    @stream.only_new_data
+    # Not wrapped in only_new_data because the same log message can be sent
+    # twice in a row. The log cursor already keeps anything from being
+    # resent.
     async def generator_event():
         job_manager: JobManager = request.state.job_manager
         job_queue_item = job_manager.get_job_queue_item(job_id)
-        job_runner: JobRunner = request.state.job_runner
+        job_runner: AbsJobRunner = request.state.job_runner
         async for packet in stream.job_progress_packet_generator(
                 job_queue_item,
-                job_runner
+                job_runner,
+                max_update_rate=settings.stream_max_update_rate
         ):
             yield packet
     return EventSourceResponse(generator_event())
 
 
-@api.get('/jobsSSE')
-async def jobs_sse(request: Request) -> EventSourceResponse:
+@api.get(
+    '/jobsSSE',
+    description="Stream the job queue. In delta mode, the whole job queue is "
+                "sent once, followed by only the jobs changed or removed."
+)
+async def jobs_sse(
+        request: Request,
+        delta: bool = False
+) -> EventSourceResponse:
+
+    snapshots: stream.JobQueueSnapshots = request.state.job_queue_snapshots
+    if delta:
+        return EventSourceResponse(stream.stream_job_deltas(snapshots))
 
     @stream.only_new_data
+    async def new_snapshots():
+        async for snapshot in stream.stream_job_snapshots(snapshots):
+            yield snapshot
+
     async def generator_event():
+        # Every subscriber shares the same serialized snapshots
+        async with contextlib.aclosing(new_snapshots()) as values:
+            async for snapshot in values:
+                yield snapshot.data
 
-        job_runner: JobRunner = request.state.job_runner
-        job_manager: JobManager = request.state.job_manager
+    return EventSourceResponse(generator_event())
 
-        async for packet in stream.stream_jobs(job_manager, job_runner):
-            yield json.dumps(packet)
 
-    return EventSourceResponse(generator_event())
+@api.get('/jobs/summary', description="Get the number of jobs in each state")
+async def jobs_summary(request: Request) -> schema.JobsSummary:
+    job_manager: JobManager = request.state.job_manager
+    states = job_manager.state_counts()
+    return schema.JobsSummary(
+        total=sum(states.values()),
+        states=states,
+        archived=job_manager.archived_count(),
+        queue_depth=job_manager.queue_depth(),
+        drain_rate=job_manager.drain_rate.rate,
+    )
 
 
 @api.get('/jobs')
-async def jobs(request: Request) -> List[schema.APIJobQueueItem]:
+async def jobs(
+        request: Request,
+        state: Optional[schema.JobState] = None,
+        workflow_id: Optional[int] = None,
+        settings: Settings = Depends(get_settings)
+) -> List[schema.APIJobQueueItem]:
     job_manager: JobManager = request.state.job_manager
+    start_times = job_manager.estimate_start_times(settings.runner_workers)
     res = []
-    for item in job_manager.job_queue():
+    for item in job_manager.job_queue(
+            states=[state] if state is not None else None,
+            workflow_id=workflow_id
+    ):
         res.append(
             schema.APIJobQueueItem(
                 job=item.job,
@@ -336,9 +533,11 @@ async def jobs(request: Request) -> List[schema.APIJobQueueItem]:
                 job_id=item.job_id,
                 progress=item.status['progress'],
                 time_submitted=str(item.time_submitted),
-
-
-
+                priority=item.priority,
+                estimated_start_time=(
+                    str(start_times[item.job_id])
+                    if item.job_id in start_times else None
+                ),
             )
         )
     return res
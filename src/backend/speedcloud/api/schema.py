@@ -37,6 +37,7 @@ class Job(BaseModel):
 
     details: typing.Dict[str, UserDataType]
     workflow_id: int
+    priority: int = 0
 
 
 class RemoveDirectory(BaseModel):
@@ -54,6 +55,7 @@ class JobState(str, enum.Enum):
     FAILED = "failed"
     ABORTED = "aborted"
     STOPPING = "stopping"
+    INTERRUPTED = "interrupted"
 
 
 class JobWorkflow(TypedDict):
@@ -75,6 +77,8 @@ class APIJobQueueItem(BaseModel):
     job_id: str
     progress: typing.Optional[float]
     time_submitted: str
+    priority: int = 0
+    estimated_start_time: typing.Optional[str] = None
 
     def as_dict(self):
         """Generate data as a dict."""
@@ -84,7 +88,9 @@ class APIJobQueueItem(BaseModel):
             "order": self.order,
             "job_id": self.job_id,
             "progress": self.progress,
-            "time_submitted": str(self.time_submitted)
+            "time_submitted": str(self.time_submitted),
+            "priority": self.priority,
+            "estimated_start_time": self.estimated_start_time,
         }
 
     def serialize(self) -> str:
@@ -103,3 +109,16 @@ class JobInfo(BaseModel):
     workflow: JobWorkflow
     start_time: str
     job_status: str
+
+
+class JobsSummary(BaseModel):
+    """Number of jobs in each state and how quickly the queue is emptying.
+
+    The drain rate is the number of jobs leaving the queue per second.
+    """
+
+    total: int
+    states: typing.Dict[JobState, int]
+    archived: int
+    queue_depth: int
+    drain_rate: float
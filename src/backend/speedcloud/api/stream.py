@@ -1,6 +1,11 @@
 """Stream generation."""
 
 import abc
+import collections
+import dataclasses
+import functools
+import json
+import time
 import typing
 from functools import wraps
 from typing import AsyncGenerator, List, Optional
@@ -9,7 +14,7 @@ import asyncio
 from speedcloud.job_manager import (
     AsyncEventNotifier,
     JobQueueItem,
-    JobRunner,
+    AbsJobRunner,
     JobManager
 )
 
@@ -17,6 +22,9 @@ from . import packets
 from . import schema
 
 __all__ = [
+    "JobQueueSnapshot",
+    "JobQueueSnapshots",
+    "stream_job_deltas",
     "job_progress_packet_generator",
     "only_new_data",
     "wait_for_first_prereq",
@@ -100,17 +108,21 @@ async def wait_for_first_prereq(
 ) -> typing.AsyncIterator[TaskWaiter]:
     """Context manager to help with waiting for a prereq to be finished."""
     waiter = TaskWaiter(prerequisites)
-    yield waiter
-    await waiter.wait_for_first()
-    waiter.reset()
-    waiter.cancel_waiting()
+    try:
+        yield waiter
+        await waiter.wait_for_first()
+        waiter.reset()
+    finally:
+        # Including when the client disconnects while waiting
+        waiter.cancel_waiting()
 
 
 async def _generate_live_packets(
         job_queue_item: JobQueueItem,
         update_prerequisites: List[AbsWaitEvent],
-        logs_tracker: packets.LogMemorizer,
-        packet_generator: packets.PacketBuilder
+        log_cursor: packets.LogCursor,
+        packet_generator: packets.PacketBuilder,
+        min_interval: float = 0.0
 ) -> typing.AsyncIterator[str]:
     while job_queue_item.state == schema.JobState.RUNNING:
         async with wait_for_first_prereq(update_prerequisites) as waiter:
@@ -118,8 +130,8 @@ async def _generate_live_packets(
                 "currentTask": job_queue_item.status['current_task'],
                 "progress": job_queue_item.status['progress'],
             }
-            if logs := list(logs_tracker.pass_through(
-                    job_queue_item.status.get('logs', []))
+            if logs := log_cursor.read_new(
+                    job_queue_item.status.get('logs', [])
             ):
                 packet_values["logs"] = logs
             packet_generator.add_items(**packet_values)
@@ -128,19 +140,34 @@ async def _generate_live_packets(
             if packet is not None:
                 waiter.reset()
                 yield packet
+                if min_interval > 0:
+                    # Updates made in the meantime are still waiting to be
+                    # noticed, so the next packet sends the latest of them.
+                    await asyncio.sleep(min_interval)
 
 
 async def job_progress_packet_generator(
-    job_queue_item: JobQueueItem, job_runner: JobRunner
+    job_queue_item: JobQueueItem,
+    job_runner: AbsJobRunner,
+    max_update_rate: Optional[float] = None
 ) -> AsyncGenerator[str, str]:
-    """Generate data packets about the progress of a job."""
+    """Generate data packets about the progress of a job.
+
+    Args:
+        job_queue_item: job to follow.
+        job_runner: runner of the job.
+        max_update_rate: maximum number of packets per second sent while
+            the job is running. Changes made between packets are combined
+            into the next one, and the final state is always sent. Not
+            limited if not set.
+    """
     job_runner_waiter = AsyncEventNotifier()
     job_finished = AsyncEventNotifier()
 
     job_runner.add_async_watcher(job_runner_waiter)
-
-    _packet_generator = packets.MemorizedPacketBuilder()
-    with packets.log_de_dup() as logs_tracker:
+    try:
+        _packet_generator = packets.MemorizedPacketBuilder()
+        log_cursor = packets.LogCursor()
         packet_values: packets.PacketDataStructure = {
             "job_id": job_queue_item.job_id,
             "job_parameters": job_queue_item.job["details"],
@@ -155,8 +182,10 @@ async def job_progress_packet_generator(
                 job_queue_item.status['start_time']
             )
 
-        if logs := list(logs_tracker.pass_through(
-                job_queue_item.status['logs'])
+        # Logs older than the ones kept in memory are read from a file so
+        # keep that off the event loop.
+        if logs := await asyncio.to_thread(
+            log_cursor.read_new, job_queue_item.status['logs']
         ):
             packet_values["logs"] = logs
 
@@ -179,8 +208,9 @@ async def job_progress_packet_generator(
                             name="job_finished"
                         ),
                     ],
-                    logs_tracker=logs_tracker,
-                    packet_generator=_packet_generator
+                    log_cursor=log_cursor,
+                    packet_generator=_packet_generator,
+                    min_interval=1 / max_update_rate if max_update_rate else 0
             ):
                 yield packet
 
@@ -191,28 +221,33 @@ async def job_progress_packet_generator(
             "currentTask": job_queue_item.status['current_task'],
             "progress": job_queue_item.status['progress'],
         }
-        if logs := list(logs_tracker.pass_through(
-                job_queue_item.status.get('logs', []))
-        ):
+        if logs := log_cursor.read_new(job_queue_item.status.get('logs', [])):
             packet_values["logs"] = logs
         _packet_generator.add_items(**packet_values)
         if last_packet := _packet_generator.flush():
             yield last_packet
+    finally:
+        # Stop being notified once the client disconnects
+        job_runner.remove_async_watcher(job_runner_waiter)
+
 
 RetType = typing.TypeVar('RetType')  # pylint: disable=invalid-name
 
 
 def only_new_data(
-        func: typing.Callable[[], typing.AsyncIterator[RetType]]
-) -> typing.Callable[[], typing.AsyncIterator[RetType]]:
+        func: typing.Callable[[], AsyncGenerator[RetType, None]]
+) -> typing.Callable[[], AsyncGenerator[RetType, None]]:
     """Suppress data that tries to be sent twice."""
     @wraps(func)
-    async def inner() -> typing.AsyncIterator[RetType]:
+    async def inner() -> AsyncGenerator[RetType, None]:
         last_value = None
-        async for res in func():
-            if last_value != res:
-                yield res
-                last_value = res
+        # Closing this generator, such as when the client disconnects, also
+        # closes the one it wraps.
+        async with contextlib.aclosing(func()) as values:
+            async for res in values:
+                if last_value != res:
+                    yield res
+                    last_value = res
 
     return inner
 
@@ -228,36 +263,237 @@ def get_job_queue_data(
             job_id=item.job_id,
             progress=item.status['progress'],
             time_submitted=str(item.time_submitted),
+            priority=item.priority,
         ).as_dict()
         for item in job_manager.job_queue()
     ]
 
 
-async def stream_jobs(
-        job_manager: JobManager,
-        job_runner: JobRunner
-) -> typing.AsyncIterator[List[schema.APIJobQueueItem]]:
+@dataclasses.dataclass(eq=False)
+class JobQueueSnapshot:
+    """Serialized job queue data at one point in time."""
+
+    version: int
+    data: str
+
+    # Rows of the job queue keyed by job id
+    rows: typing.Dict[str, typing.Any] = dataclasses.field(
+        default_factory=dict, repr=False
+    )
+
+    # Delta message with the rows changed since the previous version
+    delta: Optional[str] = dataclasses.field(default=None, repr=False)
+
+    def __eq__(self, other: object) -> bool:
+        # Snapshots are never changed after being made so comparing the
+        # versions is enough.
+        if not isinstance(other, JobQueueSnapshot):
+            return NotImplemented
+        return self.version == other.version
+
+    @functools.cached_property
+    def message(self) -> str:
+        """Get the snapshot as a message for delta mode streams."""
+        return (
+            f'{{"type": "snapshot", "sequence": {self.version}, '
+            f'"jobs": {self.data}}}'
+        )
+
+
+def _make_delta(
+        version: int,
+        previous: typing.Dict[str, typing.Any],
+        rows: typing.Dict[str, typing.Any]
+) -> str:
+    return json.dumps({
+        "type": "delta",
+        "sequence": version,
+        "changed": [
+            row for job_id, row in rows.items()
+            if previous.get(job_id) != row
+        ],
+        "removed": [job_id for job_id in previous if job_id not in rows],
+    })
+
+
+class JobQueueSnapshots:
+    """Serialized job queue data shared by every /jobsSSE subscriber.
+
+    The job queue is only serialized again after the job manager or job
+    runner reports a change, no matter how many subscribers there are. Each
+    serialization that differs from the last gets the next version number,
+    along with a delta of the rows that changed so that delta mode streams
+    don't have to send the whole job queue.
+    """
+
+    def __init__(
+            self,
+            job_manager: JobManager,
+            job_runner: AbsJobRunner,
+            max_age: float = MESSAGE_STREAM_DELAY,
+            clock: typing.Callable[[], float] = time.monotonic,
+            history: int = 100
+    ) -> None:
+        """Create new shared snapshots.
+
+        Args:
+            job_manager: manager of the jobs in the snapshots.
+            job_runner: runner of the jobs in the snapshots.
+            max_age: seconds after which the job queue is serialized again
+                even without a change being reported.
+            clock: source of the current time in seconds.
+            history: number of versions whose deltas are kept for streams
+                that fall behind.
+        """
+        self.job_manager = job_manager
+        self.job_runner = job_runner
+        self.max_age = max_age
+        self._clock = clock
+        self._changes = AsyncEventNotifier()
+        self._snapshot: Optional[JobQueueSnapshot] = None
+        self._history: typing.Deque[JobQueueSnapshot] = collections.deque(
+            maxlen=history
+        )
+        self._made_at = 0.0
+        job_manager.add_async_watcher(self._changes)
+        job_runner.add_async_watcher(self._changes)
+
+    def close(self) -> None:
+        """Stop following changes to the job queue."""
+        self.job_manager.remove_async_watcher(self._changes)
+        self.job_runner.remove_async_watcher(self._changes)
+
+    def current(self) -> JobQueueSnapshot:
+        """Get a snapshot of the job queue as it is now."""
+        now = self._clock()
+        if (
+            self._snapshot is not None
+            and not self._changes.get_nowait()
+            and now - self._made_at < self.max_age
+        ):
+            return self._snapshot
+        self._made_at = now
+        rows = {
+            row["job_id"]: row
+            for row in typing.cast(
+                List[typing.Dict[str, typing.Any]],
+                get_job_queue_data(self.job_manager)
+            )
+        }
+        previous = self._snapshot
+        if previous is not None and rows == previous.rows:
+            return previous
+        version = previous.version + 1 if previous is not None else 1
+        self._snapshot = JobQueueSnapshot(
+            version=version,
+            data=json.dumps(list(rows.values())),
+            rows=rows,
+            delta=(
+                _make_delta(version, previous.rows, rows)
+                if previous is not None else None
+            ),
+        )
+        self._history.append(self._snapshot)
+        return self._snapshot
+
+    def deltas_since(self, version: int) -> Optional[List[str]]:
+        """Get the delta messages needed to catch up from a version.
+
+        Returns:
+            Returns None if the version is too old for the deltas to still
+            be kept, in which case the whole snapshot has to be sent again.
+        """
+        latest = self._snapshot.version if self._snapshot is not None else 0
+        deltas = [
+            snapshot.delta for snapshot in self._history
+            if snapshot.version > version
+        ]
+        if len(deltas) != latest - version or None in deltas:
+            return None
+        return typing.cast(List[str], deltas)
+
+
+async def stream_job_snapshots(
+        snapshots: JobQueueSnapshots
+) -> AsyncGenerator[JobQueueSnapshot, None]:
+    """Generate a snapshot of the job queue each time it might change."""
     manager_waiter = AsyncEventNotifier()
-    job_manager.add_async_watcher(manager_waiter)
+    snapshots.job_manager.add_async_watcher(manager_waiter)
+    job_runner_waiter = AsyncEventNotifier()
+    snapshots.job_runner.add_async_watcher(job_runner_waiter)
+    try:
+        while True:
+            async with wait_for_first_prereq(
+                prerequisites=[
+                    SleepEvent(
+                        time=MESSAGE_STREAM_DELAY,
+                        name="Timeout at 30 second"
+                    ),
+                    WaitForAsyncEvent(
+                        name="job_runner",
+                        event_notifier=job_runner_waiter
+                    ),
+                    WaitForAsyncEvent(
+                        name="manager_waiter",
+                        event_notifier=manager_waiter
+                    )
+                ]
+            ) as waiter:
+                snapshot = snapshots.current()
+                waiter.cancel_waiting()
+                yield snapshot
+                waiter.reset()
+    finally:
+        # Stop being notified once the client disconnects
+        snapshots.job_manager.remove_async_watcher(manager_waiter)
+        snapshots.job_runner.remove_async_watcher(job_runner_waiter)
 
+
+async def stream_job_deltas(
+        snapshots: JobQueueSnapshots
+) -> AsyncGenerator[str, None]:
+    """Generate the job queue as a snapshot followed by only the changes.
+
+    Each message has a sequence number, one more than the message before
+    it. A client that sees a gap in the sequence numbers should reconnect
+    to get a new snapshot.
+    """
+    manager_waiter = AsyncEventNotifier()
+    snapshots.job_manager.add_async_watcher(manager_waiter)
     job_runner_waiter = AsyncEventNotifier()
-    job_runner.add_async_watcher(job_runner_waiter)
-    while True:
-        async with wait_for_first_prereq(
-            prerequisites=[
-                SleepEvent(
-                    time=MESSAGE_STREAM_DELAY, name="Timeout at 30 second"),
-                WaitForAsyncEvent(
-                    name="job_runner",
-                    event_notifier=job_runner_waiter
-                ),
-                WaitForAsyncEvent(
-                    name="manager_waiter",
-                    event_notifier=manager_waiter
-                )
-            ]
-        ) as waiter:
-            packet = get_job_queue_data(job_manager)
-            waiter.cancel_waiting()
-            yield packet
-            waiter.reset()
+    snapshots.job_runner.add_async_watcher(job_runner_waiter)
+    try:
+        snapshot = snapshots.current()
+        yield snapshot.message
+        sent = snapshot.version
+        while True:
+            async with wait_for_first_prereq(
+                prerequisites=[
+                    SleepEvent(
+                        time=MESSAGE_STREAM_DELAY,
+                        name="Timeout at 30 second"
+                    ),
+                    WaitForAsyncEvent(
+                        name="job_runner",
+                        event_notifier=job_runner_waiter
+                    ),
+                    WaitForAsyncEvent(
+                        name="manager_waiter",
+                        event_notifier=manager_waiter
+                    )
+                ]
+            ) as waiter:
+                snapshot = snapshots.current()
+                waiter.cancel_waiting()
+                if snapshot.version != sent:
+                    deltas = snapshots.deltas_since(sent)
+                    for message in (
+                        deltas if deltas is not None else [snapshot.message]
+                    ):
+                        yield message
+                    sent = snapshot.version
+                waiter.reset()
+    finally:
+        # Stop being notified once the client disconnects
+        snapshots.job_manager.remove_async_watcher(manager_waiter)
+        snapshots.job_runner.remove_async_watcher(job_runner_waiter)
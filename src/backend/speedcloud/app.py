@@ -1,16 +1,42 @@
 """App."""
 
 import asyncio
+import concurrent.futures
 import logging
+import math
+import os
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from speedcloud.config import get_settings, initialize_app_from_settings
+from speedcloud.checkpoint import CheckpointStore
+from speedcloud.config import (
+    get_settings,
+    get_data_path,
+    initialize_app_from_settings
+)
+from speedcloud.admission import AdmissionPolicy
 from speedcloud.api import api
-from speedcloud.exceptions import SpeedCloudException, JobAlreadyAborted
-from speedcloud.job_manager import JobRunner, JobManager, JobQueueItem
+from speedcloud.api.stream import JobQueueSnapshots
+from speedcloud.exceptions import (
+    SpeedCloudException,
+    JobAdmissionRejected,
+    JobAlreadyAborted,
+)
+from speedcloud.job_manager import (
+    JobRunnerPool,
+    JobManager,
+    JobQueueItem,
+    RetentionPolicy,
+)
+from speedcloud.job_archive import JobArchive
+from speedcloud.job_logs import JobLogStore
+from speedcloud.job_store import SQLiteJobStore
+from speedcloud.remote_worker import RemoteWorkerServer
+from speedcloud.result_cache import ResultCache
+from speedcloud.runtime_history import RuntimeHistory
+from speedcloud.scheduler import create_scheduler
 from speedcloud.workflow_manager import (
     WorkflowManagerIdBaseOnSize,
     AbsWorkflowManager
@@ -48,35 +74,138 @@ async def lifespan(_: FastAPI):
 
     workflow_manager = start_workflow_manager(settings)
 
-    job_queue: asyncio.Queue[JobQueueItem] = asyncio.Queue(maxsize=1)
-    job_manager = JobManager(job_queue)
+    job_store = None
+    if settings.job_store_enabled:
+        job_store = SQLiteJobStore(
+            os.path.join(get_data_path(settings), "jobs.sqlite3")
+        )
+        job_store.start()
+
+    # Only hand out as many jobs as there are workers so that the scheduler
+    # still decides the order of everything else.
+    job_queue: asyncio.Queue[JobQueueItem] = asyncio.Queue(
+        maxsize=settings.runner_workers
+    )
+    log_store = JobLogStore(os.path.join(get_data_path(settings), "logs"))
+    runtime_history = RuntimeHistory(
+        path=os.path.join(get_data_path(settings), "runtime_history.json"),
+        background_writes=True,
+    )
+    archive = JobArchive(
+        os.path.join(get_data_path(settings), "archive"),
+        log_store=log_store,
+        background_writes=True,
+        max_jobs=settings.retention_max_archived_jobs,
+    )
+    checkpoints = CheckpointStore(
+        os.path.join(get_data_path(settings), "checkpoints")
+    ) if settings.runner_checkpoints else None
+    job_manager = JobManager(
+        job_queue,
+        scheduler=create_scheduler(
+            settings.scheduler_policy,
+            settings.scheduler_weights,
+            runtime_history=runtime_history,
+            aging=settings.scheduler_aging,
+        ),
+        retention=RetentionPolicy(
+            max_finished_jobs=settings.retention_max_finished_jobs,
+            max_age=settings.retention_max_age,
+            max_total_log_bytes=settings.retention_max_total_log_bytes,
+        ),
+        archive=archive,
+        store=job_store,
+        workflow_limits=settings.runner_workflow_limits,
+        admission=AdmissionPolicy(
+            max_queued_jobs=settings.admission_max_queued_jobs,
+            max_queued_per_workflow=settings.admission_workflow_limits,
+            client_rate=settings.admission_client_rate,
+            client_burst=settings.admission_client_burst,
+        ),
+        runtime_history=runtime_history,
+        log_store=log_store,
+        checkpoints=checkpoints,
+    )
+    if restored := job_manager.restore():
+        logger.info("restored %d jobs", restored)
     job_manager_task =\
         asyncio.create_task(job_manager.produce(), name="producer")
 
     logging.info("job manager started")
 
-    job_runner = JobRunner(job_queue, settings.storage, workflow_manager)
+    process_pool = (
+        concurrent.futures.ProcessPoolExecutor(
+            max_workers=settings.runner_process_workers
+        )
+        if settings.runner_process_workflows
+        else None
+    )
+    result_cache = ResultCache(
+        max_entries=settings.result_cache_max_entries,
+        max_bytes=settings.result_cache_max_bytes,
+        path=os.path.join(get_data_path(settings), "result_cache.json"),
+        workflows=settings.result_cache_workflows,
+        background_writes=True,
+    ) if settings.result_cache_enabled else None
+    job_runner = JobRunnerPool(
+        job_queue,
+        settings.storage,
+        workflow_manager,
+        workers=settings.runner_workers,
+        process_pool=process_pool,
+        process_workflows=settings.runner_process_workflows,
+        max_concurrent_subtasks=settings.runner_max_concurrent_subtasks,
+        batch_subtasks=settings.runner_batch_subtasks,
+        result_cache=result_cache,
+        checkpoints=checkpoints,
+    )
+    remote_worker_server = None
+    if settings.remote_workers_listen is not None:
+        remote_worker_server = RemoteWorkerServer(
+            job_queue,
+            job_manager,
+            settings.remote_workers_listen,
+            heartbeat_interval=settings.remote_workers_heartbeat_interval,
+            lease_timeout=settings.remote_workers_lease_timeout,
+            token=settings.remote_workers_token,
+        )
+        await remote_worker_server.start()
+        job_runner.add_runner(remote_worker_server)
     job_runner_task =\
         asyncio.create_task(job_runner.consume(), name="consumer")
 
     job_manager_task_future = asyncio.gather(job_manager_task)
-    logger.info("job runner started")
+    logger.info("job runner started with %d workers", settings.runner_workers)
 
+    job_queue_snapshots = JobQueueSnapshots(job_manager, job_runner)
     yield {
         "job_manager": job_manager,
         "job_runner": job_runner,
-        "workflow_manager": workflow_manager
+        "workflow_manager": workflow_manager,
+        "job_queue_snapshots": job_queue_snapshots,
     }
     logger.info("shutting down")
-    job_manager.stop.set()
+    job_queue_snapshots.close()
+    job_manager.shutdown()
     job_runner_task.done()
     job_manager_task.done()
     await job_manager_task_future
     logger.debug("All job tasks have stopped")
+    if remote_worker_server is not None:
+        await remote_worker_server.close()
 
     await job_queue.join()
     if await job_manager.has_unfinished_tasks():
         logging.warning("Job manager closed with unfinished tasks")
+    if process_pool is not None:
+        process_pool.shutdown()
+    if job_store is not None:
+        job_store.close()
+    archive.close()
+    runtime_history.close()
+    if result_cache is not None:
+        result_cache.close()
+    log_store.close()
 
 app = FastAPI(docs_url="/", lifespan=lifespan)
 
@@ -95,6 +224,21 @@ def handle_already_aborted_exception(
     )
 
 
+def handle_admission_rejected_exception(
+        _: Request,
+        ext: Exception
+) -> Response:
+    """Handle for JobAdmissionRejected exceptions."""
+    # Typed as Exception to match what add_exception_handler expects
+    if not isinstance(ext, JobAdmissionRejected):
+        raise ext
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(ext.retry_after)))},
+        content={"message": str(ext)}
+    )
+
+
 def handle_cloudwagon_exceptions(
         _: Request,
         ext: SpeedCloudException
@@ -128,3 +272,7 @@ app.add_exception_handler(
 app.add_exception_handler(
     JobAlreadyAborted, handler=handle_already_aborted_exception
 )
+
+app.add_exception_handler(
+    JobAdmissionRejected, handler=handle_admission_rejected_exception
+)
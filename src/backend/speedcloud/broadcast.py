@@ -0,0 +1,134 @@
+"""Broadcast hub.
+
+Publishes events to any number of subscribers, such as the server sent
+event streams of connected clients, without a slow or disconnected client
+holding up the others.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import typing
+from typing import Deque, Generic, List, Optional, TypeVar
+
+__all__ = ["BroadcastHub", "Subscription"]
+
+T = TypeVar("T")
+
+
+class Subscription(Generic[T]):
+    """Events published to a hub that a subscriber has not read yet.
+
+    Events are buffered until read. Once the buffer is full, the oldest
+    event is dropped to make room for each new one, so a subscriber that
+    doesn't keep up only misses events instead of using more and more
+    memory.
+
+    This is not thread safe. Events should only be delivered and read from
+    the event loop.
+    """
+
+    def __init__(self, max_buffer: int = 100) -> None:
+        """Create a new subscription.
+
+        Args:
+            max_buffer: number of unread events kept.
+        """
+        self._events: Deque[T] = collections.deque(maxlen=max_buffer)
+        self._ready = asyncio.Event()
+        # A subscription can be added to several hubs
+        self._hubs: typing.Dict[int, BroadcastHub[T]] = {}
+        self.dropped = 0
+
+    def __enter__(self) -> Subscription[T]:
+        return self
+
+    def __exit__(self, *_: typing.Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def deliver(self, event: T) -> None:
+        """Add an event to the buffer, dropping the oldest if it is full."""
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+        self._ready.set()
+
+    def get_nowait(self) -> List[T]:
+        """Get every event not read yet, oldest first."""
+        events = list(self._events)
+        self._events.clear()
+        self._ready.clear()
+        return events
+
+    async def wait_for_update(self) -> List[T]:
+        """Wait until there is an event, then get every event not read yet.
+
+        Returns:
+            Returns the events, oldest first.
+        """
+        await self._ready.wait()
+        return self.get_nowait()
+
+    def close(self) -> None:
+        """Stop receiving events from every hub."""
+        for hub in list(self._hubs.values()):
+            hub.unsubscribe(self)
+
+
+class BroadcastHub(Generic[T]):
+    """Deliver each published event to every subscriber."""
+
+    def __init__(self, max_buffer: int = 100) -> None:
+        """Create a new hub.
+
+        Args:
+            max_buffer: number of unread events kept for each subscriber,
+                unless given when subscribing.
+        """
+        self.max_buffer = max_buffer
+        self._subscriptions: typing.Dict[int, Subscription[T]] = {}
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, max_buffer: Optional[int] = None) -> Subscription[T]:
+        """Start receiving events.
+
+        The subscription should be closed once the subscriber is done with
+        it, such as when a client disconnects.
+
+        Args:
+            max_buffer: number of unread events kept. Defaults to the
+                max_buffer of the hub.
+        """
+        return self.add(
+            Subscription(
+                max_buffer if max_buffer is not None else self.max_buffer
+            )
+        )
+
+    def add(self, subscription: Subscription[T]) -> Subscription[T]:
+        """Deliver events to an existing subscription."""
+        hubs = subscription._hubs  # pylint: disable=protected-access
+        hubs[id(self)] = self
+        self._subscriptions[id(subscription)] = subscription
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription[T]) -> None:
+        """Stop delivering events to a subscription."""
+        self._subscriptions.pop(id(subscription), None)
+        hubs = subscription._hubs  # pylint: disable=protected-access
+        hubs.pop(id(self), None)
+
+    def publish(self, event: T) -> None:
+        """Deliver an event to every subscriber.
+
+        This only adds the event to the buffer of each subscriber so it
+        doesn't wait for any of them.
+        """
+        for subscription in list(self._subscriptions.values()):
+            subscription.deliver(event)
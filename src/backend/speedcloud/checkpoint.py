@@ -0,0 +1,169 @@
+"""Job checkpoints.
+
+Record the subtasks of a job as they finish so that a job that was stopped
+part way through can carry on from where it left off instead of starting
+over.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+import threading
+from typing import Dict, Optional, Tuple
+
+import speedwagon
+
+from speedcloud.job_files import job_file_path
+
+__all__ = ["CheckpointStore", "JobCheckpoint"]
+
+logger = logging.getLogger(__name__)
+
+StageResults = Dict[int, Optional[speedwagon.tasks.Result]]
+
+
+class JobCheckpoint:
+    """Subtasks already finished by a job, along with their results.
+
+    Subtasks are identified by the stage of the workflow that created them
+    and their position within that stage. Each finished subtask is appended
+    to the file as a separate record, so saving a checkpoint takes the same
+    time no matter how far along the job is.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open the checkpoint, loading anything already recorded.
+
+        Args:
+            path: file the checkpoint is saved to.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Tuple[int, StageResults]] = {}
+        self._load()
+
+    def __len__(self) -> int:
+        """Get the number of subtasks already finished."""
+        return sum(len(results) for _, results in self._stages.values())
+
+    def start_stage(self, stage: str, total: int) -> StageResults:
+        """Start a stage of the workflow.
+
+        If the stage doesn't have the same number of subtasks as when the
+        checkpoint was saved, the subtasks can't be matched up so the stage
+        and every stage after it start over.
+
+        Args:
+            stage: name of the stage.
+            total: number of subtasks in the stage.
+
+        Returns:
+            Returns the results of the subtasks of the stage already
+            finished, by position.
+        """
+        with self._lock:
+            existing = self._stages.get(stage)
+            if existing is not None and existing[0] == total:
+                return dict(existing[1])
+            self._append(("stage", stage, total))
+            self._start_stage(stage, total)
+            return {}
+
+    def record(
+        self,
+        stage: str,
+        index: int,
+        result: Optional[speedwagon.tasks.Result],
+    ) -> None:
+        """Record a subtask as finished.
+
+        Args:
+            stage: name of the stage that the subtask belongs to.
+            index: position of the subtask within the stage.
+            result: result of the subtask.
+        """
+        try:
+            data = pickle.dumps(("task", stage, index, result))
+        except (pickle.PicklingError, TypeError, AttributeError) as error:
+            logger.warning(
+                "Unable to checkpoint subtask %d of %s stage: %s",
+                index,
+                stage,
+                error,
+            )
+            return
+        with self._lock:
+            with open(self.path, "ab") as handle:
+                handle.write(data)
+            self._stages[stage][1][index] = result
+
+    def _start_stage(self, stage: str, total: int) -> None:
+        # Later stages were created from the results of this one.
+        names = list(self._stages)
+        if stage in names:
+            for name in names[names.index(stage):]:
+                del self._stages[name]
+        self._stages[stage] = (total, {})
+
+    def _append(self, record: Tuple) -> None:
+        with open(self.path, "ab") as handle:
+            pickle.dump(record, handle)
+
+    def _load(self) -> None:
+        try:
+            handle = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with handle:
+            end = 0
+            while True:
+                try:
+                    record = pickle.load(handle)
+                except EOFError:
+                    break
+                except Exception:  # pylint: disable=broad-exception-caught
+                    # Most likely the last record was cut short by a crash.
+                    logger.warning(
+                        "Ignoring unreadable end of checkpoint %s", self.path
+                    )
+                    break
+                end = handle.tell()
+                if record[0] == "stage":
+                    _, stage, total = record
+                    if self._stages.get(stage, (None,))[0] != total:
+                        self._start_stage(stage, total)
+                elif record[0] == "task" and record[1] in self._stages:
+                    _, stage, index, result = record
+                    self._stages[stage][1][index] = result
+        # Drop anything unreadable so that new records can be read later.
+        if end != os.path.getsize(self.path):
+            os.truncate(self.path, end)
+
+
+class CheckpointStore:
+    """Checkpoints of jobs, saved as one file for each job."""
+
+    def __init__(self, path: str) -> None:
+        """Create a new store.
+
+        Args:
+            path: directory to save the checkpoints in.
+        """
+        self.path = path
+
+    def _checkpoint_path(self, job_id: str) -> str:
+        return job_file_path(self.path, job_id, ".checkpoint")
+
+    def open(self, job_id: str) -> JobCheckpoint:
+        """Open the checkpoint of a job, creating it if there isn't one."""
+        os.makedirs(self.path, exist_ok=True)
+        return JobCheckpoint(self._checkpoint_path(job_id))
+
+    def delete(self, job_id: str) -> None:
+        """Remove the checkpoint of a job."""
+        try:
+            os.remove(self._checkpoint_path(job_id))
+        except FileNotFoundError:
+            pass
@@ -15,7 +15,8 @@ __all__ = [
     "get_settings",
     "generate_default_toml_config",
     "write_default_config_file",
-    "initialize_app_from_settings"
+    "initialize_app_from_settings",
+    "get_data_path",
 ]
 
 ENVIRONMENT_NAME_SPEEDCLOUD_STORAGE = "SPEEDCLOUD_STORAGE"
@@ -29,6 +30,35 @@ class Settings(BaseSettings):  # pylint: disable=too-few-public-methods
 
     storage: str
     whitelisted_workflows: Optional[List[str]] = None
+    data_path: Optional[str] = None
+    scheduler_policy: str = "fifo"
+    scheduler_weights: Optional[Dict[str, float]] = None
+    scheduler_aging: float = 1.0
+    retention_max_finished_jobs: Optional[int] = None
+    retention_max_age: Optional[float] = None
+    retention_max_total_log_bytes: Optional[int] = None
+    retention_max_archived_jobs: Optional[int] = None
+    runner_workers: int = 1
+    runner_workflow_limits: Optional[Dict[str, int]] = None
+    runner_process_workflows: List[str] = []
+    runner_process_workers: Optional[int] = None
+    runner_max_concurrent_subtasks: int = 1
+    runner_batch_subtasks: bool = False
+    runner_checkpoints: bool = False
+    remote_workers_listen: Optional[str] = None
+    remote_workers_heartbeat_interval: float = 5.0
+    remote_workers_lease_timeout: Optional[float] = None
+    remote_workers_token: Optional[str] = None
+    admission_max_queued_jobs: Optional[int] = None
+    admission_workflow_limits: Optional[Dict[str, int]] = None
+    admission_client_rate: Optional[float] = None
+    admission_client_burst: int = 100
+    result_cache_enabled: bool = False
+    result_cache_max_entries: int = 100
+    result_cache_max_bytes: Optional[int] = None
+    result_cache_workflows: Optional[List[str]] = None
+    job_store_enabled: bool = True
+    stream_max_update_rate: Optional[float] = 10.0
 
 
 config_file_search_locations: List[str] = [
@@ -38,21 +68,131 @@ config_file_search_locations: List[str] = [
 ]
 
 
+def _default_data_path(storage: str) -> str:
+    storage_parent = os.path.dirname(
+        os.path.abspath(storage.rstrip("/\\") or os.sep)
+    )
+    return os.path.join(storage_parent, "speedcloud-data")
+
+
+def get_data_path(settings: Settings) -> str:
+    """Get the path used for the server's own data, such as archived jobs.
+
+    This is kept separate from the storage path so that it is not visible to
+    the users of the file manager. If not set, it is next to the storage
+    path.
+    """
+    if settings.data_path is not None:
+        return settings.data_path
+    return _default_data_path(settings.storage)
+
+
+def _is_temporary(path: str) -> bool:
+    temp_dir = os.path.realpath(tempfile.gettempdir())
+    return os.path.realpath(path).startswith(temp_dir + os.sep)
+
+
 def initialize_app_from_settings(settings: Settings) -> None:
     """Initialize app from settings."""
     if not os.path.exists(settings.storage):
         os.makedirs(settings.storage)
         logger.debug("created new folder %s", settings.storage)
+    data_path = get_data_path(settings)
+    if _is_temporary(data_path):
+        logger.warning(
+            "Saving jobs in temporary directory %s. They may be lost when "
+            "the system cleans up temporary files. Set data_path in the "
+            "config file to keep them somewhere else.",
+            data_path
+        )
+    if not os.path.exists(data_path):
+        os.makedirs(data_path)
+        logger.debug("created new folder %s", data_path)
 
 
 def read_settings_file(config_file: str) -> Settings:
     logger.debug('Using config file "%s".', config_file)
 
     with open(config_file, "r", encoding="utf-8") as handel:
-        data: Dict[str, Any] = tomlkit.parse(handel.read())
-    return Settings(
-        storage=data["main"]["storage_path"],
-    )
+        data: Dict[str, Any] = tomlkit.parse(handel.read()).unwrap()
+    settings: Dict[str, Any] = {"storage": data["main"]["storage_path"]}
+    if "data_path" in data["main"]:
+        settings["data_path"] = data["main"]["data_path"]
+
+    scheduler = data.get("scheduler", {})
+    if "policy" in scheduler:
+        settings["scheduler_policy"] = scheduler["policy"]
+    if "weights" in scheduler:
+        settings["scheduler_weights"] = scheduler["weights"]
+    if "aging" in scheduler:
+        settings["scheduler_aging"] = scheduler["aging"]
+
+    retention = data.get("retention", {})
+    for key, setting_name in [
+        ("max_finished_jobs", "retention_max_finished_jobs"),
+        ("max_age_seconds", "retention_max_age"),
+        ("max_total_log_bytes", "retention_max_total_log_bytes"),
+        ("max_archived_jobs", "retention_max_archived_jobs"),
+    ]:
+        if key in retention:
+            settings[setting_name] = retention[key]
+
+    runner = data.get("runner", {})
+    if "workers" in runner:
+        settings["runner_workers"] = runner["workers"]
+    if "workflow_limits" in runner:
+        settings["runner_workflow_limits"] = runner["workflow_limits"]
+    if "process_workflows" in runner:
+        settings["runner_process_workflows"] = runner["process_workflows"]
+    if "process_workers" in runner:
+        settings["runner_process_workers"] = runner["process_workers"]
+    if "max_concurrent_subtasks" in runner:
+        settings["runner_max_concurrent_subtasks"] = \
+            runner["max_concurrent_subtasks"]
+    if "batch_subtasks" in runner:
+        settings["runner_batch_subtasks"] = runner["batch_subtasks"]
+    if "checkpoints" in runner:
+        settings["runner_checkpoints"] = runner["checkpoints"]
+
+    remote_workers = data.get("remote_workers", {})
+    for key, setting_name in [
+        ("listen", "remote_workers_listen"),
+        ("heartbeat_interval", "remote_workers_heartbeat_interval"),
+        ("lease_timeout", "remote_workers_lease_timeout"),
+        ("token", "remote_workers_token"),
+    ]:
+        if key in remote_workers:
+            settings[setting_name] = remote_workers[key]
+
+    admission = data.get("admission", {})
+    for key, setting_name in [
+        ("max_queued_jobs", "admission_max_queued_jobs"),
+        ("workflow_limits", "admission_workflow_limits"),
+        ("client_rate", "admission_client_rate"),
+        ("client_burst", "admission_client_burst"),
+    ]:
+        if key in admission:
+            settings[setting_name] = admission[key]
+
+    result_cache = data.get("result_cache", {})
+    for key, setting_name in [
+        ("enabled", "result_cache_enabled"),
+        ("max_entries", "result_cache_max_entries"),
+        ("max_bytes", "result_cache_max_bytes"),
+        ("workflows", "result_cache_workflows"),
+    ]:
+        if key in result_cache:
+            settings[setting_name] = result_cache[key]
+
+    job_store = data.get("job_store", {})
+    if "enabled" in job_store:
+        settings["job_store_enabled"] = job_store["enabled"]
+
+    streams = data.get("streams", {})
+    if "max_update_rate" in streams:
+        settings["stream_max_update_rate"] = streams["max_update_rate"]
+
+    return Settings(**settings)
 
 
 def get_settings_from_file(
@@ -157,6 +297,17 @@ def generate_default_toml_config(
         "storage_path is the root path to use for files read and written to "
         "by the workflows. This is a required field."
     )
+    main.add(
+        "data_path",
+        prompt_for_input(
+            "path to keep the server's own data, such as saved jobs "
+            "(defaults to next to the storage path): "
+        ) or _default_data_path(main["storage_path"].unwrap()),
+    )
+    main["data_path"].comment(
+        "data_path is where the server keeps its own data, such as saved "
+        "jobs and their logs."
+    )
     return tomlkit.dumps(doc)
 
 
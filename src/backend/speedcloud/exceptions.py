@@ -17,3 +17,54 @@ class JobAlreadyAborted(SpeedCloudException):
         """
         super().__init__(*args)
         self.job_id = job_id
+
+
+class JobNotQueued(SpeedCloudException):
+    """Job is no longer waiting in the queue."""
+
+    def __init__(self, job_id, *args: object) -> None:
+        """Create a new exception for jobs that have left the queue.
+
+        Args:
+            job_id: Identity of job.
+            *args:
+        """
+        super().__init__(f"Job {job_id} is not queued", *args)
+        self.job_id = job_id
+
+
+class JobNotResumable(SpeedCloudException):
+    """Job can't be resumed."""
+
+    def __init__(self, job_id, *args: object) -> None:
+        """Create a new exception for jobs that can't be resumed.
+
+        Args:
+            job_id: Identity of job.
+            *args:
+        """
+        super().__init__(f"Job {job_id} can't be resumed", *args)
+        self.job_id = job_id
+
+
+class JobBatchTooLarge(SpeedCloudException):
+    """More jobs were submitted at once than a limit allows in the queue.
+
+    Unlike JobAdmissionRejected, submitting the same jobs again later won't
+    help.
+    """
+
+
+class JobAdmissionRejected(SpeedCloudException):
+    """Job was not accepted because a limit has been reached."""
+
+    def __init__(self, reason: str, retry_after: float) -> None:
+        """Create a new exception for jobs that were not accepted.
+
+        Args:
+            reason: which limit was reached.
+            retry_after: estimated number of seconds until the job would be
+                accepted.
+        """
+        super().__init__(reason)
+        self.retry_after = retry_after
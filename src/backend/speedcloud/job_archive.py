@@ -0,0 +1,209 @@
+"""Job archive.
+
+Stores finished jobs on disk once they are evicted from memory.
+"""
+
+from __future__ import annotations
+
+import collections
+import json
+import logging
+import os
+import queue
+import threading
+import typing
+from typing import Dict, List, Optional
+
+from speedcloud.job_files import job_file_path
+from speedcloud.json_file import atomic_write_json
+from speedcloud.job_logs import JobLogStore
+from speedcloud.job_manager import JobQueueItem
+
+__all__ = ["JobArchive"]
+
+logger = logging.getLogger(__name__)
+
+
+class JobArchive:
+    """Archive of finished jobs, stored as one json file per job.
+
+    With background_writes, jobs are written by a background thread so that
+    evicting them never waits for the disk. Until then, they are kept in
+    memory and can still be loaded.
+
+    With max_jobs, the jobs archived the longest ago are removed, along
+    with their logs, once there are more than that.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        log_store: Optional[JobLogStore] = None,
+        background_writes: bool = False,
+        max_jobs: Optional[int] = None,
+    ) -> None:
+        """Create a new archive.
+
+        Args:
+            path: directory to store the archived jobs in. It is created if
+                it does not already exist.
+            log_store: where the logs of the jobs are kept. The logs are
+                stored with the rest of the job if not set.
+            background_writes: write jobs from a background thread instead
+                of when they are saved.
+            max_jobs: maximum number of jobs kept. Not limited if not set.
+        """
+        self.path = path
+        self.log_store = log_store
+        self.background_writes = background_writes
+        self.max_jobs = max_jobs
+        os.makedirs(self.path, exist_ok=True)
+        # Ids of the jobs written, oldest first
+        self._archived: Optional[typing.OrderedDict[str, None]] = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._unwritten: Dict[str, JobQueueItem] = {}
+        self._pending: queue.Queue[Optional[str]] = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    def _job_file(self, job_id: str) -> str:
+        return job_file_path(self.path, job_id, ".json")
+
+    def __contains__(self, job_id: object) -> bool:
+        if not isinstance(job_id, str):
+            return False
+        if job_id in self._unwritten:
+            return True
+        try:
+            return os.path.exists(self._job_file(job_id))
+        except ValueError:
+            return False
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._archived_jobs())
+
+    def _archived_jobs(self) -> typing.OrderedDict[str, None]:
+        # Must be called with the lock held. The directory is only scanned
+        # the first time, after that the jobs are kept up to date as they
+        # are written and removed.
+        if self._archived is None:
+            try:
+                entries = [
+                    entry
+                    for entry in os.scandir(self.path)
+                    if entry.name.endswith(".json")
+                ]
+            except FileNotFoundError:
+                entries = []
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            self._archived = collections.OrderedDict(
+                (entry.name[:-len(".json")], None) for entry in entries
+            )
+        return self._archived
+
+    def save(self, item: JobQueueItem) -> None:
+        """Write job to the archive, replacing any existing copy."""
+        if not self.background_writes:
+            self._write(item)
+            return
+        self._job_file(item.job_id)
+        with self._lock:
+            self._unwritten[item.job_id] = item
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop,
+                    name="job archive writer",
+                    daemon=True
+                )
+                self._writer.start()
+        self._pending.put(item.job_id)
+
+    def flush(self) -> None:
+        """Wait until every job saved so far has been written."""
+        self._pending.join()
+
+    def close(self) -> None:
+        """Write any jobs waiting to be written and stop the writer."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._pending.put(None)
+            writer.join()
+
+    def _write_loop(self) -> None:
+        while True:
+            job_id = self._pending.get()
+            if job_id is None:
+                self._pending.task_done()
+                return
+            try:
+                with self._write_lock:
+                    with self._lock:
+                        item = self._unwritten.get(job_id)
+                    if item is not None:
+                        self._write(item)
+                        with self._lock:
+                            # Unless it was saved again meanwhile
+                            if self._unwritten.get(job_id) is item:
+                                del self._unwritten[job_id]
+            except Exception:  # pylint: disable=broad-exception-caught
+                # Keep the writer alive so other jobs are still archived
+                logger.exception("Unable to archive job %s", job_id)
+            finally:
+                self._pending.task_done()
+
+    def _write(self, item: JobQueueItem) -> None:
+        atomic_write_json(
+            self._job_file(item.job_id),
+            item.as_dict(include_logs=self.log_store is None)
+        )
+        pruned: List[str] = []
+        with self._lock:
+            archived = self._archived_jobs()
+            archived[item.job_id] = None
+            archived.move_to_end(item.job_id)
+            while self.max_jobs is not None and len(archived) > self.max_jobs:
+                pruned.append(archived.popitem(last=False)[0])
+        logger.debug("Archived job %s", item.job_id)
+        for job_id in pruned:
+            self._delete(job_id)
+            logger.debug("Removed job %s from the archive", job_id)
+
+    def load(self, job_id: str) -> Optional[JobQueueItem]:
+        """Load job from the archive.
+
+        Returns:
+            Returns None if the job is not in the archive.
+        """
+        try:
+            file_name = self._job_file(job_id)
+        except ValueError:
+            return None
+        if (item := self._unwritten.get(job_id)) is not None:
+            return item
+        try:
+            with open(file_name, "r", encoding="utf-8") as handle:
+                item = JobQueueItem.from_dict(json.load(handle))
+        except FileNotFoundError:
+            return None
+        if self.log_store is not None:
+            item.status["logs"] = self.log_store.open(job_id)
+        return item
+
+    def remove(self, job_id: str) -> None:
+        """Remove job from the archive if it exists."""
+        with self._write_lock:
+            with self._lock:
+                self._unwritten.pop(job_id, None)
+                if self._archived is not None:
+                    self._archived.pop(job_id, None)
+            self._delete(job_id)
+
+    def _delete(self, job_id: str) -> None:
+        if self.log_store is not None:
+            self.log_store.delete(job_id)
+        try:
+            os.remove(self._job_file(job_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,25 @@
+"""Job files.
+
+Paths of the files kept on disk for each job.
+"""
+
+import os
+
+__all__ = ["job_file_path"]
+
+
+def job_file_path(directory: str, job_id: str, extension: str) -> str:
+    """Get the path of a file of a job.
+
+    Args:
+        directory: directory that the file is kept in.
+        job_id: id of the job.
+        extension: file extension, including the dot.
+
+    Raises:
+        ValueError: if the job id can't be used as a file name.
+    """
+    # Job ids come from the api so don't trust them as file names.
+    if os.path.basename(job_id) != job_id or job_id in ("", ".", ".."):
+        raise ValueError(f"Invalid job id {job_id}")
+    return os.path.join(directory, f"{job_id}{extension}")
@@ -0,0 +1,396 @@
+"""Job logs.
+
+Log messages of jobs, kept either in memory or in an append-only file for
+each job so that long running, chatty jobs don't keep all of their logs in
+memory.
+"""
+
+from __future__ import annotations
+
+import collections
+import collections.abc
+import json
+import logging
+import os
+import queue
+import threading
+import typing
+import weakref
+from typing import Callable, Iterable, List, Optional, Union, overload
+
+from speedcloud.job_files import job_file_path
+
+if typing.TYPE_CHECKING:
+    from speedcloud.job_manager import JobLog
+
+__all__ = ["JobLogs", "JobLogStore"]
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(log: JobLog) -> bytes:
+    return json.dumps(
+        {"msg": log["msg"], "time": log["time"]}, separators=(",", ":")
+    ).encode("utf-8")
+
+
+_MSG_START = len(b'{"msg":"')
+_TIME_FIELD = b'","time":'
+
+
+def _encoded_message_bytes(line: bytes) -> int:
+    # Size of the message as stored, found without decoding the line.
+    return max(0, line.rfind(_TIME_FIELD) - _MSG_START)
+
+
+class JobLogs(collections.abc.Sequence):
+    """Append-only sequence of the log messages of a job.
+
+    If a path is given, each message is appended to the file as a line of
+    json. Only the most recent tail_size messages and the byte offset of
+    every index_interval-th message are kept in memory, so that a range of
+    messages can be read without going through the whole file.
+
+    If a writer is given, messages are written to the file by calling it
+    with these logs, usually from a background thread, instead of when
+    they are added. Adding messages then never waits for the file.
+    """
+
+    def __init__(
+        self,
+        logs: Iterable[JobLog] = (),
+        path: Optional[str] = None,
+        index_interval: int = 64,
+        tail_size: int = 1000,
+        writer: Optional[Callable[[JobLogs], None]] = None,
+    ) -> None:
+        """Create new job logs.
+
+        Args:
+            logs: messages to start with, added after any already saved.
+            path: file to append the messages to. Kept in memory only if
+                not set.
+            index_interval: number of messages between the offsets kept in
+                the index.
+            tail_size: number of the most recent messages kept in memory so
+                that reading them doesn't need the file.
+            writer: called with these logs when there are messages waiting
+                to be written, which it should do by calling flush. The
+                messages are written right away if not set.
+        """
+        self.path = path
+        self.index_interval = index_interval
+        self._writer = writer
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._memory: List[JobLog] = []
+        self._tail: typing.Deque[JobLog] = collections.deque(
+            maxlen=tail_size
+        )
+        self._unwritten: List[bytes] = []
+        self._discarded = False
+        self._offsets: List[int] = []
+        self._count = 0
+        self._end = 0
+        self._message_bytes = 0
+        if self.path is not None:
+            self._load()
+        self.extend(logs)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @overload
+    def __getitem__(self, index: int) -> JobLog:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[JobLog]:
+        ...
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[JobLog, List[JobLog]]:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            if step != 1:
+                return list(self)[index]
+            return self.read(start, stop - start)
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("log index out of range")
+        return self.read(index, 1)[0]
+
+    def __iter__(self) -> typing.Iterator[JobLog]:
+        return iter(self.read())
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, collections.abc.Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(count={self._count})"
+
+    @property
+    def message_bytes(self) -> int:
+        """Get the number of bytes used by the messages.
+
+        For messages loaded from an existing file, this is the size of the
+        messages as stored, which includes any escaping.
+        """
+        return self._message_bytes
+
+    def append(self, log: JobLog) -> None:
+        """Add a message to the end."""
+        self.extend([log])
+
+    def extend(self, logs: Iterable[JobLog]) -> None:
+        """Add messages to the end."""
+        logs = list(logs)
+        if not logs:
+            return
+        with self._lock:
+            if self.path is None:
+                self._memory.extend(logs)
+            else:
+                was_written = not self._unwritten
+                offset = self._end
+                for index, log in enumerate(logs, start=self._count):
+                    if index % self.index_interval == 0:
+                        self._offsets.append(offset)
+                    line = _encode(log) + b"\n"
+                    self._unwritten.append(line)
+                    offset += len(line)
+                self._end = offset
+                self._tail.extend(logs)
+            self._count += len(logs)
+            self._message_bytes += sum(len(log["msg"]) for log in logs)
+        if self.path is None:
+            return
+        if self._writer is None:
+            self.flush()
+        elif was_written:
+            self._writer(self)
+
+    def flush(self) -> None:
+        """Write any messages waiting to be written to the file."""
+        if self.path is None:
+            return
+        with self._write_lock:
+            with self._lock:
+                if self._discarded:
+                    return
+                data = b"".join(self._unwritten)
+                self._unwritten.clear()
+            if data:
+                with open(self.path, "ab") as handle:
+                    handle.write(data)
+
+    def discard(self) -> None:
+        """Stop writing to the file, such as when it is about to be deleted.
+        """
+        with self._write_lock, self._lock:
+            self._discarded = True
+            self._unwritten.clear()
+
+    def _tail_range(
+        self, start: int, limit: Optional[int]
+    ) -> typing.Tuple[int, int, Optional[List[JobLog]]]:
+        # Must be called with the lock held
+        count = self._count
+        start = max(0, start)
+        stop = count if limit is None else min(count, start + limit)
+        if start >= stop:
+            return start, stop, []
+        if self.path is None:
+            return start, stop, self._memory[start:stop]
+        tail_start = count - len(self._tail)
+        if start >= tail_start:
+            return start, stop, list(self._tail)[
+                start - tail_start:stop - tail_start
+            ]
+        return start, stop, None
+
+    def read_raw(
+        self, start: int = 0, limit: Optional[int] = None
+    ) -> List[bytes]:
+        """Read messages as they are stored, encoded as json.
+
+        Reading older messages than the ones kept in memory reads the file,
+        so this shouldn't be called from the event loop.
+
+        Args:
+            start: index of the first message to read.
+            limit: maximum number of messages to read. Everything after start
+                is read if not set.
+
+        Returns:
+            Returns each message as a json object without a line ending.
+        """
+        with self._lock:
+            start, stop, logs = self._tail_range(start, limit)
+        if logs is not None:
+            return [_encode(log) for log in logs]
+        self.flush()
+        block = start // self.index_interval
+        with open(typing.cast(str, self.path), "rb") as handle:
+            handle.seek(self._offsets[block])
+            for _ in range(start - block * self.index_interval):
+                handle.readline()
+            return [
+                handle.readline().rstrip(b"\n")
+                for _ in range(stop - start)
+            ]
+
+    def read(
+        self, start: int = 0, limit: Optional[int] = None
+    ) -> List[JobLog]:
+        """Read messages.
+
+        Args:
+            start: index of the first message to read.
+            limit: maximum number of messages to read. Everything after start
+                is read if not set.
+        """
+        with self._lock:
+            _, _, logs = self._tail_range(start, limit)
+        if logs is not None:
+            return logs
+        return [json.loads(line) for line in self.read_raw(start, limit)]
+
+    def _load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            handle = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        tail: typing.Deque[bytes] = collections.deque(
+            maxlen=self._tail.maxlen
+        )
+        with handle:
+            # Only the lines kept in memory are decoded. The index is built
+            # from the length of each line.
+            for line in handle:
+                if not line.endswith(b"\n"):
+                    # Most likely the last line was cut short by a crash.
+                    logger.warning(
+                        "Ignoring unreadable end of job log %s", self.path
+                    )
+                    break
+                if self._count % self.index_interval == 0:
+                    self._offsets.append(self._end)
+                self._end += len(line)
+                self._count += 1
+                self._message_bytes += _encoded_message_bytes(line)
+                tail.append(line)
+        self._tail.extend(json.loads(line) for line in tail)
+        if self._end != os.path.getsize(self.path):
+            os.truncate(self.path, self._end)
+
+
+class JobLogStore:
+    """Logs of jobs, saved as one file for each job.
+
+    The files are written to by a background thread so that adding log
+    messages never waits for the disk.
+    """
+
+    def __init__(self, path: str, index_interval: int = 64) -> None:
+        """Create a new store.
+
+        Args:
+            path: directory to save the logs in.
+            index_interval: number of messages between the offsets kept in
+                the index of each job.
+        """
+        self.path = path
+        self.index_interval = index_interval
+        self._open_logs: weakref.WeakValueDictionary[str, JobLogs] = \
+            weakref.WeakValueDictionary()
+        self._pending: queue.Queue[Optional[JobLogs]] = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+    def _log_path(self, job_id: str) -> str:
+        return job_file_path(self.path, job_id, ".jsonl")
+
+    def __contains__(self, job_id: object) -> bool:
+        if not isinstance(job_id, str):
+            return False
+        if self._open_logs.get(job_id):
+            # Possibly not written yet
+            return True
+        try:
+            return os.path.exists(self._log_path(job_id))
+        except ValueError:
+            return False
+
+    def open(self, job_id: str, logs: Iterable[JobLog] = ()) -> JobLogs:
+        """Open the logs of a job, creating them if there aren't any.
+
+        Args:
+            job_id: id of the job.
+            logs: messages to add if the job has no saved logs yet.
+        """
+        path = self._log_path(job_id)
+        if (job_logs := self._open_logs.get(job_id)) is None:
+            os.makedirs(self.path, exist_ok=True)
+            job_logs = JobLogs(
+                path=path,
+                index_interval=self.index_interval,
+                writer=self._schedule_write,
+            )
+            self._open_logs[job_id] = job_logs
+        if not job_logs:
+            job_logs.extend(logs)
+        return job_logs
+
+    def delete(self, job_id: str) -> None:
+        """Remove the logs of a job."""
+        if (job_logs := self._open_logs.pop(job_id, None)) is not None:
+            job_logs.discard()
+        try:
+            os.remove(self._log_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def flush(self) -> None:
+        """Wait until every message added so far has been written."""
+        self._pending.join()
+
+    def close(self) -> None:
+        """Write any messages waiting to be written and stop the writer."""
+        with self._writer_lock:
+            if self._writer is None:
+                return
+            self._pending.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def _schedule_write(self, job_logs: JobLogs) -> None:
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop,
+                    name="job log writer",
+                    daemon=True
+                )
+                self._writer.start()
+        self._pending.put(job_logs)
+
+    def _write_loop(self) -> None:
+        while True:
+            job_logs = self._pending.get()
+            if job_logs is None:
+                self._pending.task_done()
+                return
+            try:
+                job_logs.flush()
+            except Exception:  # pylint: disable=broad-exception-caught
+                # Keep the writer alive so the logs of other jobs are saved
+                logger.exception("Unable to write job log %s", job_logs.path)
+            finally:
+                self._pending.task_done()
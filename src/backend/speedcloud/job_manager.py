@@ -5,10 +5,14 @@ from __future__ import annotations
 import abc
 import time
 import asyncio
+import concurrent.futures
 import collections.abc
 import dataclasses
 import datetime
+import functools
+import heapq
 import logging
+import threading
 import traceback
 import typing
 import warnings
@@ -23,6 +27,7 @@ from typing import (
     Type,
     TYPE_CHECKING,
     TypedDict,
+    Union,
 )
 try:
     from typing import Unpack
@@ -32,11 +37,34 @@ except ImportError:  # pragma: no cover
 
 import uuid
 import speedwagon
+from speedwagon.tasks.tasks import TaskStatus
 from speedcloud.workflow_manager import WorkflowManagerAllWorkflows
-from speedcloud.exceptions import JobAlreadyAborted
+from speedcloud.admission import (
+    AdmissionController,
+    AdmissionPolicy,
+    DrainRateMeter,
+)
+from speedcloud.broadcast import BroadcastHub, Subscription
+from speedcloud.checkpoint import CheckpointStore, JobCheckpoint
+from speedcloud.exceptions import (
+    JobAlreadyAborted,
+    JobNotQueued,
+    JobNotResumable,
+)
+from speedcloud.job_logs import JobLogs, JobLogStore
+from speedcloud.result_cache import CachedResult, ResultCache
+from speedcloud.runtime_history import JobRuntime, RuntimeHistory
+from speedcloud.scheduler import AbsJobScheduler, FIFOScheduler
+from speedcloud.subtask_runner import (
+    AbsSubtaskRunner,
+    ProcessSubtaskRunner,
+    ThreadSubtaskRunner,
+)
 from .api import schema
 
 if TYPE_CHECKING:
+    from speedcloud.job_archive import JobArchive
+    from speedcloud.job_store import AbsJobStore
     from speedcloud.workflow_manager import (
         WorkflowData,
         AbsWorkflowManager,
@@ -44,27 +72,34 @@ if TYPE_CHECKING:
     )
     from speedwagon.workflow import UserDataType
 
-__all__ = ["JobManager", "JobRunner", "JobQueueItem", "AsyncEventNotifier"]
+__all__ = [
+    "JobManager",
+    "AbsJobRunner",
+    "JobRunner",
+    "JobRunnerPool",
+    "JobQueueItem",
+    "NewJob",
+    "AsyncEventNotifier",
+]
 
 module_logger = logging.getLogger(__name__)
 module_logger.setLevel(logging.INFO)
 
 
-class AsyncEventNotifier:
-    """Notify of event."""
+class AsyncEventNotifier(Subscription[None]):
+    """Notify of event.
+
+    Notifications that arrive before the last one was waited for are
+    combined into one.
+    """
 
     def __init__(self) -> None:
         """Create a new AsyncEventNotifier object."""
-        self._condition = asyncio.Event()
+        super().__init__(max_buffer=1)
 
     async def notify(self) -> None:
         """Notify of an event."""
-        self._condition.set()
-
-    async def wait_for_update(self) -> None:
-        """Wait for a notification."""
-        await self._condition.wait()
-        self._condition.clear()
+        self.deliver(None)
 
 
 class JobLog(TypedDict):
@@ -75,9 +110,24 @@ class JobLog(TypedDict):
 class JobStatus(typing.TypedDict, total=False):
     progress: Optional[float]
     start_time: Optional[datetime.datetime]
-    logs: List[JobLog]
+    logs: Union[List[JobLog], JobLogs]
     current_task: Optional[str]
     report: Optional[str]
+    subtask_count: Optional[int]
+
+
+@dataclasses.dataclass
+class NewJob:
+    """Job to be added to the job manager."""
+
+    workflow: WorkflowData
+    details: typing.Dict[str, UserDataType]
+    priority: int = 0
+    input_size: Optional[int] = None
+
+
+StateChangeCallback = Callable[["JobQueueItem", schema.JobState], None]
+StatusChangeCallback = Callable[["JobQueueItem", JobStatus], None]
 
 
 @dataclasses.dataclass
@@ -93,42 +143,503 @@ class JobQueueItem:
         default_factory=lambda: JobStatus(
             progress=None,
             start_time=None,
-            logs=[],
+            logs=JobLogs(),
             report=None,
             current_task=None,
         )
     )
+    priority: int = 0
+    submitter: Optional[str] = None
+    input_size: Optional[int] = None
+
+    # Set when the job reused the results of an earlier job instead of
+    # running, so its runtime says nothing about how long the workflow takes
+    from_cache: bool = dataclasses.field(default=False, compare=False)
+    _state_change_callbacks: List[StateChangeCallback] = dataclasses.field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
+    _status_change_callbacks: List[StatusChangeCallback] = dataclasses.field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
+
+    def __setattr__(self, name: str, value: typing.Any) -> None:
+        """Set attribute and notify callbacks if the state changed."""
+        previous_state = self.__dict__.get("state")
+        super().__setattr__(name, value)
+        if name != "state" or previous_state is None:
+            return
+        if previous_state == value:
+            return
+        callbacks = self.__dict__.get("_state_change_callbacks", [])
+        for callback in list(callbacks):
+            callback(self, previous_state)
+
+    def add_on_state_change_callback(
+        self, callback: StateChangeCallback
+    ) -> None:
+        """Add callback called with the item and its previous state."""
+        self._state_change_callbacks.append(callback)
+
+    def remove_on_state_change_callback(
+        self, callback: StateChangeCallback
+    ) -> None:
+        """Remove state change callback."""
+        self._state_change_callbacks.remove(callback)
+
+    def add_on_status_change_callback(
+        self, callback: StatusChangeCallback
+    ) -> None:
+        """Add callback called with the item and the status values updated."""
+        self._status_change_callbacks.append(callback)
+
+    def remove_on_status_change_callback(
+        self, callback: StatusChangeCallback
+    ) -> None:
+        """Remove status change callback."""
+        self._status_change_callbacks.remove(callback)
+
+    def update_status(self, status: JobStatus) -> None:
+        """Merge status values into the current status.
+
+        Logs are appended to the existing logs, everything else is replaced.
+        """
+        # This should have JobStatus values but not requiring them
+        if "progress" in status:
+            self.status["progress"] = status["progress"]
+
+        if "current_task" in status:
+            self.status["current_task"] = status["current_task"]
+
+        if "start_time" in status and status['start_time'] is not None:
+            self.status["start_time"] = status["start_time"]
+
+        if "logs" in status:
+            self.status["logs"].extend(status["logs"])
+
+        if "report" in status and status['report'] is not None:
+            self.status["report"] = status["report"]
+
+        if "subtask_count" in status:
+            self.status["subtask_count"] = status["subtask_count"]
+
+        for callback in list(self._status_change_callbacks):
+            callback(self, status)
+
+    def log_size(self) -> int:
+        """Get the number of bytes used by the log messages and report."""
+        logs = self.status.get("logs", [])
+        return (
+            logs.message_bytes
+            if isinstance(logs, JobLogs)
+            else sum(len(log["msg"]) for log in logs)
+        ) + len(self.status.get("report") or "")
+
+    def as_dict(
+        self, include_logs: bool = True
+    ) -> typing.Dict[str, typing.Any]:
+        """Generate data as a dict that can be serialized as json.
+
+        Args:
+            include_logs: include the log messages.
+        """
+        start_time = self.status.get("start_time")
+        return {
+            "job": self.job,
+            "state": self.state.value,
+            "order": self.order,
+            "job_id": self.job_id,
+            "time_submitted": self.time_submitted.isoformat(),
+            "status": {
+                "progress": self.status.get("progress"),
+                "start_time":
+                    start_time.isoformat() if start_time else None,
+                "logs":
+                    list(self.status.get("logs", [])) if include_logs else [],
+                "report": self.status.get("report"),
+                "current_task": self.status.get("current_task"),
+            },
+            "priority": self.priority,
+            "submitter": self.submitter,
+            "input_size": self.input_size,
+        }
+
+    @classmethod
+    def from_dict(cls, data: typing.Mapping[str, typing.Any]) -> JobQueueItem:
+        """Create a new job queue item from data generated by as_dict."""
+        status = data["status"]
+        start_time = status.get("start_time")
+        return cls(
+            job=data["job"],
+            state=schema.JobState(data["state"]),
+            order=data["order"],
+            job_id=data["job_id"],
+            time_submitted=datetime.datetime.fromisoformat(
+                data["time_submitted"]
+            ),
+            status=JobStatus(
+                progress=status.get("progress"),
+                start_time=datetime.datetime.fromisoformat(start_time)
+                if start_time
+                else None,
+                logs=JobLogs(status.get("logs", [])),
+                report=status.get("report"),
+                current_task=status.get("current_task"),
+            ),
+            priority=data.get("priority", 0),
+            submitter=data.get("submitter"),
+            input_size=data.get("input_size"),
+        )
+
+
+FINISHED_STATES = frozenset(
+    [
+        schema.JobState.SUCCESS,
+        schema.JobState.FAILED,
+        schema.JobState.ABORTED,
+        schema.JobState.INTERRUPTED,
+    ]
+)
+
+# Status values saved by a job store
+_SAVED_STATUS_KEYS = frozenset(
+    ["progress", "current_task", "report", "start_time"]
+)
+
+# Status values that change often while a job is running
+_PROGRESS_STATUS_KEYS = frozenset(["progress", "current_task"])
+
+
+def _serialize_status(
+    status: JobStatus, keys: typing.AbstractSet[str]
+) -> typing.Dict[str, typing.Any]:
+    serialized: typing.Dict[str, typing.Any] = {
+        key: value for key, value in status.items() if key in keys
+    }
+    if isinstance(serialized.get("start_time"), datetime.datetime):
+        serialized["start_time"] = serialized["start_time"].isoformat()
+    return serialized
+
+
+# Jobs that stopped before they finished all their subtasks
+RESUMABLE_STATES = frozenset(
+    [
+        schema.JobState.FAILED,
+        schema.JobState.ABORTED,
+        schema.JobState.INTERRUPTED,
+    ]
+)
 
 
 @dataclasses.dataclass
-class JobContainerMetadata:
-    data: JobQueueItem
-    accessed: bool = False
+class RetentionPolicy:
+    """Limits on how many finished jobs are kept in memory.
+
+    Any limit set to None is not enforced.
+    """
+
+    max_finished_jobs: Optional[int] = None
+    max_age: Optional[float] = None
+    max_total_log_bytes: Optional[int] = None
+
+    # seconds between checks for jobs older than max_age while the server
+    # is otherwise idle
+    check_interval: float = 60.0
 
 
 class JobContainer:
-    def __init__(self) -> None:
-        self._job_queue: List[JobContainerMetadata] = []
+    """Indexed storage of job queue items.
+
+    Jobs are indexed by job id, by state and by workflow id so that lookups,
+    state transitions and filtered listings don't have to scan every job.
+    Queued jobs waiting to be dispatched are kept in a scheduler.
+
+    Finished jobs are evicted, oldest first, once they exceed the limits of
+    the retention policy. Evicted jobs are moved to the archive if one is
+    given and can still be looked up with get.
+    """
+
+    def __init__(
+        self,
+        scheduler: Optional[AbsJobScheduler] = None,
+        retention: Optional[RetentionPolicy] = None,
+        archive: Optional[JobArchive] = None,
+    ) -> None:
+        """Create a new empty container.
+
+        Args:
+            scheduler: decides the dispatch order. Defaults to FIFO order.
+            retention: limits on finished jobs kept in memory.
+            archive: where evicted jobs are stored.
+        """
+        self._jobs: typing.Dict[str, JobQueueItem] = {}
+        self._by_state: typing.DefaultDict[
+            schema.JobState, typing.Dict[str, JobQueueItem]
+        ] = collections.defaultdict(dict)
+        self._by_workflow: typing.DefaultDict[
+            int, typing.Dict[str, JobQueueItem]
+        ] = collections.defaultdict(dict)
+        self._workflow_state_counts: typing.Counter[
+            typing.Tuple[int, schema.JobState]
+        ] = collections.Counter()
+        self._pending: AbsJobScheduler = (
+            scheduler if scheduler is not None else FIFOScheduler()
+        )
+        self.retention = retention or RetentionPolicy()
+        self.archive = archive
+
+        # finished job id -> (time finished, log size), oldest first
+        self._finished: typing.OrderedDict[
+            str, typing.Tuple[float, int]
+        ] = collections.OrderedDict()
+        self._finished_log_bytes = 0
+        self._next_order = 0
+        self._eviction_callbacks: List[Callable[[JobQueueItem], None]] = []
 
     def __len__(self) -> int:
-        return len(self._job_queue)
+        return len(self._jobs)
+
+    def __contains__(self, job_id: object) -> bool:
+        return job_id in self._jobs
+
+    @property
+    def next_order(self) -> int:
+        """Get the order number to use for the next job added."""
+        return self._next_order
 
     def job_queue(self) -> List[JobQueueItem]:
-        return [item.data for item in self._job_queue]
+        """Get all jobs in the order they were added."""
+        return list(self._jobs.values())
 
     def add(self, item: JobQueueItem) -> None:
-        self._job_queue.append(JobContainerMetadata(data=item))
+        """Add a job to the container."""
+        self._jobs[item.job_id] = item
+        self._by_state[item.state][item.job_id] = item
+        self._by_workflow[item.job["workflow"]["id"]][item.job_id] = item
+        self._workflow_state_counts[
+            (item.job["workflow"]["id"], item.state)
+        ] += 1
+        item.add_on_state_change_callback(self._reindex_state)
+        self._next_order = max(self._next_order, item.order + 1)
+        if item.state == schema.JobState.QUEUED:
+            self._pending.push(item)
+        elif item.state in FINISHED_STATES:
+            self._mark_finished(item)
+            self.enforce_retention()
+
+    def get(self, job_id: str) -> JobQueueItem:
+        """Get job by id.
+
+        Jobs that have been evicted are loaded back from the archive. They
+        are not added back to the container.
+
+        Raises:
+            KeyError: if no job with that id is stored in the container or
+                the archive.
+        """
+        try:
+            return self._jobs[job_id]
+        except KeyError:
+            if self.archive is not None:
+                if (item := self.archive.load(job_id)) is not None:
+                    return item
+            raise
+
+    def count(self, *states: schema.JobState) -> int:
+        """Count the number of jobs in any of the given states."""
+        return sum(len(self._by_state.get(state, {})) for state in states)
+
+    def state_counts(self) -> typing.Dict[schema.JobState, int]:
+        """Get the number of jobs in each state, including empty states."""
+        return {
+            state: len(self._by_state.get(state, {}))
+            for state in schema.JobState
+        }
 
-    def iter(self) -> Iterable[JobContainerMetadata]:
-        for job in self._job_queue:
-            if job.accessed:
-                continue
-            yield job
+    def count_in_workflow(
+        self, workflow_id: int, *states: schema.JobState
+    ) -> int:
+        """Count the jobs of a workflow in any of the given states."""
+        return sum(
+            self._workflow_state_counts[(workflow_id, state)]
+            for state in states
+        )
+
+    def archived_count(self) -> int:
+        """Get the number of jobs moved to the archive."""
+        return len(self.archive) if self.archive is not None else 0
+
+    def filter(
+        self,
+        states: Optional[Iterable[schema.JobState]] = None,
+        workflow_id: Optional[int] = None,
+    ) -> List[JobQueueItem]:
+        """Get the jobs matching the given states and/or workflow id.
+
+        The smallest matching index is walked, so the cost depends on the
+        number of matching jobs rather than on the size of the container.
+        """
+        if states is None and workflow_id is None:
+            return self.job_queue()
+
+        candidates: List[typing.Dict[str, JobQueueItem]] = []
+        if states is not None:
+            states = set(states)
+            candidates.append(
+                {
+                    job_id: item
+                    for state in states
+                    for job_id, item in self._by_state.get(state, {}).items()
+                }
+            )
+        if workflow_id is not None:
+            candidates.append(self._by_workflow.get(workflow_id, {}))
+
+        smallest = min(candidates, key=len)
+        return sorted(
+            (
+                item
+                for item in smallest.values()
+                if (states is None or item.state in states)
+                and (
+                    workflow_id is None
+                    or item.job["workflow"]["id"] == workflow_id
+                )
+            ),
+            key=lambda item: item.order,
+        )
+
+    def _reindex_state(
+        self, item: JobQueueItem, previous_state: schema.JobState
+    ) -> None:
+        previous_bucket = self._by_state.get(previous_state)
+        if previous_bucket is not None:
+            previous_bucket.pop(item.job_id, None)
+        self._by_state[item.state][item.job_id] = item
+        workflow_id = item.job["workflow"]["id"]
+        self._workflow_state_counts[(workflow_id, previous_state)] -= 1
+        self._workflow_state_counts[(workflow_id, item.state)] += 1
+
+        if item.state in FINISHED_STATES:
+            self._mark_finished(item)
+            self.enforce_retention()
+        elif previous_state in FINISHED_STATES:
+            _, log_size = self._finished.pop(item.job_id, (0, 0))
+            self._finished_log_bytes -= log_size
+
+    def _mark_finished(self, item: JobQueueItem) -> None:
+        _, previous_size = self._finished.pop(item.job_id, (0, 0))
+        log_size = item.log_size()
+        self._finished[item.job_id] = (time.time(), log_size)
+        self._finished_log_bytes += log_size - previous_size
+
+    def _over_retention_limit(self, now: float) -> bool:
+        if not self._finished:
+            return False
+        policy = self.retention
+        if (
+            policy.max_finished_jobs is not None
+            and len(self._finished) > policy.max_finished_jobs
+        ):
+            return True
+        if (
+            policy.max_total_log_bytes is not None
+            and self._finished_log_bytes > policy.max_total_log_bytes
+        ):
+            return True
+        if policy.max_age is not None:
+            oldest_finish_time, _ = next(iter(self._finished.values()))
+            return now - oldest_finish_time > policy.max_age
+        return False
+
+    def enforce_retention(self) -> List[str]:
+        """Evict finished jobs, oldest first, until within retention limits.
+
+        Returns:
+            Returns the ids of the jobs evicted.
+        """
+        evicted = []
+        now = time.time()
+        while self._over_retention_limit(now):
+            job_id, (_, log_size) = self._finished.popitem(last=False)
+            self._finished_log_bytes -= log_size
+            self._evict(self._jobs[job_id])
+            evicted.append(job_id)
+        return evicted
+
+    def _evict(self, item: JobQueueItem) -> None:
+        del self._jobs[item.job_id]
+        self._by_state[item.state].pop(item.job_id, None)
+        workflow_id = item.job["workflow"]["id"]
+        self._workflow_state_counts[(workflow_id, item.state)] -= 1
+        self._by_workflow[workflow_id].pop(item.job_id, None)
+        if not self._by_workflow[workflow_id]:
+            del self._by_workflow[workflow_id]
+        self._pending.discard(item.job_id)
+        item.remove_on_state_change_callback(self._reindex_state)
+        if self.archive is not None:
+            self.archive.save(item)
+        for callback in self._eviction_callbacks:
+            callback(item)
+
+    def add_on_evicted_callback(
+        self, callback: Callable[[JobQueueItem], None]
+    ) -> None:
+        """Add callback called with each job evicted from the container."""
+        self._eviction_callbacks.append(callback)
+
+    def pop_next(self) -> Optional[JobQueueItem]:
+        """Get the next job waiting to be dispatched.
 
-    def pop_next(self) -> typing.Iterator[JobQueueItem]:
-        for job in self.iter():
-            job.accessed = True
-            yield job.data
+        Jobs that left the queued state before they were dispatched are
+        skipped.
+
+        Returns:
+            Returns the next queued job or None if nothing is waiting.
+        """
+        while (item := self._pending.pop()) is not None:
+            if item.state == schema.JobState.QUEUED:
+                return item
+        return None
+
+    def requeue(self, item: JobQueueItem) -> None:
+        """Put a job that was taken out with pop_next back to be dispatched.
+
+        Raises:
+            KeyError: if the job is not stored in the container.
+        """
+        if item.job_id not in self._jobs:
+            raise KeyError(item.job_id)
+        if item.state == schema.JobState.QUEUED:
+            self._pending.push(item)
+
+    def pending_count(self) -> int:
+        """Get the number of jobs waiting to be dispatched."""
+        return len(self._pending)
+
+    @property
+    def uses_input_size(self) -> bool:
+        """Check if the order of the jobs depends on the size of inputs."""
+        return self._pending.uses_input_size
+
+    def pending_jobs(self) -> List[JobQueueItem]:
+        """Get the jobs waiting, in the order they would be dispatched."""
+        return [
+            item
+            for item in self._pending.ordered()
+            if item.state == schema.JobState.QUEUED
+        ]
+
+    def reprioritize(self, job_id: str, priority: int) -> None:
+        """Change the priority of a job that has not been dispatched yet.
+
+        Raises:
+            KeyError: if no job with that id is stored in the container.
+            JobNotQueued: if the job has already been dispatched.
+        """
+        item = self._jobs[job_id]
+        if job_id not in self._pending:
+            raise JobNotQueued(job_id)
+        self._pending.reprioritize(item, priority)
 
 
 class JobManager:
@@ -137,52 +648,149 @@ class JobManager:
     Manages the jobs given.
     """
 
+    # Minimum number of seconds between saving the progress of a job
+    status_save_interval: float = 1.0
+
     def __init__(
-        self, queue: Optional[asyncio.Queue[JobQueueItem]] = None
+        self,
+        queue: Optional[asyncio.Queue[JobQueueItem]] = None,
+        scheduler: Optional[AbsJobScheduler] = None,
+        retention: Optional[RetentionPolicy] = None,
+        archive: Optional[JobArchive] = None,
+        store: Optional[AbsJobStore] = None,
+        workflow_limits: Optional[typing.Mapping[str, int]] = None,
+        admission: Optional[AdmissionPolicy] = None,
+        runtime_history: Optional[RuntimeHistory] = None,
+        log_store: Optional[JobLogStore] = None,
+        checkpoints: Optional[CheckpointStore] = None,
     ) -> None:
         """Create a job manager.
 
         Args:
             queue: job queue be used to send to a worker.
+            scheduler: decides the order that queued jobs are sent to the
+                workers. Defaults to FIFO order.
+            retention: limits on finished jobs kept in memory.
+            archive: where finished jobs evicted from memory are stored.
+            store: where jobs are persisted so they can be restored after a
+                restart.
+            workflow_limits: maximum number of jobs of a workflow, keyed by
+                the workflow name, that are sent to the workers at the same
+                time. Workflows not listed are not limited.
+            admission: limits on the jobs accepted. All jobs are accepted if
+                not set.
+            runtime_history: where the runtimes of successful jobs are
+                recorded and used to estimate when queued jobs will start.
+            log_store: where the log messages of jobs are saved. Kept in
+                memory if not set.
+            checkpoints: checkpoint store of the job runner. The checkpoint
+                of a job is removed once it is evicted, since it can't be
+                resumed after that.
         """
         self.stop = asyncio.Event()
-        self._new_item_added = asyncio.Event()
-        self._container = JobContainer()
+        self._queue_changed = asyncio.Event()
+        self._container = JobContainer(
+            scheduler, retention=retention, archive=archive
+        )
         self._job_queue = queue or asyncio.Queue()
         self._notification_manager = NotificationManager()
-
-    async def _wait_for_next_event(self) -> None:
-        tasks = [
-            asyncio.create_task(
-                self._new_item_added.wait(), name="wait_for_new_item"
-            ),
-            asyncio.create_task(asyncio.sleep(10), name="timeout"),
-            asyncio.create_task(self.stop.wait(), name="stop_called"),
-        ]
-        await asyncio.gather(
-            asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED),
-            self._notification_manager.notify_async(),
+        self._store = store
+        if self._store is not None:
+            self._container.add_on_evicted_callback(self._forget_evicted)
+        self._checkpoints = checkpoints
+        if self._checkpoints is not None:
+            self._container.add_on_evicted_callback(
+                self._delete_evicted_checkpoint
+            )
+        self._workflow_limits = dict(workflow_limits or {})
+        self._dispatched: typing.Counter[str] = collections.Counter()
+        self._deferred: typing.DefaultDict[
+            str, typing.Deque[JobQueueItem]
+        ] = collections.defaultdict(collections.deque)
+        self.drain_rate = DrainRateMeter()
+        self.runtime_history = runtime_history
+        self._log_store = log_store
+        self._status_saved_at: typing.Dict[str, float] = {}
+        self._admission = (
+            AdmissionController(admission, drain_rate=self.drain_rate)
+            if admission is not None
+            else None
         )
-        for task in tasks:
-            if not task.done():
-                task.cancel()
-        tasks.clear()
-        self._new_item_added.clear()
+
+    def shutdown(self) -> None:
+        """Stop producing once every queued job has been sent to a worker."""
+        self.stop.set()
+        self._queue_changed.set()
 
     async def produce(self) -> None:
-        """Add jobs into a queue to be picked up by the workers."""
+        """Add jobs into a queue to be picked up by the workers.
+
+        Between jobs, this waits without polling until a job is queued or
+        shutdown is called. If finished jobs have a maximum age, they are
+        also evicted while waiting.
+        """
         while True:
-            module_logger.debug("Checking job queue")
-            try:
-                await self._job_queue.put(next(self._container.pop_next()))
-            except StopIteration:
-                if not self.stop.is_set():
-                    try:
-                        await self._wait_for_next_event()
-                    except TimeoutError:
-                        continue
+            # Nothing else can run between clearing the event and checking
+            # for a job, so a job added after this point will set it again.
+            self._queue_changed.clear()
+            if (item := self._container.pop_next()) is not None:
+                if self._at_workflow_limit(item):
+                    self._deferred[item.job["workflow"]["name"]].append(item)
                     continue
+                self._claim_workflow_slot(item)
+                await self._job_queue.put(item)
+                continue
+            if self.stop.is_set():
+                break
+            module_logger.debug("Waiting for jobs to be queued")
+            await self._wait_for_queue_change()
+
+    async def _wait_for_queue_change(self) -> None:
+        retention = self._container.retention
+        if retention.max_age is None:
+            await self._queue_changed.wait()
+            return
+        try:
+            await asyncio.wait_for(
+                self._queue_changed.wait(), retention.check_interval
+            )
+        except asyncio.TimeoutError:
+            # Nothing has finished recently to trigger the check
+            self._container.enforce_retention()
+
+    def _at_workflow_limit(self, item: JobQueueItem) -> bool:
+        workflow_name = item.job["workflow"]["name"]
+        limit = self._workflow_limits.get(workflow_name)
+        return limit is not None and self._dispatched[workflow_name] >= limit
+
+    def _claim_workflow_slot(self, item: JobQueueItem) -> None:
+        workflow_name = item.job["workflow"]["name"]
+        if workflow_name not in self._workflow_limits:
+            return
+        self._dispatched[workflow_name] += 1
+        item.add_on_state_change_callback(self._release_workflow_slot)
+
+    def _release_workflow_slot(
+        self, item: JobQueueItem, _: schema.JobState
+    ) -> None:
+        # Jobs put back in the queue also give up their slot
+        if (
+            item.state not in FINISHED_STATES
+            and item.state != schema.JobState.QUEUED
+        ):
+            return
+        item.remove_on_state_change_callback(self._release_workflow_slot)
+        workflow_name = item.job["workflow"]["name"]
+        self._dispatched[workflow_name] -= 1
+        deferred = self._deferred[workflow_name]
+        while deferred:
+            waiting = deferred.popleft()
+            if waiting.state == schema.JobState.QUEUED:
+                self._container.requeue(waiting)
                 break
+        if not deferred:
+            del self._deferred[workflow_name]
+        self._queue_changed.set()
 
     def generate_job_id(self) -> str:
         """Generate a unique id for a job."""
@@ -190,82 +798,458 @@ class JobManager:
 
     def get_job_queue_item(self, job_id: str) -> JobQueueItem:
         """Get item in the queue based on the job id."""
-        for job_queue_item in self._container.job_queue():
-            if job_queue_item.job_id == job_id:
-                return job_queue_item
-        raise ValueError(f"No job found with id {job_id}")
+        try:
+            return self._container.get(job_id)
+        except KeyError as error:
+            raise ValueError(f"No job found with id {job_id}") from error
 
-    def job_queue(self) -> List[JobQueueItem]:
-        """Get the current job queue."""
-        return self._container.job_queue()
+    def job_queue(
+        self,
+        states: Optional[Iterable[schema.JobState]] = None,
+        workflow_id: Optional[int] = None,
+    ) -> List[JobQueueItem]:
+        """Get the current job queue.
+
+        Args:
+            states: only include jobs in one of these states.
+            workflow_id: only include jobs for this workflow.
+        """
+        return self._container.filter(states=states, workflow_id=workflow_id)
 
     async def has_unfinished_tasks(self) -> bool:
         """Check on unfinished tasks."""
-        all_tasks_running = [
-            job.state in (schema.JobState.QUEUED, schema.JobState.RUNNING)
-            for job in self.job_queue()
-        ]
-        return any(all_tasks_running)
+        return (
+            self._container.count(
+                schema.JobState.QUEUED, schema.JobState.RUNNING
+            )
+            > 0
+        )
 
     def _has_queued(self) -> bool:
-        return any(i.state == schema.JobState.QUEUED for i in self.job_queue())
+        return self._container.count(schema.JobState.QUEUED) > 0
+
+    def state_counts(self) -> typing.Dict[schema.JobState, int]:
+        """Get the number of jobs in each state.
+
+        These are kept up to date as jobs change state so this doesn't have
+        to go through the jobs. Jobs moved to the archive are not included.
+        """
+        return self._container.state_counts()
+
+    @property
+    def uses_input_size(self) -> bool:
+        """Check if the scheduler needs the size of the input of new jobs."""
+        return self._container.uses_input_size
+
+    def archived_count(self) -> int:
+        """Get the number of finished jobs moved to the archive."""
+        return self._container.archived_count()
+
+    def queue_depth(self) -> int:
+        """Get the number of jobs waiting to run."""
+        return self._container.count(schema.JobState.QUEUED)
 
     async def add_job(
         self,
         workflow_data: WorkflowData,
         details: typing.Dict[str, UserDataType],
+        priority: int = 0,
+        submitter: Optional[str] = None,
+        input_size: Optional[int] = None,
     ) -> JobQueueItem:
-        """Add job to manager."""
-        new_queued_item = JobQueueItem(
-            job={
-                "details": details,
-                "workflow": {
-                    "id": workflow_data.id,
-                    "name": workflow_data.name,
-                },
-            },
-            state=schema.JobState.QUEUED,
-            order=len(self._container),
-            job_id=self.generate_job_id(),
-            time_submitted=datetime.datetime.now(),
+        """Add job to manager.
+
+        Args:
+            workflow_data: workflow to run.
+            details: user parameters for the workflow.
+            priority: jobs with a higher priority are dispatched sooner if the
+                scheduler supports priorities.
+            submitter: who submitted the job, used for fair-share scheduling.
+            input_size: number of bytes of input, used to estimate how long
+                the job will take.
+        """
+        new_items = await self.add_jobs(
+            [NewJob(workflow_data, details, priority, input_size)],
+            submitter=submitter
         )
-        self._container.add(new_queued_item)
+        return new_items[0]
+
+    async def add_jobs(
+        self,
+        jobs: typing.Sequence[NewJob],
+        submitter: Optional[str] = None,
+    ) -> List[JobQueueItem]:
+        """Add several jobs to manager at once.
+
+        All the jobs are added before anything waiting on the queue gets to
+        run, and watchers are notified only once for the whole batch.
+
+        Args:
+            jobs: jobs to add, in the order that they should be queued.
+            submitter: who submitted the jobs, used for fair-share
+                scheduling.
 
-        self._new_item_added.set()
+        Returns:
+            Returns the new queue items in the same order as the jobs.
+
+        Raises:
+            JobAdmissionRejected: if accepting the jobs would go over the
+                admission limits. None of the jobs are added.
+        """
+        if self._admission is not None:
+            workflow_ids = {job.workflow.name: job.workflow.id for job in jobs}
+            self._admission.admit(
+                collections.Counter(job.workflow.name for job in jobs),
+                queued=self.queue_depth(),
+                queued_per_workflow={
+                    name: self._container.count_in_workflow(
+                        workflow_id, schema.JobState.QUEUED
+                    )
+                    for name, workflow_id in workflow_ids.items()
+                },
+                client=submitter,
+            )
+        first_order = self._container.next_order
+        time_submitted = datetime.datetime.now()
+        new_queued_items = [
+            JobQueueItem(
+                job={
+                    "details": job.details,
+                    "workflow": {
+                        "id": job.workflow.id,
+                        "name": job.workflow.name,
+                    },
+                },
+                state=schema.JobState.QUEUED,
+                order=first_order + index,
+                job_id=self.generate_job_id(),
+                time_submitted=time_submitted,
+                priority=job.priority,
+                submitter=submitter,
+                input_size=job.input_size,
+            )
+            for index, job in enumerate(jobs)
+        ]
+        for item in new_queued_items:
+            self._track(item)
+            item.add_on_state_change_callback(self._on_state_changed)
+            self._container.add(item)
+        self._container.enforce_retention()
+
+        self._queue_changed.set()
         await self._notification_manager.notify_async()
-        return new_queued_item
+        return new_queued_items
+
+    def _track(self, item: JobQueueItem) -> None:
+        if self._log_store is not None:
+            item.status["logs"] = self._log_store.open(
+                item.job_id, item.status.get("logs", [])
+            )
+        if self._store is None:
+            return
+        self._store.save_job(item)
+        item.add_on_state_change_callback(self._persist_state)
+        item.add_on_status_change_callback(self._persist_status)
+
+    def _on_state_changed(
+        self, item: JobQueueItem, previous_state: schema.JobState
+    ) -> None:
+        if previous_state == schema.JobState.QUEUED:
+            self.drain_rate.record()
+        if (
+            item.state == schema.JobState.SUCCESS
+            and self.runtime_history is not None
+            and not item.from_cache
+            and (start_time := item.status.get("start_time")) is not None
+        ):
+            self.runtime_history.record(
+                item.job["workflow"]["name"],
+                JobRuntime(
+                    duration=(
+                        datetime.datetime.now() - start_time
+                    ).total_seconds(),
+                    subtask_count=item.status.get("subtask_count"),
+                    input_size=item.input_size,
+                ),
+            )
+
+    def estimate_start_times(
+        self, workers: int = 1
+    ) -> typing.Dict[str, datetime.datetime]:
+        """Estimate when each queued job will start running.
+
+        Jobs are assumed to run in the order that the scheduler would
+        dispatch them, on the given number of workers, and to take as long
+        as the runtime history suggests. Running jobs are expected to need
+        the remainder of their estimate based on their progress.
+
+        Args:
+            workers: number of jobs run at the same time.
+
+        Returns:
+            Returns the estimated start times keyed by job id. Empty if
+            there is no runtime history.
+        """
+        if self.runtime_history is None:
+            return {}
+        now = datetime.datetime.now()
+        free_at: List[float] = []
+        for item in self._container.filter(
+            states=[schema.JobState.RUNNING, schema.JobState.STOPPING]
+        ):
+            expected = self.runtime_history.estimate_job(item) or 0.0
+            progress = item.status.get("progress") or 0.0
+            free_at.append(expected * max(0.0, 1 - progress / 100))
+        free_at.sort()
+        # Only the workers that free up first matter
+        free_at = free_at[:workers]
+        free_at += [0.0] * (workers - len(free_at))
+        heapq.heapify(free_at)
+
+        # Jobs already handed out or held back by a workflow limit are
+        # ahead of the ones the scheduler is still holding.
+        pending = self._container.pending_jobs()
+        pending_ids = {item.job_id for item in pending}
+        queued = [
+            item
+            for item in self._container.filter(
+                states=[schema.JobState.QUEUED]
+            )
+            if item.job_id not in pending_ids
+        ] + pending
+
+        estimates = {}
+        for item in queued:
+            start = heapq.heappop(free_at)
+            estimates[item.job_id] = now + datetime.timedelta(seconds=start)
+            heapq.heappush(
+                free_at, start + (self.runtime_history.estimate_job(item) or 0)
+            )
+        return estimates
+
+    def _forget_evicted(self, item: JobQueueItem) -> None:
+        # The archive has the job from now on.
+        if self._store is not None:
+            self._store.delete_job(item.job_id)
+
+    def _delete_evicted_checkpoint(self, item: JobQueueItem) -> None:
+        if self._checkpoints is not None:
+            self._checkpoints.delete(item.job_id)
+
+    def _persist_state(
+        self, item: JobQueueItem, _: schema.JobState
+    ) -> None:
+        if self._store is None:
+            return
+        self._store.update_state(item.job_id, item.state)
+        if item.state in FINISHED_STATES:
+            # Save any progress skipped since the last save
+            self._status_saved_at.pop(item.job_id, None)
+            self._store.update_status(
+                item.job_id,
+                _serialize_status(item.status, _PROGRESS_STATUS_KEYS)
+            )
+
+    def _persist_status(self, item: JobQueueItem, status: JobStatus) -> None:
+        if self._store is None:
+            return
+        # The log store already has the logs if there is one.
+        if self._log_store is None and (logs := status.get("logs")):
+            self._store.append_logs(item.job_id, list(logs))
+        changed = _serialize_status(status, _SAVED_STATUS_KEYS)
+        if not changed:
+            return
+        if changed.keys() <= _PROGRESS_STATUS_KEYS:
+            # Progress can change many times a second so it is only saved
+            # every so often.
+            now = time.monotonic()
+            saved_at = self._status_saved_at.get(item.job_id)
+            if (
+                saved_at is not None
+                and now - saved_at < self.status_save_interval
+            ):
+                return
+            self._status_saved_at[item.job_id] = now
+        self._store.update_status(item.job_id, changed)
+
+    def restore(self) -> int:
+        """Load the jobs saved in the store.
+
+        Jobs that were still queued are queued again. Jobs that were running
+        when the server stopped can't be continued so they are marked as
+        interrupted.
+
+        Returns:
+            Returns the number of jobs restored.
+        """
+        if self._store is None:
+            return 0
+        restored = 0
+        for item in self._store.load():
+            if item.job_id in self._container:
+                continue
+            if item.state in (
+                schema.JobState.RUNNING, schema.JobState.STOPPING
+            ):
+                module_logger.warning(
+                    "Job %s was interrupted by a restart", item.job_id
+                )
+                item.state = schema.JobState.INTERRUPTED
+            self._track(item)
+            item.add_on_state_change_callback(self._on_state_changed)
+            self._container.add(item)
+            restored += 1
+        self._container.enforce_retention()
+        self._queue_changed.set()
+        return restored
 
     def set_job_state(self, job_id: str, state: schema.JobState) -> None:
         """Set the state of a job."""
         item = self.get_job_queue_item(job_id)
         item.state = state
 
+    async def abort_queued(self, job_id: str) -> None:
+        """Abort a job that hasn't been sent to a runner yet."""
+        self.set_job_state(job_id, schema.JobState.ABORTED)
+        await self._notification_manager.notify_async()
+
+    async def requeue(self, job_id: str) -> None:
+        """Put a job that was sent to a worker back in the queue.
+
+        This is for jobs that never finished because the worker running
+        them went away. A job that was being stopped is aborted instead.
+        """
+        item = self.get_job_queue_item(job_id)
+        if item.state in FINISHED_STATES:
+            return
+        if item.state == schema.JobState.STOPPING:
+            item.state = schema.JobState.ABORTED
+        else:
+            module_logger.warning("Job %s put back in the queue", job_id)
+            item.update_status({"progress": None, "current_task": None})
+            item.state = schema.JobState.QUEUED
+            self._container.requeue(item)
+            self._queue_changed.set()
+        await self._notification_manager.notify_async()
+
+    async def resume(self, job_id: str) -> None:
+        """Queue a job that stopped before finishing so that it runs again.
+
+        Subtasks recorded in the checkpoint of the job are not run again.
+
+        Raises:
+            JobNotResumable: if the job finished successfully, hasn't
+                stopped yet or has already been archived.
+        """
+        item = self.get_job_queue_item(job_id)
+        if item.state not in RESUMABLE_STATES or job_id not in self._container:
+            raise JobNotResumable(job_id)
+        module_logger.info("Resuming job %s", job_id)
+        item.update_status(
+            {
+                "progress": None,
+                "current_task": None,
+                "logs": [
+                    JobLog(msg="Job resumed", time=round(time.time(), 3))
+                ],
+            }
+        )
+        item.state = schema.JobState.QUEUED
+        self._container.requeue(item)
+        self._queue_changed.set()
+        await self._notification_manager.notify_async()
+
+    async def reprioritize(self, job_id: str, priority: int) -> None:
+        """Change the priority of a queued job without re-enqueuing it."""
+        try:
+            self._container.reprioritize(job_id, priority)
+        except KeyError as error:
+            raise ValueError(f"No job found with id {job_id}") from error
+        if self._store is not None:
+            self._store.save_job(self._container.get(job_id))
+        await self._notification_manager.notify_async()
+
     def add_async_watcher(self, watcher: AsyncEventNotifier) -> None:
         """Add a watcher to be notified."""
         self._notification_manager.add_async_watcher(watcher)
 
+    def remove_async_watcher(self, watcher: AsyncEventNotifier) -> None:
+        """Stop notifying a watcher."""
+        self._notification_manager.remove_async_watcher(watcher)
+
 
 class NotificationManager:
     def __init__(self) -> None:
+        # Subscriptions are notified through the hub without awaiting
+        # anything. Any other kind of watcher has its notify awaited.
+        self.hub: BroadcastHub[None] = BroadcastHub()
         self._async_watchers: List[AsyncEventNotifier] = []
 
     async def notify_async(self) -> None:
-        await asyncio.gather(
-            *[watcher.notify() for watcher in self._async_watchers]
-        )
+        self.hub.publish(None)
+        if self._async_watchers:
+            await asyncio.gather(
+                *[watcher.notify() for watcher in self._async_watchers]
+            )
 
     def add_async_watcher(self, watcher: AsyncEventNotifier) -> None:
-        self._async_watchers.append(watcher)
+        if isinstance(watcher, Subscription):
+            self.hub.add(watcher)
+        else:
+            self._async_watchers.append(watcher)
+
+    def remove_async_watcher(self, watcher: AsyncEventNotifier) -> None:
+        if isinstance(watcher, Subscription):
+            self.hub.unsubscribe(watcher)
+        elif watcher in self._async_watchers:
+            self._async_watchers.remove(watcher)
+
+    def __len__(self) -> int:
+        return len(self.hub) + len(self._async_watchers)
 
 
 class EmitToAsyncCallback(logging.Handler):
+    """Log handler that passes log records to async watchers.
+
+    Records can be emitted from any thread. They are buffered and handed to
+    the event loop in batches, either once flush_interval seconds have
+    passed since the first record of the batch or as soon as max_batch
+    records are waiting, whichever comes first.
+    """
+
     def __init__(
         self,
         level: int = logging.NOTSET,
-        queue: Optional[asyncio.Queue[JobLog]] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        flush_interval: float = 0.05,
+        max_batch: int = 100,
     ) -> None:
+        """Create a new handler.
+
+        Args:
+            level: minimum level of records handled.
+            loop: event loop the watchers are run on. Defaults to the
+                running loop, if there is one, when the first record is
+                emitted.
+            flush_interval: seconds to wait for more records before passing
+                them on.
+            max_batch: number of records that are passed on without waiting.
+        """
         super().__init__(level)
-        self._queue: asyncio.Queue[JobLog] = queue or asyncio.Queue()
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+        self._loop = loop
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._buffer: typing.Deque[JobLog] = collections.deque()
+        self._buffer_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._notify_lock = asyncio.Lock()
+        self._notify_tasks: typing.Set[asyncio.Task[None]] = set()
         self._async_watchers: List[
             Callable[[List[JobLog]], Awaitable[None]]
         ] = []
@@ -280,31 +1264,66 @@ class EmitToAsyncCallback(logging.Handler):
     ) -> None:
         self._async_watchers.remove(watcher)
 
+    def _take_buffered(self) -> List[JobLog]:
+        with self._buffer_lock:
+            messages = list(self._buffer)
+            self._buffer.clear()
+            self._flush_scheduled = False
+        return messages
+
     async def notify_async_watchers(self) -> None:
-        messages = []
-        while not self._queue.empty():
-            message = await self._queue.get()
-            messages.append(message)
-            self._queue.task_done()
-        if messages:
-            await asyncio.gather(
-                *[watcher(messages) for watcher in self._async_watchers]
-            )
+        """Pass every buffered record on to the watchers."""
+        # The lock keeps batches in the order that they were emitted.
+        async with self._notify_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            messages = self._take_buffered()
+            if messages:
+                await asyncio.gather(
+                    *[watcher(messages) for watcher in self._async_watchers]
+                )
 
-    def _notify(self) -> None:
-        try:
-            event_loop = asyncio.get_running_loop()
-            asyncio.ensure_future(
-                self.notify_async_watchers(), loop=event_loop
-            )
-        except RuntimeError:
-            asyncio.run(self.notify_async_watchers())
+    def _flush(self) -> None:
+        # Runs on the event loop
+        self._flush_timer = None
+        task = asyncio.ensure_future(self.notify_async_watchers())
+        self._notify_tasks.add(task)
+        task.add_done_callback(self._notify_tasks.discard)
+
+    def _schedule_flush(self, immediately: bool) -> None:
+        # Runs on the event loop
+        if immediately:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = typing.cast(
+                asyncio.AbstractEventLoop, self._loop
+            ).call_later(self.flush_interval, self._flush)
 
     def emit(self, record: LogRecord) -> None:
-        self._queue.put_nowait(
-            JobLog(msg=self.format(record), time=round(record.created, 3))
+        message = JobLog(
+            msg=self.format(record), time=round(record.created, 3)
         )
-        self._notify()
+        if self._loop is None:
+            try:
+                self._loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+        with self._buffer_lock:
+            self._buffer.append(message)
+            full = len(self._buffer) == self.max_batch
+            # Only the first record of a batch, and the one that fills it,
+            # need to wake up the event loop.
+            if self._flush_scheduled and not full:
+                return
+            self._flush_scheduled = True
+        if self._loop is None or self._loop.is_closed():
+            # Nothing to hand the records to yet. They are passed on the
+            # next time notify_async_watchers is awaited.
+            return
+        self._loop.call_soon_threadsafe(self._schedule_flush, full)
 
 
 @contextmanager
@@ -342,6 +1361,9 @@ class TaskExecutor:
     def task_results(self) -> List[speedwagon.tasks.Result]:
         return self._task.results
 
+    def task_result(self) -> Optional[speedwagon.tasks.Result]:
+        return self._task.task_result
+
 
 class TaskGenerator(collections.abc.Iterator):
     def __init__(
@@ -349,12 +1371,17 @@ class TaskGenerator(collections.abc.Iterator):
         workflow: speedwagon.Workflow,
         workflow_options,
         log_level=logging.INFO,
+        subtask_runner: Optional[AbsSubtaskRunner] = None,
     ):
+        self.subtask_runner = subtask_runner or ThreadSubtaskRunner()
         self._task_scheduler = speedwagon.runner_strategies.TaskScheduler(".")
         self.workflow = workflow
         self.workflow_options = workflow_options
-        self._job_logger = logging.getLogger(__name__)
-        self._job_logger.setLevel(log_level)
+        # Each job gets a logger of its own, not registered with the logging
+        # module, so that messages from jobs running at the same time can't
+        # end up in each other's logs.
+        self._job_logger = logging.Logger(f"{__name__}.job", log_level)
+        self._job_logger.propagate = False
         self._task_scheduler.logger = self._job_logger
         self._generator: collections.abc.Generator[
             speedwagon.tasks.Subtask, None, None
@@ -362,11 +1389,13 @@ class TaskGenerator(collections.abc.Iterator):
             self.workflow, self.workflow_options
         )
 
+        self._subtasks_created = 0
         self.log_message_queue_handler = EmitToAsyncCallback()
         self._async_log_handlers: List[
             Callable[[List[JobLog]], Awaitable[None]]
         ] = []
         self.log_message_queue_handler.add_async_watcher(self.logs_updated)
+        self._job_logger.addHandler(self.log_message_queue_handler)
 
     def results(self) -> List[speedwagon.tasks.Result]:
         return self._task_scheduler.task_generator_strategy.results()
@@ -381,25 +1410,29 @@ class TaskGenerator(collections.abc.Iterator):
     ) -> None:
         self._async_log_handlers.remove(callback)
 
+    async def flush_logs(self) -> None:
+        """Pass on any log messages still waiting to be sent."""
+        await self.log_message_queue_handler.notify_async_watchers()
+
     def add_async_log_handler(
         self, callback: Callable[[List[JobLog]], Awaitable[None]]
     ) -> None:
         self._async_log_handlers.append(callback)
 
-    def __next__(self) -> TaskExecutor:
-        def monkeypatch_log(message: str) -> None:
-            self._job_logger.info(message)
+    def _log_task_message(self, message: str) -> None:
+        self._job_logger.info(message)
 
-        def call_with_log_handler(task: speedwagon.tasks.Subtask) -> None:
-            with manager_job_log_handler(
-                self._task_scheduler.logger, self.log_message_queue_handler
-            ):
-                setattr(task, "log", monkeypatch_log)
-                task.exec()
+    def _run_subtask(self, task: speedwagon.tasks.Subtask) -> None:
+        self.subtask_runner.run(task, self._log_task_message)
 
-        return TaskExecutor(
-            next(self._generator), task_running_strategy=call_with_log_handler
-        )
+    def __next__(self) -> TaskExecutor:
+        task = next(self._generator)
+        self._subtasks_created += 1
+        return TaskExecutor(task, task_running_strategy=self._run_subtask)
+
+    def subtask_count(self) -> int:
+        """Get the number of subtasks created so far."""
+        return self._subtasks_created
 
     def generate_report(self) -> Optional[str]:
         return self._task_scheduler.task_generator_strategy.generate_report(
@@ -418,6 +1451,176 @@ class TaskGenerator(collections.abc.Iterator):
         )
 
 
+class ParallelTaskGenerator(TaskGenerator):
+    """Task generator for running subtasks of a stage at the same time.
+
+    Speedwagon workflows create their subtasks in stages. The pre tasks come
+    first, then the main tasks are created from the results of the pre
+    tasks, and then the post tasks are created from the results of the main
+    tasks. All of the main tasks are created at once, so none of them can
+    depend on another and they are safe to run at the same time.
+
+    Results are kept in the order that the subtasks were created, no matter
+    what order they finish in.
+
+    If a checkpoint is given, each subtask that finishes is recorded in it
+    and subtasks already recorded are skipped, reusing their results.
+    """
+
+    def __init__(
+        self,
+        workflow: speedwagon.Workflow,
+        workflow_options,
+        log_level=logging.INFO,
+        subtask_runner: Optional[AbsSubtaskRunner] = None,
+        checkpoint: Optional[JobCheckpoint] = None,
+    ):
+        super().__init__(
+            workflow,
+            workflow_options,
+            log_level=log_level,
+            subtask_runner=subtask_runner,
+        )
+        self.checkpoint = checkpoint
+        self._results: List[speedwagon.tasks.Result] = []
+        self._lock = threading.Lock()
+        self._main_tasks_completed: Optional[int] = None
+        self._main_tasks_total: Optional[int] = None
+        self._stage_size = 0
+        self._stage_results: typing.Dict[
+            int, Optional[speedwagon.tasks.Result]
+        ] = {}
+        self._tasks = (task for stage, _ in self.stages() for task in stage)
+
+    def results(self) -> List[speedwagon.tasks.Result]:
+        return self._results
+
+    def _run_main_subtask(self, task: speedwagon.tasks.Subtask) -> None:
+        self._run_subtask(task)
+        with self._lock:
+            self._main_tasks_completed = (self._main_tasks_completed or 0) + 1
+
+    def _run_stage_subtask(
+        self,
+        stage: str,
+        index: int,
+        run_subtask: Callable[[speedwagon.tasks.Subtask], None],
+        task: speedwagon.tasks.Subtask,
+    ) -> None:
+        run_subtask(task)
+        with self._lock:
+            self._stage_results[index] = task.task_result
+        if self.checkpoint is not None and task.status == TaskStatus.SUCCESS:
+            self.checkpoint.record(stage, index, task.task_result)
+
+    def _create_stage(
+        self,
+        stage: str,
+        subtasks: Iterable[speedwagon.tasks.Subtask],
+        run_subtask: Callable[[speedwagon.tasks.Subtask], None],
+    ) -> List[TaskExecutor]:
+        subtasks = list(subtasks)
+        self._stage_size = len(subtasks)
+        self._subtasks_created += len(subtasks)
+        self._stage_results = (
+            self.checkpoint.start_stage(stage, len(subtasks))
+            if self.checkpoint is not None
+            else {}
+        )
+        return [
+            TaskExecutor(
+                subtask,
+                task_running_strategy=functools.partial(
+                    self._run_stage_subtask, stage, index, run_subtask
+                ),
+            )
+            for index, subtask in enumerate(subtasks)
+            if index not in self._stage_results
+        ]
+
+    def _collect_results(self) -> List[speedwagon.tasks.Result]:
+        results = [
+            result
+            for result in (
+                self._stage_results.get(index)
+                for index in range(self._stage_size)
+            )
+            if result
+        ]
+        self._results += results
+        return results
+
+    def stages(
+        self,
+    ) -> typing.Iterator[typing.Tuple[List[TaskExecutor], bool]]:
+        """Iterate over the stages of the workflow.
+
+        The next stage is only created once every subtask of the current
+        stage has been run.
+
+        Yields:
+            Yields the subtasks of each stage and if they can be run at the
+            same time.
+        """
+        self._results.clear()
+        self.workflow.workflow_options()
+        working_directory = self._task_scheduler.working_directory
+        builder = speedwagon.runner_strategies.TaskGenerator(
+            self.workflow,
+            self.workflow_options,
+            working_directory=working_directory,
+            caller=self._task_scheduler,
+        )
+        pre_tasks = self._create_stage(
+            "pre", builder.get_pre_tasks(working_directory), self._run_subtask
+        )
+        yield pre_tasks, False
+        pre_task_results = self._collect_results()
+
+        additional_data = self._task_scheduler.request_more_info(
+            self.workflow, self.workflow_options, pre_task_results
+        )
+        main_tasks = self._create_stage(
+            "main",
+            builder.get_main_tasks(
+                working_directory,
+                pretask_results=pre_task_results,
+                additional_data=additional_data,
+            ),
+            self._run_main_subtask,
+        )
+        self._main_tasks_completed = len(self._stage_results)
+        self._main_tasks_total = self._stage_size
+        yield main_tasks, True
+        main_task_results = self._collect_results()
+
+        post_tasks = self._create_stage(
+            "post",
+            builder.get_post_tasks(
+                working_directory=working_directory,
+                results=main_task_results,
+            ),
+            self._run_subtask,
+        )
+        yield post_tasks, False
+        self._collect_results()
+
+    def __next__(self) -> TaskExecutor:
+        return next(self._tasks)
+
+    def generate_report(self) -> Optional[str]:
+        return self._task_scheduler.task_generator_strategy.generate_report(
+            self.workflow, self.workflow_options, self._results
+        )
+
+    def percent_completed(self) -> Optional[float]:
+        completed = self._main_tasks_completed
+        total = self._main_tasks_total
+        if completed is None or not total:
+            return None
+        return (completed / total) * 100
+
+
 T = typing.TypeVar("T")
 CallbackType = typing.TypeVar(  # pylint: disable=invalid-name
     "CallbackType",
@@ -462,13 +1665,56 @@ class AsyncUpdateNotifyManager(
         ])
 
 
+class AdaptiveBatchSize:
+    """Number of subtasks to run for each trip to a worker thread.
+
+    The size grows while subtasks are quick and shrinks when they are slow,
+    aiming for each batch to take about target_duration seconds. Slow
+    subtasks still get status updates of their own while thousands of tiny
+    subtasks share them.
+    """
+
+    def __init__(
+        self, target_duration: float = 0.1, max_size: int = 1000
+    ) -> None:
+        self.target_duration = target_duration
+        self.max_size = max_size
+        self.size = 1
+
+    def record(self, count: int, elapsed: float) -> None:
+        """Adjust the size from how long a batch of subtasks took."""
+        if count == 0:
+            return
+        per_task = elapsed / count
+        ideal = (
+            self.max_size
+            if per_task <= 0
+            else int(self.target_duration / per_task)
+        )
+        # Grow by doubling at most so one fast batch doesn't commit to a
+        # huge batch of slow subtasks.
+        self.size = max(1, min(ideal, self.size * 2, self.max_size))
+
+
 class AsyncJobExecutor:
-    def __init__(self, working_path: str) -> None:
+    def __init__(
+        self,
+        working_path: str,
+        max_concurrent_subtasks: int = 1,
+        batch_subtasks: bool = False,
+    ) -> None:
+        if max_concurrent_subtasks < 1:
+            raise ValueError("max_concurrent_subtasks needs to be at least 1")
         self.working_path = working_path
+        self.max_concurrent_subtasks = max_concurrent_subtasks
+        self.batch_subtasks = batch_subtasks
         self._abort = asyncio.Event()
         self._workflow_klass: Optional[Type[speedwagon.Workflow]] = None
         self._workflow_options: Optional[typing.Dict[str, typing.Any]] = None
         self._task_generator: Optional[TaskGenerator] = None
+        self._subtask_runner: Optional[AbsSubtaskRunner] = None
+        self._checkpoint: Optional[JobCheckpoint] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         self._notification_manager = UpdateCallbackManager()
         self._async_notification_manager = AsyncUpdateNotifyManager()
 
@@ -518,9 +1764,13 @@ class AsyncJobExecutor:
         self,
         workflow_klass: typing.Type[speedwagon.Workflow],
         workflow_options: typing.Dict[str, typing.Any],
+        subtask_runner: Optional[AbsSubtaskRunner] = None,
+        checkpoint: Optional[JobCheckpoint] = None,
     ) -> None:
         self._workflow_klass = workflow_klass
         self._workflow_options = workflow_options
+        self._subtask_runner = subtask_runner
+        self._checkpoint = checkpoint
 
     async def execute_job(self) -> schema.JobState:
         """Execute job."""
@@ -542,13 +1792,32 @@ class AsyncJobExecutor:
         finally:
             self._workflow_klass = None
             self._workflow_options = None
+            self._subtask_runner = None
+            self._checkpoint = None
+            self._loop = None
             await self.notify_of_update()
 
     async def _update_log_messages(self, logs: List[JobLog]) -> None:
         self.update_status(logs=logs)
         await self.notify_of_update()
 
-    def _execute_task(
+    def _update_task_status(
+            self,
+            task: TaskExecutor,
+            task_generator: TaskGenerator
+    ) -> None:
+        # Called from the worker threads running the subtasks. The status is
+        # set from the event loop, one update at a time and in the order
+        # they were made, so that subtasks running at the same time don't
+        # change it at once.
+        if self._loop is None:
+            self._set_task_status(task, task_generator)
+        else:
+            self._loop.call_soon_threadsafe(
+                self._set_task_status, task, task_generator
+            )
+
+    def _set_task_status(
             self,
             task: TaskExecutor,
             task_generator: TaskGenerator
@@ -561,44 +1830,117 @@ class AsyncJobExecutor:
             status["current_task"] = current_task
 
         self.update_status(**status)
+
+    def _execute_task(
+            self,
+            task: TaskExecutor,
+            task_generator: TaskGenerator
+    ) -> None:
+        self._update_task_status(task, task_generator)
         task.exec()
 
+    def _execute_task_batch(
+            self,
+            tasks: List[TaskExecutor],
+            task_generator: TaskGenerator
+    ) -> typing.Tuple[int, float]:
+        # The status is only updated when the batch starts and once it is
+        # done, instead of for each subtask.
+        start = time.perf_counter()
+        for index, task in enumerate(tasks):
+            if index == 0:
+                self._update_task_status(task, task_generator)
+            task.exec()
+        if tasks:
+            self._update_task_status(tasks[-1], task_generator)
+        return len(tasks), time.perf_counter() - start
+
+    def _execute_next_batch(
+            self,
+            task_generator: TaskGenerator,
+            size: int
+    ) -> typing.Tuple[int, float, bool]:
+        # Runs in a worker thread. The next subtask is only taken from the
+        # generator after the previous one is done so that its results are
+        # recorded. Returns the number of subtasks run, how long they took
+        # and if there are any subtasks left.
+        start = time.perf_counter()
+        count = 0
+        task: Optional[TaskExecutor] = None
+        remaining = True
+        while count < size and not self._abort.is_set():
+            try:
+                task = next(task_generator)
+            except StopIteration:
+                remaining = False
+                break
+            if count == 0:
+                self._update_task_status(task, task_generator)
+            task.exec()
+            count += 1
+        if task is not None:
+            # So the progress doesn't lag behind by a whole batch
+            self._update_task_status(task, task_generator)
+        return count, time.perf_counter() - start, remaining
+
     async def _run(
         self,
         workflow_klass: Type[speedwagon.Workflow],
         workflow_options: typing.Dict[str, typing.Any],
     ) -> schema.JobState:
 
+        self._loop = asyncio.get_running_loop()
         notify_future = self.notify_of_update()
 
-        self._task_generator = TaskGenerator(
-            workflow_klass(), workflow_options
-        )
+        task_generator: TaskGenerator
+        if self.max_concurrent_subtasks > 1 or self._checkpoint is not None:
+            task_generator = ParallelTaskGenerator(
+                workflow_klass(),
+                workflow_options,
+                subtask_runner=self._subtask_runner,
+                checkpoint=self._checkpoint
+            )
+        else:
+            task_generator = TaskGenerator(
+                workflow_klass(),
+                workflow_options,
+                subtask_runner=self._subtask_runner
+            )
+        self._task_generator = task_generator
         self._task_generator.add_async_log_handler(self._update_log_messages)
         await notify_future
         self.update_status(start_time=datetime.datetime.now())
-        while True:
-            if self._abort.is_set():
-                self.update_status(progress=None)
-                self._abort.clear()
-                self.update_job_state(schema.JobState.ABORTED)
+        batch_size = AdaptiveBatchSize() if self.batch_subtasks else None
+        if isinstance(task_generator, ParallelTaskGenerator):
+            await self._run_stages(task_generator, batch_size)
+        elif batch_size is not None:
+            await self._run_batches(task_generator, batch_size)
+        else:
+            while not self._abort.is_set():
+                try:
+                    await asyncio.to_thread(
+                        lambda task_=self._next_task(),
+                        gen=self._task_generator:
+                        self._execute_task(task_, gen)
+                    )
+                except StopIteration:
+                    break
                 await self.notify_of_update()
-                return schema.JobState.ABORTED
+        await task_generator.flush_logs()
 
-            try:
-                await asyncio.to_thread(
-                    lambda task_=self._next_task(), gen=self._task_generator:
-                    self._execute_task(task_, gen)
-                )
-            except StopIteration:
-                break
+        if self._abort.is_set():
+            self.update_status(progress=None)
+            self._abort.clear()
+            self.update_job_state(schema.JobState.ABORTED)
             await self.notify_of_update()
+            return schema.JobState.ABORTED
 
         last_status_update: typing.Dict[str, typing.Any] = {
             "current_task": "",
-            "progress": self._task_generator.percent_completed(),
+            "progress": task_generator.percent_completed(),
+            "subtask_count": task_generator.subtask_count(),
         }
-        if report := self._task_generator.generate_report():
+        if report := task_generator.generate_report():
             last_status_update["report"] = report
             last_status_update["logs"] = [JobLog(msg=report, time=time.time())]
 
@@ -607,6 +1949,80 @@ class AsyncJobExecutor:
         await self.notify_of_update()
         return schema.JobState.SUCCESS
 
+    async def _run_batches(
+        self, task_generator: TaskGenerator, batch_size: AdaptiveBatchSize
+    ) -> None:
+        remaining = True
+        while remaining and not self._abort.is_set():
+            count, elapsed, remaining = await asyncio.to_thread(
+                self._execute_next_batch, task_generator, batch_size.size
+            )
+            batch_size.record(count, elapsed)
+            await self.notify_of_update()
+
+    async def _run_stages(
+        self,
+        task_generator: ParallelTaskGenerator,
+        batch_size: Optional[AdaptiveBatchSize] = None,
+    ) -> None:
+        # Keeps up to max_concurrent_subtasks batches of subtasks of a stage
+        # running and waits for all of them to finish before starting the
+        # next stage.
+        for tasks, parallel in task_generator.stages():
+            limit = self.max_concurrent_subtasks if parallel else 1
+            running: typing.Set[
+                asyncio.Future[typing.Tuple[int, float]]
+            ] = set()
+            start = 0
+            try:
+                while start < len(tasks):
+                    if self._abort.is_set():
+                        break
+                    if len(running) >= limit:
+                        running = await self._wait_for_subtasks(
+                            running, asyncio.FIRST_COMPLETED, batch_size
+                        )
+                    end = start + (batch_size.size if batch_size else 1)
+                    running.add(
+                        asyncio.ensure_future(
+                            asyncio.to_thread(
+                                self._execute_task_batch,
+                                tasks[start:end],
+                                task_generator
+                            )
+                        )
+                    )
+                    start = end
+                await self._wait_for_subtasks(
+                    running, asyncio.ALL_COMPLETED, batch_size
+                )
+            except Exception:
+                # Don't leave subtasks of a failed job running in the
+                # background.
+                if running:
+                    await asyncio.wait(running)
+                raise
+            if self._abort.is_set():
+                return
+
+    async def _wait_for_subtasks(
+        self,
+        running: typing.Set[asyncio.Future[typing.Tuple[int, float]]],
+        return_when: str,
+        batch_size: Optional[AdaptiveBatchSize] = None,
+    ) -> typing.Set[asyncio.Future[typing.Tuple[int, float]]]:
+        if not running:
+            return running
+        done, still_running = await asyncio.wait(
+            running, return_when=return_when
+        )
+        for future in done:
+            count, elapsed = future.result()
+            if batch_size is not None:
+                batch_size.record(count, elapsed)
+        await self.notify_of_update()
+        return still_running
+
     def _next_task(self) -> TaskExecutor:
         if self._abort.is_set():
             raise StopIteration
@@ -614,7 +2030,9 @@ class AsyncJobExecutor:
             if self._workflow_klass is None:
                 raise ValueError("Workflow not selected")
             self._task_generator = TaskGenerator(
-                self._workflow_klass(), self._workflow_options
+                self._workflow_klass(),
+                self._workflow_options,
+                subtask_runner=self._subtask_runner
             )
             self._task_generator.add_async_log_handler(
                 self._update_log_messages
@@ -669,7 +2087,35 @@ class FixUpProtocol(typing.Protocol):
         ...
 
 
-class JobRunner:
+class AbsJobRunner(abc.ABC):
+    """Abstract base class for anything that runs jobs from a job queue."""
+
+    @abc.abstractmethod
+    async def consume(self) -> None:
+        """Consume jobs in the job queue."""
+
+    @abc.abstractmethod
+    def is_running(self, job_id: str) -> bool:
+        """Check if the job is being run by this runner."""
+
+    @abc.abstractmethod
+    def abort(self, job_id: str) -> None:
+        """Abort running job.
+
+        Raises:
+            JobAlreadyAborted: if the job is not being run by this runner.
+        """
+
+    @abc.abstractmethod
+    def add_async_watcher(self, watcher: AsyncEventNotifier) -> None:
+        """Add a watcher to be notified."""
+
+    @abc.abstractmethod
+    def remove_async_watcher(self, watcher: AsyncEventNotifier) -> None:
+        """Stop notifying a watcher."""
+
+
+class JobRunner(AbsJobRunner):
     """JobRunner.
 
     Designed to consume any jobs in a queue.
@@ -680,6 +2126,12 @@ class JobRunner:
         job_queue: asyncio.Queue[JobQueueItem],
         storage_root: str,
         workflow_manager: Optional[AbsWorkflowManager] = None,
+        process_pool: Optional[concurrent.futures.Executor] = None,
+        process_workflows: Iterable[str] = (),
+        max_concurrent_subtasks: int = 1,
+        batch_subtasks: bool = False,
+        result_cache: Optional[ResultCache] = None,
+        checkpoints: Optional[CheckpointStore] = None,
     ) -> None:
         """Create a job runner.
 
@@ -687,23 +2139,62 @@ class JobRunner:
             job_queue: job queue for pull jobs off to run.
             storage_root: path that runner storage starts from.
             workflow_manager: workflow manager
+            process_pool: process pool for running the subtasks of the
+                workflows in process_workflows.
+            process_workflows: names of the workflows with subtasks that
+                are run in the process pool instead of in a thread.
+            max_concurrent_subtasks: number of subtasks of a job that can
+                run at the same time.
+            batch_subtasks: run quick subtasks in batches with one status
+                update for each batch.
+            result_cache: reuse the results of earlier jobs with the same
+                workflow, parameters and unchanged inputs.
+            checkpoints: where to record the subtasks finished by each job
+                so that jobs run again skip them.
         """
         self._job_queue = job_queue
+        self.result_cache = result_cache
+        self.checkpoints = checkpoints
         self._notification_manager = NotificationManager()
         self.working_path = storage_root
-        self.executor = AsyncJobExecutor(storage_root)
+        self.executor = AsyncJobExecutor(
+            storage_root,
+            max_concurrent_subtasks=max_concurrent_subtasks,
+            batch_subtasks=batch_subtasks,
+        )
         self.executor.add_watcher(self._notification_manager.notify_async)
         self.workflow_manager = (
             workflow_manager or WorkflowManagerAllWorkflows()
         )
         self._current_job: Optional[JobQueueItem] = None
+        self.process_pool = process_pool
+        self.process_workflows = frozenset(process_workflows)
 
-    def abort(self, job_id: str) -> None:
-        """Abort running job."""
+    def get_subtask_runner(
+        self, queue_item: JobQueueItem
+    ) -> Optional[AbsSubtaskRunner]:
+        """Get what runs the subtasks of the job.
+
+        Returns:
+            Returns None if the subtasks should run in the default way.
+        """
         if (
+            self.process_pool is not None
+            and queue_item.job["workflow"]["name"] in self.process_workflows
+        ):
+            return ProcessSubtaskRunner(self.process_pool)
+        return None
+
+    def is_running(self, job_id: str) -> bool:
+        """Check if the job is being run by this runner."""
+        return (
             self._current_job is not None
             and self._current_job.job_id == job_id
-        ):
+        )
+
+    def abort(self, job_id: str) -> None:
+        """Abort running job."""
+        if self.is_running(job_id):
             self.executor.abort_current_job()
         else:
             raise JobAlreadyAborted(job_id)
@@ -762,21 +2253,82 @@ class JobRunner:
             status: JobStatus,
             job_queue_item: JobQueueItem
     ) -> None:
-        # This should have JobStatus values but not requiring them
-        if "progress" in status:
-            job_queue_item.status["progress"] = status["progress"]
+        job_queue_item.update_status(status)
 
-        if "current_task" in status:
-            job_queue_item.status["current_task"] = status["current_task"]
+    def get_input_paths(
+        self, queue_item: JobQueueItem, options: typing.Dict[str, typing.Any]
+    ) -> List[str]:
+        """Get the files and directories selected as parameters of a job."""
+        info = self.workflow_manager.get_workflow_info_by_id(
+            queue_item.job["workflow"]["id"]
+        )
+        return [
+            options[param["label"]]
+            for param in info["parameters"]
+            if param["widget_type"] in ("DirectorySelect", "FileSelect")
+            and isinstance(options.get(param["label"]), str)
+        ]
 
-        if "start_time" in status and status['start_time'] is not None:
-            job_queue_item.status["start_time"] = status["start_time"]
+    async def _get_result_cache_key(
+        self, queue_item: JobQueueItem, options: typing.Dict[str, typing.Any]
+    ) -> Optional[str]:
+        workflow_name = queue_item.job["workflow"]["name"]
+        if (
+            self.result_cache is None
+            or not self.result_cache.is_enabled_for(workflow_name)
+        ):
+            return None
+        return await asyncio.to_thread(
+            self.result_cache.make_key,
+            workflow_name,
+            options,
+            self.get_input_paths(queue_item, options),
+        )
 
-        if "logs" in status:
-            job_queue_item.status["logs"] += status["logs"]
+    @staticmethod
+    def _use_cached_result(
+        queue_item: JobQueueItem, result: CachedResult
+    ) -> None:
+        queue_item.update_status(
+            {
+                "start_time": datetime.datetime.now(),
+                "progress": 100,
+                "current_task": "",
+                "report": result.report,
+                "logs": list(result.logs) + [
+                    JobLog(
+                        msg="Inputs have not changed since this workflow "
+                            "was last run with the same parameters. "
+                            "Reusing the results.",
+                        time=round(time.time(), 3),
+                    )
+                ],
+            }
+        )
+        queue_item.from_cache = True
+        queue_item.state = schema.JobState.SUCCESS
 
-        if "report" in status and status['report'] is not None:
-            job_queue_item.status["report"] = status["report"]
+    async def _open_checkpoint(
+        self, queue_item: JobQueueItem
+    ) -> Optional[JobCheckpoint]:
+        if self.checkpoints is None:
+            return None
+        checkpoint = await asyncio.to_thread(
+            self.checkpoints.open, queue_item.job_id
+        )
+        if finished := len(checkpoint):
+            queue_item.update_status(
+                {
+                    "logs": [
+                        JobLog(
+                            msg=f"Resuming from a checkpoint. Skipping "
+                                f"{finished} subtasks already finished.",
+                            time=round(time.time(), 3),
+                        )
+                    ]
+                }
+            )
+        return checkpoint
 
     async def consume(self) -> None:
         """Consume jobs in the job queue.
@@ -793,7 +2345,26 @@ class JobRunner:
                 )
                 break
             job_params = typing.cast(JobQueueItem, job_params)
+            if job_params.state != schema.JobState.QUEUED:
+                # Aborted after being handed to the runners
+                module_logger.debug(
+                    "Skipping job %s, which is %s",
+                    job_params.job_id,
+                    job_params.state.value
+                )
+                self._job_queue.task_done()
+                continue
             workflow_klass, options = self.prep_job(job_params)
+            cache_key = await self._get_result_cache_key(job_params, options)
+            if self.result_cache is not None and cache_key is not None:
+                if (cached := self.result_cache.get(cache_key)) is not None:
+                    module_logger.info(
+                        "Job %s reused cached results", job_params.job_id
+                    )
+                    self._use_cached_result(job_params, cached)
+                    self._job_queue.task_done()
+                    await self._notification_manager.notify_async()
+                    continue
 
             # Note: without the casting in the functions below, MyPy thinks
             #   that job_params could be None regardless of the check above
@@ -817,7 +2388,12 @@ class JobRunner:
 
             try:
                 self._current_job = job_params
-                self.executor.load_job(workflow_klass, options)
+                self.executor.load_job(
+                    workflow_klass,
+                    options,
+                    subtask_runner=self.get_subtask_runner(job_params),
+                    checkpoint=await self._open_checkpoint(job_params)
+                )
                 self.executor.add_on_job_status_change_callback(
                     update_job_status
                 )
@@ -825,6 +2401,31 @@ class JobRunner:
                 self.executor.add_on_state_change_callback(update_state)
                 job_params.state = await self.executor.execute_job()
                 module_logger.info("Job %s done", job_params.job_id)
+                if (
+                    self.checkpoints is not None
+                    and job_params.state == schema.JobState.SUCCESS
+                ):
+                    self.checkpoints.delete(job_params.job_id)
+                if (
+                    self.result_cache is not None
+                    and cache_key is not None
+                    and job_params.state == schema.JobState.SUCCESS
+                ):
+                    logs = job_params.status.get("logs", [])
+                    self.result_cache.put(
+                        cache_key,
+                        CachedResult(
+                            report=job_params.status.get("report"),
+                            logs=list(
+                                logs[
+                                    max(
+                                        0,
+                                        len(logs) - self.result_cache.max_logs
+                                    ):
+                                ]
+                            ),
+                        ),
+                    )
 
             finally:
                 self.executor.remove_on_state_change_callback(update_state)
@@ -838,3 +2439,100 @@ class JobRunner:
     def add_async_watcher(self, watcher: AsyncEventNotifier) -> None:
         """Add a watcher to be notified."""
         self._notification_manager.add_async_watcher(watcher)
+
+    def remove_async_watcher(self, watcher: AsyncEventNotifier) -> None:
+        """Stop notifying a watcher."""
+        self._notification_manager.remove_async_watcher(watcher)
+
+
+class JobRunnerPool(AbsJobRunner):
+    """Pool of job runners sharing the same job queue.
+
+    Each runner has its own executor so the pool runs as many jobs at the
+    same time as it has runners.
+    """
+
+    def __init__(
+        self,
+        job_queue: asyncio.Queue[JobQueueItem],
+        storage_root: str,
+        workflow_manager: Optional[AbsWorkflowManager] = None,
+        workers: int = 1,
+        process_pool: Optional[concurrent.futures.Executor] = None,
+        process_workflows: Iterable[str] = (),
+        max_concurrent_subtasks: int = 1,
+        batch_subtasks: bool = False,
+        result_cache: Optional[ResultCache] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+    ) -> None:
+        """Create a pool of job runners.
+
+        Args:
+            job_queue: job queue for pull jobs off to run.
+            storage_root: path that runner storage starts from.
+            workflow_manager: workflow manager
+            workers: number of jobs to run at the same time.
+            process_pool: process pool shared by every runner, see JobRunner.
+            process_workflows: names of the workflows with subtasks that
+                are run in the process pool instead of in a thread.
+            max_concurrent_subtasks: number of subtasks of a job that can
+                run at the same time.
+            batch_subtasks: run quick subtasks in batches with one status
+                update for each batch.
+            result_cache: result cache shared by every runner, see
+                JobRunner.
+            checkpoints: checkpoint store shared by every runner, see
+                JobRunner.
+        """
+        if workers < 1:
+            raise ValueError("A job runner pool needs at least one worker")
+        workflow_manager = workflow_manager or WorkflowManagerAllWorkflows()
+        self.runners: List[AbsJobRunner] = [
+            JobRunner(
+                job_queue,
+                storage_root,
+                workflow_manager,
+                process_pool=process_pool,
+                process_workflows=process_workflows,
+                max_concurrent_subtasks=max_concurrent_subtasks,
+                batch_subtasks=batch_subtasks,
+                result_cache=result_cache,
+                checkpoints=checkpoints,
+            )
+            for _ in range(workers)
+        ]
+
+    async def consume(self) -> None:
+        """Consume jobs in the job queue with every runner in the pool."""
+        await asyncio.gather(
+            *[runner.consume() for runner in self.runners]
+        )
+
+    def is_running(self, job_id: str) -> bool:
+        """Check if the job is being run by any runner in the pool."""
+        return any(runner.is_running(job_id) for runner in self.runners)
+
+    def abort(self, job_id: str) -> None:
+        """Abort the job on whichever runner is running it."""
+        for runner in self.runners:
+            if runner.is_running(job_id):
+                runner.abort(job_id)
+                return
+        raise JobAlreadyAborted(job_id)
+
+    def add_async_watcher(self, watcher: AsyncEventNotifier) -> None:
+        """Add a watcher to be notified by any runner in the pool."""
+        for runner in self.runners:
+            runner.add_async_watcher(watcher)
+
+    def remove_async_watcher(self, watcher: AsyncEventNotifier) -> None:
+        """Stop notifying a watcher of any runner in the pool."""
+        for runner in self.runners:
+            runner.remove_async_watcher(watcher)
+
+    def add_runner(self, runner: AbsJobRunner) -> None:
+        """Add another runner, such as one for remote workers, to the pool.
+
+        This has to be done before consume is called.
+        """
+        self.runners.append(runner)
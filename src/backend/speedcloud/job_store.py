@@ -0,0 +1,289 @@
+"""Job store.
+
+Persists jobs so that the job queue and its history survive a restart.
+"""
+
+from __future__ import annotations
+
+import abc
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import typing
+from typing import Any, Dict, List, Optional, Tuple
+
+from speedcloud.job_manager import JobLog, JobQueueItem
+
+if typing.TYPE_CHECKING:
+    from speedcloud.api import schema
+
+__all__ = ["AbsJobStore", "SQLiteJobStore"]
+
+logger = logging.getLogger(__name__)
+
+
+class AbsJobStore(abc.ABC):
+    """Abstract base class for persisting jobs."""
+
+    @abc.abstractmethod
+    def save_job(self, item: JobQueueItem) -> None:
+        """Save everything about a job except for its logs."""
+
+    @abc.abstractmethod
+    def update_state(self, job_id: str, state: schema.JobState) -> None:
+        """Save the new state of a job."""
+
+    @abc.abstractmethod
+    def update_status(self, job_id: str, status: Dict[str, Any]) -> None:
+        """Save new status values of a job, such as its progress.
+
+        Args:
+            job_id: id of the job.
+            status: status values that changed, serialized like the status
+                in JobQueueItem.as_dict.
+        """
+
+    @abc.abstractmethod
+    def append_logs(self, job_id: str, logs: List[JobLog]) -> None:
+        """Add log messages to a job."""
+
+    @abc.abstractmethod
+    def delete_job(self, job_id: str) -> None:
+        """Remove job from the store."""
+
+    @abc.abstractmethod
+    def load(self) -> List[JobQueueItem]:
+        """Load all jobs in the store, in the order they were submitted."""
+
+    def start(self) -> None:
+        """Start the store."""
+
+    def close(self) -> None:
+        """Finish any pending writes and close the store."""
+
+
+_Operation = Tuple[str, Tuple[Any, ...]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    job_order INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    msg TEXT NOT NULL,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_logs_job_id ON job_logs (job_id);
+"""
+
+
+class SQLiteJobStore(AbsJobStore):
+    """Store jobs in a SQLite database in WAL mode.
+
+    Writes are handed off to a background thread, so calling any of the
+    write methods from the event loop only puts the change on a queue. The
+    writer thread gathers changes into batches and commits each batch as a
+    single transaction. Repeated updates to the same job within a batch are
+    collapsed into one write.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+    ) -> None:
+        """Create a new store.
+
+        Args:
+            path: file name of the SQLite database.
+            batch_size: maximum number of changes committed together.
+            flush_interval: how long in seconds to wait for more changes
+                before committing a batch.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue[Optional[_Operation]] = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+        connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def start(self) -> None:
+        """Start the background writer thread."""
+        if self._writer is not None:
+            return
+        self._writer = threading.Thread(
+            target=self._write_loop, name="SQLiteJobStore writer", daemon=True
+        )
+        self._writer.start()
+
+    def close(self) -> None:
+        """Finish any pending writes and stop the writer thread."""
+        if self._writer is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+
+    def flush(self) -> None:
+        """Block until every change queued so far has been committed."""
+        self._queue.join()
+
+    def save_job(self, item: JobQueueItem) -> None:
+        self._queue.put(
+            (
+                "save",
+                (
+                    item.job_id,
+                    item.order,
+                    item.state.value,
+                    json.dumps(item.as_dict(include_logs=False)),
+                ),
+            )
+        )
+
+    def update_state(self, job_id: str, state: schema.JobState) -> None:
+        self._queue.put(("state", (job_id, state.value)))
+
+    def update_status(self, job_id: str, status: Dict[str, Any]) -> None:
+        self._queue.put(("status", (job_id, dict(status))))
+
+    def append_logs(self, job_id: str, logs: List[JobLog]) -> None:
+        if logs:
+            self._queue.put(("logs", (job_id, list(logs))))
+
+    def delete_job(self, job_id: str) -> None:
+        self._queue.put(("delete", (job_id,)))
+
+    def load(self) -> List[JobQueueItem]:
+        connection = self._connect()
+        try:
+            logs: Dict[str, List[JobLog]] = {}
+            for job_id, msg, log_time in connection.execute(
+                "SELECT job_id, msg, time FROM job_logs ORDER BY id"
+            ):
+                logs.setdefault(job_id, []).append(
+                    JobLog(msg=msg, time=log_time)
+                )
+            items = []
+            for state, data in connection.execute(
+                "SELECT state, data FROM jobs ORDER BY job_order"
+            ):
+                job_data = json.loads(data)
+                job_data["state"] = state
+                job_data["status"]["logs"] = logs.get(job_data["job_id"], [])
+                items.append(JobQueueItem.from_dict(job_data))
+            return items
+        finally:
+            connection.close()
+
+    def _next_batch(self) -> List[Optional[_Operation]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self) -> None:
+        connection = self._connect()
+        try:
+            while True:
+                batch = self._next_batch()
+                try:
+                    self._write_batch(
+                        connection,
+                        [operation for operation in batch if operation]
+                    )
+                except Exception:  # pylint: disable=broad-exception-caught
+                    # Keep the writer alive so later changes are still saved
+                    logger.exception("Unable to write jobs to %s", self.path)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if batch[-1] is None:
+                    break
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _write_batch(
+        connection: sqlite3.Connection, batch: List[_Operation]
+    ) -> None:
+        # Only the latest save and state for each job matter, but order
+        # between jobs being saved, having logs added and being deleted does.
+        saves: Dict[str, Tuple[Any, ...]] = {}
+        states: Dict[str, str] = {}
+        statuses: Dict[str, Dict[str, Any]] = {}
+        with connection:
+            for operation, args in batch:
+                if operation == "save":
+                    saves[args[0]] = args
+                    states.pop(args[0], None)
+                    statuses.pop(args[0], None)
+                elif operation == "state":
+                    states[args[0]] = args[1]
+                elif operation == "status":
+                    statuses.setdefault(args[0], {}).update(args[1])
+                elif operation == "logs":
+                    job_id, logs = args
+                    connection.executemany(
+                        "INSERT INTO job_logs (job_id, msg, time) "
+                        "VALUES (?, ?, ?)",
+                        [(job_id, log["msg"], log["time"]) for log in logs],
+                    )
+                elif operation == "delete":
+                    job_id = args[0]
+                    saves.pop(job_id, None)
+                    states.pop(job_id, None)
+                    statuses.pop(job_id, None)
+                    connection.execute(
+                        "DELETE FROM jobs WHERE job_id = ?", (job_id,)
+                    )
+                    connection.execute(
+                        "DELETE FROM job_logs WHERE job_id = ?", (job_id,)
+                    )
+            connection.executemany(
+                "INSERT OR REPLACE INTO jobs (job_id, job_order, state, data) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (job_id, order, state, data)
+                    for job_id, order, state, data in saves.values()
+                ],
+            )
+            connection.executemany(
+                "UPDATE jobs SET state = ? WHERE job_id = ?",
+                [(state, job_id) for job_id, state in states.items()],
+            )
+            for job_id, status in statuses.items():
+                row = connection.execute(
+                    "SELECT data FROM jobs WHERE job_id = ?", (job_id,)
+                ).fetchone()
+                if row is None:
+                    continue
+                data = json.loads(row[0])
+                data["status"].update(status)
+                connection.execute(
+                    "UPDATE jobs SET data = ? WHERE job_id = ?",
+                    (json.dumps(data), job_id),
+                )
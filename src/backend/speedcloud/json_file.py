@@ -0,0 +1,119 @@
+"""Json files.
+
+Saves json files so that a crash part way through never leaves a file half
+written.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Optional
+
+__all__ = ["JsonFileWriter", "atomic_write_json"]
+
+logger = logging.getLogger(__name__)
+
+_NOTHING = object()
+
+
+def _to_json(value: Any) -> Any:
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def atomic_write_json(path: str, data: Any) -> None:
+    """Write data to a json file, replacing the file only once written.
+
+    Dataclasses in the data are written as dicts.
+    """
+    directory = os.path.dirname(path) or "."
+    with tempfile.NamedTemporaryFile(
+        "w", dir=directory, delete=False, suffix=".tmp", encoding="utf-8"
+    ) as handle:
+        json.dump(data, handle, default=_to_json)
+    os.replace(handle.name, path)
+
+
+class JsonFileWriter:
+    """Write a json file from a background thread.
+
+    Data saved while a write is waiting replaces the data waiting, so the
+    file is written at most once every delay seconds however often it is
+    saved.
+
+    The data is serialized by the background thread. It should be a copy
+    that the caller doesn't change afterwards.
+    """
+
+    def __init__(self, path: str, delay: float = 1.0) -> None:
+        """Create a new writer.
+
+        Args:
+            path: json file to write.
+            delay: seconds to wait for more changes before writing.
+        """
+        self.path = path
+        self.delay = delay
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._data: Any = _NOTHING
+        self._closing = False
+        self._writer: Optional[threading.Thread] = None
+
+    def save(self, data: Any) -> None:
+        """Write data to the file soon, replacing anything not written."""
+        with self._condition:
+            self._data = data
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop,
+                    name=f"{os.path.basename(self.path)} writer",
+                    daemon=True
+                )
+                self._writer.start()
+            self._condition.notify_all()
+
+    def flush(self) -> None:
+        """Write anything waiting to be written now."""
+        with self._write_lock:
+            with self._condition:
+                data, self._data = self._data, _NOTHING
+            if data is not _NOTHING:
+                atomic_write_json(self.path, data)
+
+    def close(self) -> None:
+        """Write anything waiting to be written and stop the writer."""
+        with self._condition:
+            writer = self._writer
+            self._closing = True
+            self._condition.notify_all()
+        if writer is not None:
+            writer.join()
+        with self._condition:
+            self._writer = None
+            self._closing = False
+        self.flush()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._data is not _NOTHING or self._closing
+                )
+                # Let more changes pile up before writing.
+                self._condition.wait_for(
+                    lambda: self._closing, timeout=self.delay
+                )
+                if self._closing:
+                    return
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-exception-caught
+                # Keep the writer alive so later changes are still written
+                logger.exception("Unable to write %s", self.path)
@@ -1,6 +1,7 @@
 """Main."""
 
 import argparse
+import asyncio
 import logging
 import sys
 
@@ -28,6 +29,23 @@ def run_debug(args) -> None:
     uvicorn.run(app, host="0.0.0.0", port=args.port, log_level="debug")
 
 
+def run_worker(args) -> None:
+    """Run remote worker agent."""
+    # pylint: disable=import-outside-toplevel
+    from speedcloud.remote_worker import RemoteWorkerAgent
+
+    logging.basicConfig(level=logging.INFO)
+    settings = config.get_settings()
+    agent = RemoteWorkerAgent(
+        args.connect,
+        storage_root=args.storage or settings.storage,
+        workers=args.workers,
+        name=args.name,
+        token=args.token or settings.remote_workers_token,
+    )
+    asyncio.run(agent.run())
+
+
 def get_arg_parser() -> argparse.ArgumentParser:
     """Get cli args parser."""
     parser = argparse.ArgumentParser()
@@ -39,6 +57,25 @@ def get_arg_parser() -> argparse.ArgumentParser:
     )
     create_default_config_parser.set_defaults(func=create_default_config_file)
 
+    worker_parser = subparsers.add_parser(
+        "worker", help="run jobs leased from a speedcloud server"
+    )
+    worker_parser.add_argument(
+        "--connect",
+        required=True,
+        help="server address, tcp://HOST:PORT or unix://PATH",
+    )
+    worker_parser.add_argument(
+        "--storage",
+        help="storage path with the same files as the server's storage",
+    )
+    worker_parser.add_argument(
+        "--workers", type=int, default=1, help="jobs to run at the same time"
+    )
+    worker_parser.add_argument("--name", help="name of this worker")
+    worker_parser.add_argument("--token", help="token the server requires")
+    worker_parser.set_defaults(func=run_worker)
+
     parser.add_argument("--port", type=int, default=8001)
     return parser
 
@@ -0,0 +1,567 @@
+"""Remote workers.
+
+Lets jobs run on other hosts. The API node runs a RemoteWorkerServer that
+hands out jobs from the job queue. Worker agents started with
+``python -m speedcloud worker --connect ADDRESS`` lease those jobs, run
+them, and send their state, status and logs back.
+
+Messages are json objects, one per line, sent over TCP or a Unix socket.
+
+Worker to server:
+
+* ``hello``: first message, with the name of the worker and the token.
+* ``lease``: ask for a job. A worker sends one for each free slot.
+* ``heartbeat``: sent regularly so that the server knows the worker is
+  still alive.
+* ``state``: a job changed state. A finished state ends the lease.
+* ``status``: progress, logs and other status changes of a job.
+
+Server to worker:
+
+* ``welcome``: reply to hello, with how often to send heartbeats.
+* ``job``: a job leased to the worker.
+* ``abort``: stop a job.
+
+A worker that disconnects or doesn't send anything for longer than the lease
+timeout is dropped and its unfinished jobs are put back in the queue.
+
+There is no encryption, so only use this on a trusted network.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import hmac
+import json
+import logging
+import socket
+import time
+import typing
+from typing import Any, Dict, Optional, Set, Tuple
+
+from speedcloud.api import schema
+from speedcloud.exceptions import JobAlreadyAborted, SpeedCloudException
+from speedcloud.job_manager import (
+    FINISHED_STATES,
+    AbsJobRunner,
+    AsyncEventNotifier,
+    JobQueueItem,
+    JobRunnerPool,
+    JobStatus,
+    NotificationManager,
+)
+from speedcloud.workflow_manager import WorkflowManagerAllWorkflows
+
+if typing.TYPE_CHECKING:
+    from speedcloud.job_manager import JobManager
+    from speedcloud.workflow_manager import AbsWorkflowManager
+
+__all__ = [
+    "RemoteWorkerServer",
+    "RemoteWorkerAgent",
+    "parse_address",
+]
+
+logger = logging.getLogger(__name__)
+
+Message = Dict[str, Any]
+
+# Log messages can make status messages large
+STREAM_LIMIT = 16 * 1024 * 1024
+
+
+class RemoteWorkerProtocolError(SpeedCloudException):
+    """Remote worker sent something that doesn't follow the protocol."""
+
+
+def parse_address(address: str) -> Tuple[str, ...]:
+    """Parse a remote worker address.
+
+    Args:
+        address: either tcp://HOST:PORT or unix://PATH
+
+    Returns:
+        Returns ("tcp", host, port) or ("unix", path).
+    """
+    scheme, separator, location = address.partition("://")
+    if not separator or not location:
+        raise ValueError(f"Invalid address {address}")
+    if scheme == "unix":
+        return ("unix", location)
+    if scheme == "tcp":
+        host, _, port = location.rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"Invalid tcp address {address}")
+        return ("tcp", host.strip("[]"), port)
+    raise ValueError(f"Unsupported address scheme {scheme}")
+
+
+def encode_message(message: Message) -> bytes:
+    """Encode a message as a line of json."""
+    return json.dumps(message).encode("utf-8") + b"\n"
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[Message]:
+    """Read the next message.
+
+    Returns:
+        Returns None once the connection is closed.
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        message = json.loads(line)
+    except json.JSONDecodeError as error:
+        raise RemoteWorkerProtocolError(f"Invalid message: {error}") from error
+    if not isinstance(message, dict) or "type" not in message:
+        raise RemoteWorkerProtocolError(f"Invalid message: {line!r}")
+    return message
+
+
+def encode_status(status: JobStatus) -> Dict[str, Any]:
+    """Convert a status update into data that can be serialized as json."""
+    data: Dict[str, Any] = dict(status)
+    if isinstance(start_time := data.get("start_time"), datetime.datetime):
+        data["start_time"] = start_time.isoformat()
+    return data
+
+
+def decode_status(data: typing.Mapping[str, Any]) -> JobStatus:
+    """Convert data created by encode_status back into a status update."""
+    status = typing.cast(JobStatus, dict(data))
+    if isinstance(start_time := data.get("start_time"), str):
+        status["start_time"] = datetime.datetime.fromisoformat(start_time)
+    return status
+
+
+class _WorkerConnection:
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.name = str(writer.get_extra_info("peername") or "unknown")
+        self.last_seen = time.monotonic()
+        self.leases: Dict[str, JobQueueItem] = {}
+        self.lease_requests: Set[asyncio.Task[None]] = set()
+        self.closed = False
+
+    def send(self, message: Message) -> None:
+        if not self.closed:
+            self.writer.write(encode_message(message))
+
+
+class RemoteWorkerServer(AbsJobRunner):
+    """Hand out jobs in the job queue to remote worker agents."""
+
+    def __init__(
+        self,
+        job_queue: asyncio.Queue[JobQueueItem],
+        job_manager: JobManager,
+        address: str,
+        heartbeat_interval: float = 5.0,
+        lease_timeout: Optional[float] = None,
+        token: Optional[str] = None,
+    ) -> None:
+        """Create a new server.
+
+        Args:
+            job_queue: job queue for pull jobs off to hand out.
+            job_manager: used to put jobs back in the queue when the worker
+                running them goes away.
+            address: where to listen for workers, see parse_address.
+            heartbeat_interval: how often workers send heartbeats, in
+                seconds.
+            lease_timeout: how long a worker can go without sending anything
+                before it is dropped. Defaults to three heartbeats.
+            token: shared secret that workers have to send to connect.
+        """
+        self._job_queue = job_queue
+        self._job_manager = job_manager
+        self.address = address
+        self.heartbeat_interval = heartbeat_interval
+        self.lease_timeout = (
+            lease_timeout
+            if lease_timeout is not None
+            else heartbeat_interval * 3
+        )
+        self.token = token
+        self._server: Optional[asyncio.Server] = None
+        self._connections: Set[_WorkerConnection] = set()
+        self._notification_manager = NotificationManager()
+
+    @property
+    def sockets(self) -> Tuple[socket.socket, ...]:
+        """Get the sockets listened on, such as to find a random port."""
+        if self._server is None:
+            return ()
+        return tuple(self._server.sockets)
+
+    @property
+    def workers(self) -> int:
+        """Get the number of workers connected."""
+        return len(self._connections)
+
+    async def start(self) -> None:
+        """Start listening for workers."""
+        if self._server is not None:
+            return
+        address = parse_address(self.address)
+        if address[0] == "unix":
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection, path=address[1], limit=STREAM_LIMIT
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_connection,
+                host=address[1],
+                port=int(address[2]),
+                limit=STREAM_LIMIT,
+            )
+        logger.info("Listening for remote workers on %s", self.address)
+
+    async def close(self) -> None:
+        """Stop listening and disconnect every worker."""
+        if self._server is not None:
+            self._server.close()
+        for connection in list(self._connections):
+            connection.writer.close()
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+
+    async def consume(self) -> None:
+        """Hand out jobs to workers and drop workers that stop responding.
+
+        This should be run as a task and canceled when done otherwise it will
+        run forever.
+        """
+        await self.start()
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            self.expire_leases()
+
+    def expire_leases(self) -> None:
+        """Disconnect workers that haven't been heard from in time."""
+        deadline = time.monotonic() - self.lease_timeout
+        for connection in list(self._connections):
+            if connection.last_seen < deadline:
+                logger.warning(
+                    "Remote worker %s stopped responding", connection.name
+                )
+                connection.writer.close()
+
+    def _lease_owner(self, job_id: str) -> Optional[_WorkerConnection]:
+        for connection in self._connections:
+            if job_id in connection.leases:
+                return connection
+        return None
+
+    def is_running(self, job_id: str) -> bool:
+        """Check if the job is leased to a worker."""
+        return self._lease_owner(job_id) is not None
+
+    def abort(self, job_id: str) -> None:
+        """Tell the worker running the job to abort it."""
+        if (connection := self._lease_owner(job_id)) is None:
+            raise JobAlreadyAborted(job_id)
+        connection.send({"type": "abort", "job_id": job_id})
+
+    def add_async_watcher(self, watcher: AsyncEventNotifier) -> None:
+        """Add a watcher to be notified."""
+        self._notification_manager.add_async_watcher(watcher)
+
+    def remove_async_watcher(self, watcher: AsyncEventNotifier) -> None:
+        """Stop notifying a watcher."""
+        self._notification_manager.remove_async_watcher(watcher)
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        connection = _WorkerConnection(reader, writer)
+        try:
+            hello = await asyncio.wait_for(
+                read_message(reader), self.lease_timeout
+            )
+            if hello is None or hello["type"] != "hello":
+                raise RemoteWorkerProtocolError("Expected hello message")
+            if self.token is not None and not hmac.compare_digest(
+                str(hello.get("token", "")), self.token
+            ):
+                raise RemoteWorkerProtocolError("Invalid token")
+            connection.name = str(hello.get("worker", connection.name))
+            self._connections.add(connection)
+            logger.info("Remote worker %s connected", connection.name)
+            connection.send(
+                {
+                    "type": "welcome",
+                    "heartbeat_interval": self.heartbeat_interval,
+                }
+            )
+            while (message := await read_message(reader)) is not None:
+                connection.last_seen = time.monotonic()
+                await self._handle_message(connection, message)
+        except (
+            ConnectionError,
+            asyncio.TimeoutError,
+            RemoteWorkerProtocolError,
+            ValueError,
+            KeyError,
+        ) as error:
+            logger.warning(
+                "Dropping remote worker %s: %s", connection.name, error
+            )
+        finally:
+            self._connections.discard(connection)
+            writer.close()
+            await self._release_leases(connection)
+            logger.info("Remote worker %s disconnected", connection.name)
+
+    async def _handle_message(
+        self, connection: _WorkerConnection, message: Message
+    ) -> None:
+        message_type = message["type"]
+        if message_type == "heartbeat":
+            return
+        if message_type == "lease":
+            request = asyncio.create_task(self._lease(connection))
+            connection.lease_requests.add(request)
+            request.add_done_callback(connection.lease_requests.discard)
+            return
+        if message_type not in ("state", "status"):
+            raise RemoteWorkerProtocolError(
+                f"Unknown message type {message_type}"
+            )
+        item = connection.leases.get(message["job_id"])
+        if item is None:
+            # Most likely the lease expired and the job was handed to
+            # someone else.
+            logger.debug(
+                "Ignoring %s for job %s not leased to %s",
+                message_type,
+                message["job_id"],
+                connection.name,
+            )
+            return
+        if message_type == "status":
+            item.update_status(decode_status(message["status"]))
+        else:
+            item.state = schema.JobState(message["state"])
+            if item.state in FINISHED_STATES:
+                del connection.leases[item.job_id]
+                self._job_queue.task_done()
+        await self._notification_manager.notify_async()
+
+    async def _lease(self, connection: _WorkerConnection) -> None:
+        item = await self._job_queue.get()
+        while item.state != schema.JobState.QUEUED:
+            # Aborted after being handed to the runners
+            self._job_queue.task_done()
+            item = await self._job_queue.get()
+        if connection.closed:
+            await self._job_manager.requeue(item.job_id)
+            self._job_queue.task_done()
+            return
+        connection.leases[item.job_id] = item
+        connection.send(
+            {"type": "job", "job": item.as_dict(include_logs=False)}
+        )
+        logger.info("Job %s leased to %s", item.job_id, connection.name)
+
+    async def _release_leases(self, connection: _WorkerConnection) -> None:
+        connection.closed = True
+        for request in list(connection.lease_requests):
+            request.cancel()
+        await asyncio.gather(
+            *connection.lease_requests, return_exceptions=True
+        )
+        for item in list(connection.leases.values()):
+            await self._job_manager.requeue(item.job_id)
+            self._job_queue.task_done()
+        connection.leases.clear()
+        await self._notification_manager.notify_async()
+
+
+class RemoteWorkerAgent:
+    """Run jobs leased from a RemoteWorkerServer."""
+
+    def __init__(
+        self,
+        address: str,
+        storage_root: str,
+        workflow_manager: Optional[AbsWorkflowManager] = None,
+        workers: int = 1,
+        name: Optional[str] = None,
+        token: Optional[str] = None,
+    ) -> None:
+        """Create a new worker agent.
+
+        Args:
+            address: where the server is listening, see parse_address.
+            storage_root: path that runner storage starts from. This needs
+                to have the same files as the storage of the API node.
+            workflow_manager: workflows that this worker can run. Jobs are
+                matched to workflows by name.
+            workers: number of jobs to run at the same time.
+            name: name to identify this worker with in the server logs.
+            token: shared secret the server expects.
+        """
+        self.address = address
+        self.storage_root = storage_root
+        self.workflow_manager = (
+            workflow_manager or WorkflowManagerAllWorkflows()
+        )
+        self.workers = workers
+        self.name = name or socket.gethostname()
+        self.token = token
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[JobRunnerPool] = None
+        self._jobs: Dict[str, JobQueueItem] = {}
+        self._abort_requested: Set[str] = set()
+
+    async def _connect(
+        self,
+    ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        address = parse_address(self.address)
+        if address[0] == "unix":
+            return await asyncio.open_unix_connection(
+                address[1], limit=STREAM_LIMIT
+            )
+        return await asyncio.open_connection(
+            address[1], int(address[2]), limit=STREAM_LIMIT
+        )
+
+    def _send(self, message: Message) -> None:
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write(encode_message(message))
+
+    def _send_threadsafe(self, message: Message) -> None:
+        # Job status changes come from worker threads. Everything goes
+        # through the event loop so that messages keep their order.
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._send, message)
+
+    async def run(self) -> None:
+        """Run jobs from the server until the connection is closed."""
+        self._loop = asyncio.get_running_loop()
+        reader, self._writer = await self._connect()
+        local_queue: asyncio.Queue[JobQueueItem] = asyncio.Queue()
+        self._runner = JobRunnerPool(
+            local_queue,
+            self.storage_root,
+            self.workflow_manager,
+            workers=self.workers,
+        )
+        consumer = asyncio.create_task(self._runner.consume())
+        heartbeat: Optional[asyncio.Task[None]] = None
+        try:
+            self._send(
+                {"type": "hello", "worker": self.name, "token": self.token}
+            )
+            welcome = await read_message(reader)
+            if welcome is None or welcome["type"] != "welcome":
+                raise RemoteWorkerProtocolError("Server refused connection")
+            heartbeat = asyncio.create_task(
+                self._send_heartbeats(float(welcome["heartbeat_interval"]))
+            )
+            for _ in range(self.workers):
+                self._send({"type": "lease"})
+            while (message := await read_message(reader)) is not None:
+                if message["type"] == "job":
+                    self._start_job(local_queue, message["job"])
+                elif message["type"] == "abort":
+                    self._abort_job(message["job_id"])
+            logger.info("Server closed the connection")
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            # The server has already put these back in the queue
+            for job_id in list(self._jobs):
+                self._abort_job(job_id)
+            consumer.cancel()
+            await asyncio.gather(consumer, return_exceptions=True)
+            self._writer.close()
+            self._writer = None
+
+    async def _send_heartbeats(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self._send({"type": "heartbeat"})
+            if self._writer is not None:
+                await self._writer.drain()
+
+    def _start_job(
+        self,
+        local_queue: asyncio.Queue[JobQueueItem],
+        job_data: Dict[str, Any],
+    ) -> None:
+        item = JobQueueItem.from_dict(job_data)
+        workflow_name = item.job["workflow"]["name"]
+        try:
+            # Workflow ids depend on what is loaded, so look up the local id
+            item.job["workflow"]["id"] = (
+                self.workflow_manager.get_workflow_id_by_name(workflow_name)
+            )
+        except ValueError:
+            logger.error("Workflow %s is not available", workflow_name)
+            self._send(
+                {
+                    "type": "status",
+                    "job_id": item.job_id,
+                    "status": {
+                        "logs": [
+                            {
+                                "msg": f"Workflow {workflow_name} is not "
+                                f"available on worker {self.name}",
+                                "time": round(time.time(), 3),
+                            }
+                        ]
+                    },
+                }
+            )
+            self._send(
+                {
+                    "type": "state",
+                    "job_id": item.job_id,
+                    "state": schema.JobState.FAILED.value,
+                }
+            )
+            self._send({"type": "lease"})
+            return
+        self._jobs[item.job_id] = item
+        item.add_on_state_change_callback(self._forward_state)
+        item.add_on_status_change_callback(self._forward_status)
+        local_queue.put_nowait(item)
+
+    def _abort_job(self, job_id: str) -> None:
+        if self._runner is not None and self._runner.is_running(job_id):
+            self._runner.abort(job_id)
+        else:
+            # Abort as soon as it starts running
+            self._abort_requested.add(job_id)
+
+    def _forward_state(self, item: JobQueueItem, _: schema.JobState) -> None:
+        self._send_threadsafe(
+            {"type": "state", "job_id": item.job_id, "state": item.state.value}
+        )
+        if item.state == schema.JobState.RUNNING:
+            if item.job_id in self._abort_requested and self._runner:
+                self._runner.abort(item.job_id)
+        elif item.state in FINISHED_STATES:
+            item.remove_on_state_change_callback(self._forward_state)
+            item.remove_on_status_change_callback(self._forward_status)
+            self._jobs.pop(item.job_id, None)
+            self._abort_requested.discard(item.job_id)
+            self._send_threadsafe({"type": "lease"})
+
+    def _forward_status(self, item: JobQueueItem, status: JobStatus) -> None:
+        self._send_threadsafe(
+            {
+                "type": "status",
+                "job_id": item.job_id,
+                "status": encode_status(status),
+            }
+        )
@@ -0,0 +1,214 @@
+"""Result cache.
+
+Remembers the report and logs of successful jobs so that running the same
+workflow with the same parameters on inputs that haven't changed can reuse
+them instead of doing all the work again.
+"""
+
+from __future__ import annotations
+
+import collections
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import typing
+from typing import Any, Iterable, List, Mapping, Optional, Tuple
+
+from speedcloud.json_file import JsonFileWriter, atomic_write_json
+
+if typing.TYPE_CHECKING:
+    from speedcloud.job_manager import JobLog
+
+__all__ = ["CachedResult", "ResultCache", "fingerprint_path"]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class CachedResult:
+    """Stored outcome of a successful job."""
+
+    report: Optional[str]
+    logs: List[JobLog]
+
+    def size(self) -> int:
+        """Get the number of bytes used by the report and log messages."""
+        return len(self.report or "") + sum(
+            len(log["msg"]) for log in self.logs
+        )
+
+
+def fingerprint_path(path: str) -> List[Tuple[str, int, int]]:
+    """Get the path, size and modification time of everything at path.
+
+    Directories are walked so that any file added, removed or changed inside
+    of them changes the fingerprint.
+    """
+    if not os.path.exists(path):
+        return [(path, -1, -1)]
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return [(path, stat.st_size, stat.st_mtime_ns)]
+    fingerprint = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            fingerprint.append(
+                (
+                    os.path.relpath(file_path, path),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                )
+            )
+    return [(path, len(fingerprint), os.stat(path).st_mtime_ns)] + fingerprint
+
+
+class ResultCache:
+    """Least recently used cache of job results.
+
+    Entries are evicted once there are more than max_entries of them, or
+    once the reports and logs take more than max_bytes in total.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 100,
+        max_bytes: Optional[int] = None,
+        path: Optional[str] = None,
+        workflows: Optional[Iterable[str]] = None,
+        max_logs: int = 100,
+        background_writes: bool = False,
+    ) -> None:
+        """Create a new result cache.
+
+        Args:
+            max_entries: maximum number of results stored.
+            max_bytes: maximum size of all the reports and logs stored.
+            path: json file to save the cache to so that it survives a
+                restart. Kept in memory only if not set.
+            workflows: names of the workflows that can use the cache. All
+                workflows can if not set.
+            max_logs: number of the last log messages of a job stored with
+                its result.
+            background_writes: save the file from a background thread,
+                at most once a second, instead of each time a result is
+                stored.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.max_logs = max_logs
+        self.workflows = (
+            frozenset(workflows) if workflows is not None else None
+        )
+        self._entries: typing.OrderedDict[str, CachedResult] = (
+            collections.OrderedDict()
+        )
+        self._total_bytes = 0
+        self._writer = (
+            JsonFileWriter(path)
+            if path is not None and background_writes
+            else None
+        )
+        if self.path is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def close(self) -> None:
+        """Save any results not saved yet."""
+        if self._writer is not None:
+            self._writer.close()
+
+    def is_enabled_for(self, workflow_name: str) -> bool:
+        """Check if a workflow can use the cache."""
+        return self.workflows is None or workflow_name in self.workflows
+
+    @staticmethod
+    def make_key(
+        workflow_name: str,
+        options: Mapping[str, Any],
+        input_paths: Iterable[str] = (),
+    ) -> str:
+        """Create the cache key for a job.
+
+        This reads the file system to fingerprint the input paths so it
+        should not be called from the event loop.
+
+        Args:
+            workflow_name: name of the workflow.
+            options: parameters that the workflow is run with.
+            input_paths: files and directories read by the job.
+        """
+        data = {
+            "workflow": workflow_name,
+            "options": options,
+            "inputs": [
+                fingerprint_path(path) for path in sorted(set(input_paths))
+            ],
+        }
+        return hashlib.sha256(
+            json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """Get a cached result, marking it as the most recently used."""
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: CachedResult) -> None:
+        """Store a result, evicting the least recently used as needed."""
+        if (existing := self._entries.pop(key, None)) is not None:
+            self._total_bytes -= existing.size()
+        self._entries[key] = result
+        self._total_bytes += result.size()
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (
+                self.max_bytes is not None
+                and self._total_bytes > self.max_bytes
+            )
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= evicted.size()
+        self._save()
+
+    def _load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                entries = json.load(handle)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logger.warning("Ignoring invalid result cache %s", self.path)
+            return
+        for key, result in entries:
+            cached = CachedResult(report=result["report"], logs=result["logs"])
+            self._entries[key] = cached
+            self._total_bytes += cached.size()
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        # Results aren't changed once stored, so a shallow copy is enough
+        # for the writer thread to serialize.
+        data = list(self._entries.items())
+        if self._writer is not None:
+            self._writer.save(data)
+        else:
+            atomic_write_json(self.path, data)
@@ -0,0 +1,171 @@
+"""Runtime history.
+
+Remembers how long jobs of each workflow took so that the time a new job
+will take can be estimated before it runs.
+"""
+
+from __future__ import annotations
+
+import collections
+import dataclasses
+import json
+import logging
+import os
+import typing
+from typing import Dict, Iterable, List, Optional
+
+from speedcloud.json_file import JsonFileWriter, atomic_write_json
+
+if typing.TYPE_CHECKING:
+    from speedcloud.job_manager import JobQueueItem
+
+__all__ = ["JobRuntime", "RuntimeHistory", "measure_input_size"]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class JobRuntime:
+    """How long a finished job took."""
+
+    duration: float
+    subtask_count: Optional[int] = None
+    input_size: Optional[int] = None
+
+
+def measure_input_size(paths: Iterable[str]) -> Optional[int]:
+    """Get the total number of bytes of the files at or under the paths.
+
+    Returns:
+        Returns None if there are no paths.
+    """
+    paths = list(paths)
+    if not paths:
+        return None
+    total = 0
+    for path in paths:
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+            continue
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    continue
+    return total
+
+
+class RuntimeHistory:
+    """Runtimes of the most recent successful jobs of each workflow.
+
+    Workflows are identified by name, the same as by the schedulers.
+    """
+
+    def __init__(
+        self,
+        max_samples: int = 50,
+        path: Optional[str] = None,
+        background_writes: bool = False,
+    ) -> None:
+        """Create a new runtime history.
+
+        Args:
+            max_samples: number of jobs remembered for each workflow.
+            path: json file to save the history to so that it survives a
+                restart. Kept in memory only if not set.
+            background_writes: save the file from a background thread,
+                at most once a second, instead of each time a runtime is
+                recorded.
+        """
+        self.max_samples = max_samples
+        self.path = path
+        self._runtimes: Dict[str, typing.Deque[JobRuntime]] = {}
+        self._writer = (
+            JsonFileWriter(path)
+            if path is not None and background_writes
+            else None
+        )
+        if self.path is not None:
+            self._load()
+
+    def __contains__(self, workflow_name: object) -> bool:
+        return workflow_name in self._runtimes
+
+    def runtimes(self, workflow_name: str) -> List[JobRuntime]:
+        """Get the runtimes recorded for a workflow, oldest first."""
+        return list(self._runtimes.get(workflow_name, []))
+
+    def record(self, workflow_name: str, runtime: JobRuntime) -> None:
+        """Record the runtime of a finished job."""
+        runtimes = self._runtimes.setdefault(
+            workflow_name, collections.deque(maxlen=self.max_samples)
+        )
+        runtimes.append(runtime)
+        self._save()
+
+    def close(self) -> None:
+        """Save any runtimes not saved yet."""
+        if self._writer is not None:
+            self._writer.close()
+
+    def estimate(
+        self, workflow_name: str, input_size: Optional[int] = None
+    ) -> Optional[float]:
+        """Estimate how many seconds a job of a workflow will take.
+
+        If the size of the input is known, both for the new job and for
+        earlier jobs, the estimate is scaled by it using the average time
+        taken per byte. Otherwise, the average duration is used.
+
+        Returns:
+            Returns None if no jobs of the workflow have been recorded.
+        """
+        runtimes = self._runtimes.get(workflow_name)
+        if not runtimes:
+            return None
+        if input_size is not None:
+            sized = [
+                runtime for runtime in runtimes if runtime.input_size
+            ]
+            if sized:
+                total_bytes = sum(
+                    typing.cast(int, runtime.input_size) for runtime in sized
+                )
+                total_duration = sum(runtime.duration for runtime in sized)
+                return total_duration / total_bytes * input_size
+        return sum(runtime.duration for runtime in runtimes) / len(runtimes)
+
+    def estimate_job(self, item: JobQueueItem) -> Optional[float]:
+        """Estimate how many seconds a job will take to run."""
+        return self.estimate(item.job["workflow"]["name"], item.input_size)
+
+    def _load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logger.warning("Ignoring invalid runtime history %s", self.path)
+            return
+        for workflow_name, runtimes in data.items():
+            self._runtimes[workflow_name] = collections.deque(
+                (JobRuntime(**runtime) for runtime in runtimes),
+                maxlen=self.max_samples,
+            )
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        # Copied so the runtimes can be serialized by the writer thread
+        data = {
+            workflow_name: list(runtimes)
+            for workflow_name, runtimes in self._runtimes.items()
+        }
+        if self._writer is not None:
+            self._writer.save(data)
+        else:
+            atomic_write_json(self.path, data)
@@ -0,0 +1,372 @@
+"""Job scheduling policies.
+
+Schedulers decide which queued job gets dispatched to a runner next.
+"""
+
+from __future__ import annotations
+
+import abc
+import heapq
+import itertools
+import typing
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    TYPE_CHECKING,
+)
+
+if TYPE_CHECKING:
+    from speedcloud.job_manager import JobQueueItem
+    from speedcloud.runtime_history import RuntimeHistory
+
+__all__ = [
+    "AbsJobScheduler",
+    "FIFOScheduler",
+    "PriorityScheduler",
+    "FairShareScheduler",
+    "ShortestJobFirstScheduler",
+    "create_scheduler",
+    "SCHEDULER_POLICIES",
+]
+
+
+class AbsJobScheduler(abc.ABC):
+    """Abstract base class for job schedulers."""
+
+    # Set by schedulers that order jobs by the size of their input, which
+    # is otherwise not worth measuring when jobs are submitted.
+    uses_input_size = False
+
+    @abc.abstractmethod
+    def push(self, item: JobQueueItem) -> None:
+        """Add a job waiting to be dispatched."""
+
+    @abc.abstractmethod
+    def pop(self) -> Optional[JobQueueItem]:
+        """Remove and return the next job to dispatch.
+
+        Returns:
+            Returns None if no job is waiting.
+        """
+
+    @abc.abstractmethod
+    def discard(self, job_id: str) -> None:
+        """Remove a job if it is waiting to be dispatched."""
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Get the number of jobs waiting to be dispatched."""
+
+    @abc.abstractmethod
+    def __contains__(self, job_id: object) -> bool:
+        """Check if a job is waiting to be dispatched."""
+
+    @abc.abstractmethod
+    def ordered(self) -> List[JobQueueItem]:
+        """Get the jobs waiting, in the order they would be dispatched."""
+
+    def reprioritize(self, item: JobQueueItem, priority: int) -> None:
+        """Change the priority of a job waiting to be dispatched."""
+        item.priority = priority
+
+
+class HeapScheduler(AbsJobScheduler):
+    """Scheduler backed by a binary heap.
+
+    Changing the position of a job marks its old heap entry as removed and
+    pushes a new one, so reprioritizing is O(log n) instead of rebuilding
+    the heap.
+    """
+
+    def __init__(self) -> None:
+        """Create a new empty scheduler."""
+        self._heap: List[List[typing.Any]] = []
+        self._entries: Dict[str, List[typing.Any]] = {}
+        self._counter = itertools.count()
+
+    @abc.abstractmethod
+    def sort_key(self, item: JobQueueItem) -> typing.Tuple[typing.Any, ...]:
+        """Get the key that the heap is ordered by. Lowest goes first."""
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, job_id: object) -> bool:
+        return job_id in self._entries
+
+    def push(self, item: JobQueueItem) -> None:
+        self.discard(item.job_id)
+        entry = [self.sort_key(item), next(self._counter), item]
+        self._entries[item.job_id] = entry
+        heapq.heappush(self._heap, entry)
+
+    def pop(self) -> Optional[JobQueueItem]:
+        while self._heap:
+            *_, item = heapq.heappop(self._heap)
+            if item is None:
+                continue
+            del self._entries[item.job_id]
+            return item
+        return None
+
+    def ordered(self) -> List[JobQueueItem]:
+        return [
+            entry[-1]
+            for entry in sorted(
+                self._entries.values(), key=lambda entry: entry[:2]
+            )
+        ]
+
+    def peek(self) -> Optional[JobQueueItem]:
+        """Get the next job without removing it."""
+        while self._heap and self._heap[0][-1] is None:
+            heapq.heappop(self._heap)
+        return self._heap[0][-1] if self._heap else None
+
+    def discard(self, job_id: str) -> None:
+        entry = self._entries.pop(job_id, None)
+        if entry is not None:
+            entry[-1] = None
+
+    def reprioritize(self, item: JobQueueItem, priority: int) -> None:
+        super().reprioritize(item, priority)
+        if item.job_id in self._entries:
+            self.push(item)
+
+
+class FIFOScheduler(HeapScheduler):
+    """Dispatch jobs in the order they were submitted."""
+
+    def sort_key(self, item: JobQueueItem) -> typing.Tuple[typing.Any, ...]:
+        return (item.order,)
+
+
+class PriorityScheduler(HeapScheduler):
+    """Dispatch jobs with the highest priority first.
+
+    Jobs with the same priority are dispatched in the order submitted.
+    """
+
+    def sort_key(self, item: JobQueueItem) -> typing.Tuple[typing.Any, ...]:
+        return (-item.priority, item.order)
+
+
+class ShortestJobFirstScheduler(HeapScheduler):
+    """Dispatch the jobs expected to take the least time first.
+
+    So that long jobs don't wait forever while shorter ones keep arriving,
+    the expected duration of a job is reduced by aging seconds for every
+    second it has been waiting. Every waiting job ages at the same rate, so
+    this only depends on when each job was submitted and the order of the
+    waiting jobs doesn't change over time.
+
+    Jobs with a higher priority still go first. Jobs without an estimate are
+    expected to take no time at all, so that workflows without a history
+    get one quickly.
+    """
+
+    uses_input_size = True
+
+    def __init__(
+        self,
+        estimate: Callable[[JobQueueItem], Optional[float]],
+        aging: float = 1.0,
+    ) -> None:
+        """Create a new scheduler.
+
+        Args:
+            estimate: function to get the expected duration of a job in
+                seconds.
+            aging: how much the expected duration is reduced for each second
+                a job waits. Zero means the shortest job always goes first.
+        """
+        super().__init__()
+        self._estimate = estimate
+        self.aging = aging
+
+    def sort_key(self, item: JobQueueItem) -> typing.Tuple[typing.Any, ...]:
+        expected = self._estimate(item) or 0.0
+        return (
+            -item.priority,
+            expected + self.aging * item.time_submitted.timestamp(),
+            item.order,
+        )
+
+
+class _ShareGroup:
+    def __init__(self, weight: float) -> None:
+        self.weight = weight
+        self.virtual_time = 0.0
+        self.jobs = PriorityScheduler()
+
+
+class FairShareScheduler(AbsJobScheduler):
+    """Weighted fair-share between groups of jobs.
+
+    Jobs are split into groups, such as by submitter or by workflow. Each
+    group accumulates virtual time at a rate of 1/weight for every job
+    dispatched from it, and the group with the least virtual time goes next.
+    Within a group, jobs are ordered by priority then by submission order.
+    """
+
+    def __init__(
+        self,
+        group_key: Callable[[JobQueueItem], Hashable],
+        weights: Optional[Mapping[str, float]] = None,
+        default_weight: float = 1.0,
+    ) -> None:
+        """Create a new fair-share scheduler.
+
+        Args:
+            group_key: function to determine what group a job is part of.
+            weights: relative share given to a group, keyed by the group name.
+            default_weight: weight for groups not listed in weights.
+        """
+        self._group_key = group_key
+        self._weights = dict(weights or {})
+        self._default_weight = default_weight
+        self._groups: Dict[Hashable, _ShareGroup] = {}
+        self._job_groups: Dict[str, Hashable] = {}
+        self._active: List[typing.Tuple[float, int, Hashable]] = []
+        self._counter = itertools.count()
+        self._virtual_time = 0.0
+
+    def __len__(self) -> int:
+        return len(self._job_groups)
+
+    def __contains__(self, job_id: object) -> bool:
+        return job_id in self._job_groups
+
+    def _get_group(self, key: Hashable) -> _ShareGroup:
+        if (group := self._groups.get(key)) is None:
+            weight = self._weights.get(str(key), self._default_weight)
+            if weight <= 0:
+                raise ValueError(f"Weight for {key} needs to be positive")
+            group = self._groups[key] = _ShareGroup(weight)
+        return group
+
+    def _activate(self, key: Hashable, group: _ShareGroup) -> None:
+        heapq.heappush(
+            self._active, (group.virtual_time, next(self._counter), key)
+        )
+
+    def push(self, item: JobQueueItem) -> None:
+        self.discard(item.job_id)
+        key = self._group_key(item)
+        group = self._get_group(key)
+        if len(group.jobs) == 0:
+            # An idle group doesn't get to bank credit while it was idle
+            group.virtual_time = max(group.virtual_time, self._virtual_time)
+            self._activate(key, group)
+        group.jobs.push(item)
+        self._job_groups[item.job_id] = key
+
+    def pop(self) -> Optional[JobQueueItem]:
+        while self._active:
+            virtual_time, _, key = heapq.heappop(self._active)
+            group = self._groups[key]
+            if virtual_time != group.virtual_time:
+                continue
+            if (item := group.jobs.pop()) is None:
+                continue
+            del self._job_groups[item.job_id]
+            self._virtual_time = virtual_time
+            group.virtual_time += 1 / group.weight
+            if len(group.jobs) > 0:
+                self._activate(key, group)
+            return item
+        return None
+
+    def ordered(self) -> List[JobQueueItem]:
+        # Replay the dispatching on copies of the virtual times
+        heap = []
+        for index, group in enumerate(self._groups.values()):
+            if jobs := group.jobs.ordered():
+                heap.append((group.virtual_time, index, 0, jobs, group.weight))
+        heapq.heapify(heap)
+        ordered = []
+        while heap:
+            virtual_time, index, position, jobs, weight = heapq.heappop(heap)
+            ordered.append(jobs[position])
+            if position + 1 < len(jobs):
+                next_time = virtual_time + 1 / weight
+                heapq.heappush(
+                    heap, (next_time, index, position + 1, jobs, weight)
+                )
+        return ordered
+
+    def discard(self, job_id: str) -> None:
+        key = self._job_groups.pop(job_id, None)
+        if key is not None:
+            self._groups[key].jobs.discard(job_id)
+
+    def reprioritize(self, item: JobQueueItem, priority: int) -> None:
+        key = self._job_groups.get(item.job_id)
+        if key is None:
+            super().reprioritize(item, priority)
+            return
+        self._groups[key].jobs.reprioritize(item, priority)
+
+
+def _by_submitter(item: JobQueueItem) -> Hashable:
+    return item.submitter or ""
+
+
+def _by_workflow(item: JobQueueItem) -> Hashable:
+    # Workflow names are used as the key instead of the numeric ids because
+    # the ids depend on the order that workflows are loaded.
+    return item.job["workflow"]["name"]
+
+
+def _shortest_job_first(
+    runtime_history: Optional[RuntimeHistory], aging: float
+) -> ShortestJobFirstScheduler:
+    if runtime_history is None:
+        raise ValueError("Shortest job first scheduling needs a history")
+    return ShortestJobFirstScheduler(runtime_history.estimate_job, aging)
+
+
+SCHEDULER_POLICIES: Dict[str, Callable[..., AbsJobScheduler]] = {
+    "fifo": lambda **_: FIFOScheduler(),
+    "priority": lambda **_: PriorityScheduler(),
+    "fair_share_submitter": lambda weights, **_: FairShareScheduler(
+        _by_submitter, weights
+    ),
+    "fair_share_workflow": lambda weights, **_: FairShareScheduler(
+        _by_workflow, weights
+    ),
+    "shortest_job_first": lambda runtime_history, aging, **_:
+        _shortest_job_first(runtime_history, aging),
+}
+
+
+def create_scheduler(
+    policy: str,
+    weights: Optional[Mapping[str, float]] = None,
+    runtime_history: Optional[RuntimeHistory] = None,
+    aging: float = 1.0,
+) -> AbsJobScheduler:
+    """Create a scheduler by policy name.
+
+    Args:
+        policy: one of the keys in SCHEDULER_POLICIES.
+        weights: fair-share weights keyed by group, ignored by other policies.
+        runtime_history: runtimes of earlier jobs, used by the shortest job
+            first policy.
+        aging: seconds taken off the expected duration of a job for each
+            second it waits, used by the shortest job first policy.
+    """
+    try:
+        factory = SCHEDULER_POLICIES[policy]
+    except KeyError as error:
+        raise ValueError(
+            f"Unknown scheduler policy {policy}. "
+            f"Valid policies: {', '.join(SCHEDULER_POLICIES)}"
+        ) from error
+    return factory(
+        weights=weights, runtime_history=runtime_history, aging=aging
+    )
@@ -0,0 +1,145 @@
+"""Subtask runners.
+
+Decide where the subtasks of a workflow are run.
+"""
+
+from __future__ import annotations
+
+import abc
+import concurrent.futures
+import logging
+import multiprocessing
+import multiprocessing.managers
+import pickle
+import queue
+import threading
+import typing
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import speedwagon
+
+__all__ = [
+    "AbsSubtaskRunner",
+    "ThreadSubtaskRunner",
+    "ProcessSubtaskRunner",
+]
+
+logger = logging.getLogger(__name__)
+
+LogCallback = Callable[[str], None]
+
+# State of a subtask that stays with the copy in the parent process.
+_PARENT_ONLY_ATTRIBUTES = frozenset({"log", "_parent_task_log_q"})
+
+
+class AbsSubtaskRunner(abc.ABC):
+    """Abstract base class for running a subtask."""
+
+    @abc.abstractmethod
+    def run(self, task: speedwagon.tasks.Subtask, log: LogCallback) -> None:
+        """Run the subtask until it is done.
+
+        Args:
+            task: subtask to run. Its results and status are updated in place.
+            log: called with each message the subtask logs.
+        """
+
+
+class ThreadSubtaskRunner(AbsSubtaskRunner):
+    """Run subtasks in the calling thread."""
+
+    def run(self, task: speedwagon.tasks.Subtask, log: LogCallback) -> None:
+        setattr(task, "log", log)
+        task.exec()
+
+
+def _exec_pickled_subtask(
+    pickled_task: bytes,
+    log_queue: queue.Queue[str],
+) -> Tuple[Dict[str, Any], Optional[BaseException]]:
+    # Runs inside the worker process. Log messages are sent back through
+    # the queue as they happen.
+    task: speedwagon.tasks.Subtask = pickle.loads(pickled_task)
+    setattr(task, "log", log_queue.put)
+    error: Optional[BaseException] = None
+    try:
+        task.exec()
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        error = exc
+    state = {
+        key: value
+        for key, value in vars(task).items()
+        if key not in _PARENT_ONLY_ATTRIBUTES
+    }
+    return state, error
+
+
+class ProcessSubtaskRunner(AbsSubtaskRunner):
+    """Run subtasks in a pool of worker processes.
+
+    The subtask is pickled and run by a worker process, keeping CPU heavy
+    work from holding the GIL of the server. Log messages are passed on
+    while it runs, through a queue shared with the worker process. Once
+    done, the results and status of the copy in the worker process are
+    copied back to the original subtask. Subtasks that can't be pickled are
+    run in the calling thread instead.
+    """
+
+    # Seconds between checks for the subtask finishing while waiting for
+    # log messages
+    poll_interval = 0.1
+
+    _manager: Optional[multiprocessing.managers.SyncManager] = None
+    _manager_lock = threading.Lock()
+
+    def __init__(self, executor: concurrent.futures.Executor) -> None:
+        """Create a new runner.
+
+        Args:
+            executor: process pool to run the subtasks with.
+        """
+        self.executor = executor
+        self.fallback = ThreadSubtaskRunner()
+
+    def run(self, task: speedwagon.tasks.Subtask, log: LogCallback) -> None:
+        try:
+            pickled_task = pickle.dumps(task)
+        except (
+            pickle.PicklingError, TypeError, AttributeError
+        ) as pickle_error:
+            logger.debug(
+                "Unable to run %s in a separate process: %s. "
+                "Running in a thread instead.",
+                type(task).__name__,
+                pickle_error,
+            )
+            self.fallback.run(task, log)
+            return
+        log_queue = self._create_log_queue()
+        future = self.executor.submit(
+            _exec_pickled_subtask, pickled_task, log_queue
+        )
+        while not future.done():
+            try:
+                log(log_queue.get(timeout=self.poll_interval))
+            except queue.Empty:
+                continue
+        state, error = future.result()
+        while True:
+            try:
+                log(log_queue.get_nowait())
+            except queue.Empty:
+                break
+        vars(task).update(state)
+        if error is not None:
+            raise error
+
+    @classmethod
+    def _create_log_queue(cls) -> queue.Queue[str]:
+        # A plain multiprocessing queue can't be sent to a worker of a
+        # process pool so use one from a manager process, shared by every
+        # runner.
+        with cls._manager_lock:
+            if cls._manager is None:
+                cls._manager = multiprocessing.Manager()
+            return typing.cast("queue.Queue[str]", cls._manager.Queue())
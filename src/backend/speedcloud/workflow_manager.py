@@ -145,6 +145,14 @@ class AbsWorkflowManager(AbsGenericWorkflowManager[WorkflowIdType], ABC):
 
         raise ValueError(f"Unknown workflow {name}")
 
+    def get_workflow_id_by_name(self, name: str) -> WorkflowIdType:
+        """Locate the id of a workflow by workflow name."""
+        for workflow_id, workflow_ in self.workflows.items():
+            if workflow_.name == name:
+                return workflow_id
+
+        raise ValueError(f"Unknown workflow {name}")
+
 
 class WorkflowManagerIdBaseOnSize(AbsWorkflowManager[int]):
     """Workflow id based on the size of the queue."""
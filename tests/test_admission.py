@@ -0,0 +1,125 @@
+import pytest
+
+from speedcloud.admission import (
+    AdmissionController,
+    AdmissionPolicy,
+    DrainRateMeter,
+    TokenBucket,
+)
+from speedcloud.exceptions import JobAdmissionRejected, JobBatchTooLarge
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock():
+    return FakeClock()
+
+
+def test_token_bucket_refills(clock):
+    bucket = TokenBucket(rate=2, capacity=4, clock=clock)
+    assert bucket.wait_time(4) == 0
+    bucket.take(4)
+    assert bucket.wait_time(1) == 0.5
+    clock.now = 1
+    assert bucket.wait_time(2) == 0
+    clock.now = 10
+    assert bucket.is_full
+
+
+def test_token_bucket_allows_large_request_when_full(clock):
+    bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+    assert bucket.wait_time(5) == 0
+    bucket.take(5)
+    assert bucket.wait_time(1) == 4
+
+
+def test_drain_rate(clock):
+    meter = DrainRateMeter(window=10, clock=clock)
+    assert meter.rate == 0
+    for _ in range(5):
+        meter.record()
+    assert meter.rate == 0.5
+    clock.now = 11
+    assert meter.rate == 0
+
+
+def test_no_limits_admits_everything():
+    AdmissionController(AdmissionPolicy()).admit(
+        {"spam": 1000}, queued=1000, queued_per_workflow={}, client="me"
+    )
+
+
+def test_over_max_queued_retry_after_uses_drain_rate(clock):
+    meter = DrainRateMeter(window=10, clock=clock)
+    for _ in range(10):
+        meter.record()
+    controller = AdmissionController(
+        AdmissionPolicy(max_queued_jobs=5), drain_rate=meter, clock=clock
+    )
+    with pytest.raises(JobAdmissionRejected) as error:
+        controller.admit({"spam": 3}, queued=4, queued_per_workflow={})
+    assert error.value.retry_after == 2
+
+
+def test_over_max_queued_without_drain_uses_idle_retry(clock):
+    controller = AdmissionController(
+        AdmissionPolicy(max_queued_jobs=1, idle_retry_after=30), clock=clock
+    )
+    with pytest.raises(JobAdmissionRejected) as error:
+        controller.admit({"spam": 1}, queued=1, queued_per_workflow={})
+    assert error.value.retry_after == 30
+
+
+def test_over_workflow_limit(clock):
+    controller = AdmissionController(
+        AdmissionPolicy(max_queued_per_workflow={"spam": 2}), clock=clock
+    )
+    controller.admit({"eggs": 5}, queued=2, queued_per_workflow={"spam": 2})
+    with pytest.raises(JobAdmissionRejected):
+        controller.admit(
+            {"spam": 1}, queued=2, queued_per_workflow={"spam": 2}
+        )
+
+
+@pytest.mark.parametrize(
+    "policy",
+    [
+        AdmissionPolicy(max_queued_jobs=2),
+        AdmissionPolicy(max_queued_per_workflow={"spam": 2}),
+    ]
+)
+def test_batch_larger_than_limit(clock, policy):
+    controller = AdmissionController(policy, clock=clock)
+    with pytest.raises(JobBatchTooLarge):
+        controller.admit({"spam": 3}, queued=0, queued_per_workflow={})
+    controller.admit({"spam": 2}, queued=0, queued_per_workflow={})
+
+
+def test_client_rate_is_per_client(clock):
+    controller = AdmissionController(
+        AdmissionPolicy(client_rate=1, client_burst=2), clock=clock
+    )
+    controller.admit({"spam": 2}, 0, {}, client="a")
+    with pytest.raises(JobAdmissionRejected) as error:
+        controller.admit({"spam": 1}, 0, {}, client="a")
+    assert error.value.retry_after == 1
+    controller.admit({"spam": 2}, 0, {}, client="b")
+    clock.now = 1
+    controller.admit({"spam": 1}, 0, {}, client="a")
+
+
+def test_rejected_by_queue_limit_does_not_use_tokens(clock):
+    controller = AdmissionController(
+        AdmissionPolicy(max_queued_jobs=1, client_rate=1, client_burst=1),
+        clock=clock
+    )
+    with pytest.raises(JobAdmissionRejected):
+        controller.admit({"spam": 1}, 1, {}, client="a")
+    controller.admit({"spam": 1}, 0, {}, client="a")
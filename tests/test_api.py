@@ -1,3 +1,4 @@
+import datetime
 import os.path
 from unittest.mock import Mock
 import json
@@ -10,6 +11,7 @@ import speedcloud.config
 import speedcloud.api.storage
 import speedcloud.api.routes
 import speedcloud.api.schema
+import speedcloud.job_manager
 from fastapi.testclient import TestClient
 
 from typing import List, Any, Dict
@@ -31,13 +33,15 @@ def fake_workflows():
     return {'dummy': DummyWorkflow}
 
 @pytest.fixture
-def client(monkeypatch, storage_path, fake_workflows):
-    settings = speedcloud.config.Settings
-
-    settings.whitelisted_workflows = fake_workflows.keys()
+def client(monkeypatch, storage_path, fake_workflows, tmp_path):
+    settings = speedcloud.config.Settings(
+        storage=storage_path,
+        data_path=str(tmp_path),
+        whitelisted_workflows=list(fake_workflows.keys())
+    )
+    speedcloud.config.get_settings.cache_clear()
 
     monkeypatch.setattr(speedcloud.config.os, "makedirs", Mock())
-    settings.storage = storage_path
     monkeypatch.setattr(speedcloud.config, 'find_config_file',
                         lambda *args, **kwargs: "file.toml")
     monkeypatch.setattr(speedcloud.config, 'read_settings_file',
@@ -199,6 +203,121 @@ class TestJobRoutes:
         assert data[0]['order'] == 0
 
 
+    def test_jobs_filtered_by_state(self, client):
+        client.request(
+            'post',
+            '/submitJob',
+            json={"details": {}, "workflow_id": 0}
+        )
+        assert len(client.get('/jobs?state=queued').json()) == 1
+        assert client.get('/jobs?state=success').json() == []
+
+    def test_jobs_summary(self, client):
+        assert client.get('/jobs/summary').json()["total"] == 0
+        client.request(
+            'post',
+            '/submitJob',
+            json={"details": {}, "workflow_id": 0}
+        )
+        summary = client.get('/jobs/summary').json()
+        assert summary["total"] == 1
+        assert sum(summary["states"].values()) == 1
+        assert summary["archived"] == 0
+
+    def test_resume_queued_job_is_refused(self, client):
+        client.request(
+            'post',
+            '/submitJob',
+            json={"details": {}, "workflow_id": 0}
+        )
+        job_id = client.get('/jobs').json()[0]['job_id']
+        response = client.post(f'/jobResume?job_id={job_id}')
+        assert response.status_code == 400
+
+    def test_submit_jobs(self, client, monkeypatch):
+        async def execute_job(*args, **kwargs):
+            return speedcloud.api.schema.JobState.SUCCESS
+
+        monkeypatch.setattr(
+            speedcloud.job_manager.AsyncJobExecutor, 'execute_job', execute_job
+        )
+        response = client.post(
+            '/submitJobs',
+            json=[
+                {"details": {}, "workflow_id": 0},
+                {"details": {}, "workflow_id": 0, "priority": 2},
+            ]
+        )
+        assert response.status_code == 200
+        assert len(response.json()) == 2
+        assert len(client.get('/jobs').json()) == 2
+
+    @pytest.mark.parametrize("uses_input_size, measured", [
+        (False, 0), (True, 2)
+    ])
+    def test_submit_jobs_measures_input_only_if_used(
+        self, client, monkeypatch, uses_input_size, measured
+    ):
+        async def execute_job(*args, **kwargs):
+            return speedcloud.api.schema.JobState.SUCCESS
+
+        monkeypatch.setattr(
+            speedcloud.job_manager.AsyncJobExecutor, 'execute_job', execute_job
+        )
+        measure_input_size = Mock(return_value=10)
+        monkeypatch.setattr(
+            speedcloud.api.routes, "measure_input_size", measure_input_size
+        )
+        monkeypatch.setattr(
+            client.app_state["job_manager"]._container._pending,
+            "uses_input_size",
+            uses_input_size
+        )
+        client.post(
+            '/submitJobs',
+            json=[
+                {"details": {}, "workflow_id": 0},
+                {"details": {}, "workflow_id": 0},
+            ]
+        )
+        assert measure_input_size.call_count == measured
+
+    @pytest.mark.parametrize(
+        "job, status_code",
+        [
+            ({"details": {"spam": "eggs"}, "workflow_id": 0}, 400),
+            ({"details": {}, "workflow_id": 99}, 404),
+        ]
+    )
+    def test_submit_jobs_adds_none_if_any_invalid(
+        self, client, job, status_code
+    ):
+        response = client.post(
+            '/submitJobs',
+            json=[{"details": {}, "workflow_id": 0}, job]
+        )
+        assert response.status_code == status_code
+        assert client.get('/jobs').json() == []
+
+    def test_submit_over_admission_limit(self, client, monkeypatch):
+        job_manager = client.app_state["job_manager"]
+        job_manager._admission.policy.max_queued_jobs = 1
+        monkeypatch.setattr(job_manager, "queue_depth", lambda: 1)
+        response = client.post(
+            '/submitJob', json={"details": {}, "workflow_id": 0}
+        )
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+
+    def test_submit_batch_larger_than_admission_limit(self, client):
+        client.app_state["job_manager"]._admission.policy.max_queued_jobs = 1
+        response = client.post(
+            '/submitJobs', json=[{"details": {}, "workflow_id": 0}] * 2
+        )
+        assert response.status_code == 400
+        assert "Retry-After" not in response.headers
+        assert client.get('/jobs').json() == []
+
     def test_job_info_returns_correct_job(self, client):
         client.request(
             'post',
@@ -212,9 +331,13 @@ class TestJobRoutes:
 
     @pytest.mark.skip(reason="Skip test_jobs_sse for now. Some resource is not getting properly cleaned up here.")
     def test_jobs_sse(self, client, monkeypatch):
-        async def stream_jobs(*args):
-            yield "sample data"
-        monkeypatch.setattr(speedcloud.api.stream, "stream_jobs", stream_jobs)
+        async def stream_job_snapshots(*args):
+            yield speedcloud.api.stream.JobQueueSnapshot(1, '"sample data"')
+        monkeypatch.setattr(
+            speedcloud.api.stream,
+            "stream_job_snapshots",
+            stream_job_snapshots
+        )
         status_stream = client.get('/jobsSSE')
         assert next(status_stream.iter_text()).strip() == 'data: "sample data"'
 
@@ -230,7 +353,7 @@ class TestJobRoutes:
 
         job_id = new_job_data['metadata']['id']
 
-        async def job_progress_packet_generator(job_queue_item, job_runner):
+        async def job_progress_packet_generator(job_queue_item, job_runner, max_update_rate=None):
             yield "sample data"
 
         monkeypatch.setattr(speedcloud.api.stream, "job_progress_packet_generator", job_progress_packet_generator)
@@ -261,6 +384,63 @@ def test_log(client):
     result = client.get(f'/jobLogs?job_id={job_id}').json()
     print(result)
 
+
+def test_log_since_and_limit(client, tmp_path):
+    # makedirs is mocked out by the client fixture
+    (tmp_path / "logs").mkdir()
+    new_job_data = client.request(
+        'post',
+        '/submitJob',
+        json={"details": {}, "workflow_id": 0}
+    ).json()
+    job_id = new_job_data['metadata']['id']
+    job = client.app_state["job_manager"].get_job_queue_item(job_id)
+    job.update_status(
+        {"logs": [{"msg": str(i), "time": float(i)} for i in range(5)]}
+    )
+    result = client.get(f'/jobLogs?job_id={job_id}&since=1&limit=2').json()
+    assert result == [{"msg": "1", "time": 1.0}, {"msg": "2", "time": 2.0}]
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_follow_job_sse_repeated_log_message():
+    item = speedcloud.job_manager.JobQueueItem(
+        job={"details": {}, "workflow": {"id": 1, "name": "spam"}},
+        order=1,
+        time_submitted=datetime.datetime.now(),
+        job_id="833f97a3-b18a-47db-aee5-f41f28d5f650",
+        state=speedcloud.api.schema.JobState.RUNNING,
+    )
+    job_runner = Mock(spec=speedcloud.job_manager.JobRunner)
+    request = Mock(
+        state=Mock(
+            job_manager=Mock(get_job_queue_item=Mock(return_value=item)),
+            job_runner=job_runner
+        )
+    )
+    response = await speedcloud.api.routes.follow_job_sse(
+        request,
+        item.job_id,
+        settings=speedcloud.config.Settings(
+            storage=".", stream_max_update_rate=None
+        )
+    )
+    packets = response.body_iterator
+    await anext(packets)
+    log = speedcloud.job_manager.JobLog(msg="spam", time=1.0)
+
+    next_packet = anext(packets)
+    item.status["logs"].append(log)
+    assert json.loads(await next_packet)["logs"] == [log]
+
+    next_packet = anext(packets)
+    item.status["logs"].append(log)
+    [watcher] = job_runner.add_async_watcher.call_args.args
+    await watcher.notify()
+    assert json.loads(await next_packet)["logs"] == [log]
+    await packets.aclose()
+
+
 class TestAPIJobQueueItem:
     def test_serialize(self):
 
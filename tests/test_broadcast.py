@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from speedcloud.broadcast import BroadcastHub
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_every_subscriber_gets_events():
+    hub = BroadcastHub()
+    first = hub.subscribe()
+    second = hub.subscribe()
+    hub.publish("spam")
+    hub.publish("eggs")
+    assert await first.wait_for_update() == ["spam", "eggs"]
+    assert await second.wait_for_update() == ["spam", "eggs"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_wait_for_update_waits_for_publish():
+    hub = BroadcastHub()
+    subscription = hub.subscribe()
+    waiter = asyncio.create_task(subscription.wait_for_update())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    hub.publish("spam")
+    assert await waiter == ["spam"]
+
+
+def test_slow_subscriber_drops_oldest():
+    hub = BroadcastHub(max_buffer=2)
+    subscription = hub.subscribe()
+    for event in range(5):
+        hub.publish(event)
+    assert subscription.get_nowait() == [3, 4]
+    assert subscription.dropped == 3
+
+
+def test_unsubscribe():
+    hub = BroadcastHub()
+    with hub.subscribe() as subscription:
+        assert len(hub) == 1
+    assert len(hub) == 0
+    hub.publish("spam")
+    assert len(subscription) == 0
+
+
+def test_close_unsubscribes_from_every_hub():
+    first_hub = BroadcastHub()
+    second_hub = BroadcastHub()
+    with first_hub.subscribe() as subscription:
+        second_hub.add(subscription)
+        assert len(first_hub) == len(second_hub) == 1
+    assert len(first_hub) == len(second_hub) == 0
+
+
+def test_subscription_buffer_size():
+    hub = BroadcastHub(max_buffer=10)
+    subscription = hub.subscribe(max_buffer=1)
+    hub.publish("spam")
+    hub.publish("eggs")
+    assert subscription.get_nowait() == ["eggs"]
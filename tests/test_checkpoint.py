@@ -0,0 +1,70 @@
+import speedwagon
+
+from speedcloud.checkpoint import CheckpointStore, JobCheckpoint
+
+
+class DummyTask(speedwagon.tasks.Subtask):
+    def work(self) -> bool:
+        return True
+
+
+def create_result(data):
+    return speedwagon.tasks.Result(DummyTask, data)
+
+
+def test_new_checkpoint_is_empty(tmp_path):
+    checkpoint = JobCheckpoint(str(tmp_path / "job.checkpoint"))
+    assert len(checkpoint) == 0
+    assert checkpoint.start_stage("main", 3) == {}
+
+
+def test_recorded_subtasks_are_loaded(tmp_path):
+    path = str(tmp_path / "job.checkpoint")
+    checkpoint = JobCheckpoint(path)
+    checkpoint.start_stage("pre", 1)
+    checkpoint.record("pre", 0, None)
+    checkpoint.start_stage("main", 3)
+    checkpoint.record("main", 2, create_result("spam"))
+
+    loaded = JobCheckpoint(path)
+    assert len(loaded) == 2
+    assert loaded.start_stage("pre", 1) == {0: None}
+    assert loaded.start_stage("main", 3)[2].data == "spam"
+
+
+def test_stage_with_other_size_starts_over(tmp_path):
+    path = str(tmp_path / "job.checkpoint")
+    checkpoint = JobCheckpoint(path)
+    checkpoint.start_stage("pre", 1)
+    checkpoint.record("pre", 0, create_result("pre"))
+    checkpoint.start_stage("main", 3)
+    checkpoint.record("main", 0, create_result("main"))
+
+    loaded = JobCheckpoint(path)
+    assert loaded.start_stage("pre", 2) == {}
+    assert loaded.start_stage("main", 3) == {}
+    assert len(JobCheckpoint(path)) == 0
+
+
+def test_cut_short_record_is_ignored(tmp_path):
+    path = tmp_path / "job.checkpoint"
+    checkpoint = JobCheckpoint(str(path))
+    checkpoint.start_stage("main", 2)
+    checkpoint.record("main", 0, create_result("spam"))
+    with open(path, "ab") as handle:
+        handle.write(b"\x80\x04\x95")
+
+    loaded = JobCheckpoint(str(path))
+    assert list(loaded.start_stage("main", 2)) == [0]
+    loaded.record("main", 1, create_result("eggs"))
+    assert len(JobCheckpoint(str(path))) == 2
+
+
+def test_store_delete(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints"))
+    checkpoint = store.open("1")
+    checkpoint.start_stage("main", 1)
+    assert (tmp_path / "checkpoints" / "1.checkpoint").exists()
+    store.delete("1")
+    store.delete("1")
+    assert not (tmp_path / "checkpoints" / "1.checkpoint").exists()
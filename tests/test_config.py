@@ -79,6 +79,136 @@ storage_path="someplace"
         assert speedcloud.config.read_settings_file("").storage == "someplace"
 
 
+def test_read_settings_file_scheduler():
+    data = """[main]
+storage_path="someplace"
+
+[scheduler]
+policy = "fair_share_submitter"
+aging = 0.5
+
+[scheduler.weights]
+"10.0.0.1" = 2.0
+    """
+    with patch("speedcloud.config.open", mock_open(read_data=data)):
+        settings = speedcloud.config.read_settings_file("")
+    assert settings.scheduler_policy == "fair_share_submitter"
+    assert settings.scheduler_weights == {"10.0.0.1": 2.0}
+    assert settings.scheduler_aging == 0.5
+
+
+def test_read_settings_file_retention():
+    data = """[main]
+storage_path="someplace"
+data_path="otherplace"
+
+[retention]
+max_finished_jobs = 100
+max_age_seconds = 3600
+max_archived_jobs = 1000
+    """
+    with patch("speedcloud.config.open", mock_open(read_data=data)):
+        settings = speedcloud.config.read_settings_file("")
+    assert settings.data_path == "otherplace"
+    assert settings.retention_max_finished_jobs == 100
+    assert settings.retention_max_age == 3600
+    assert settings.retention_max_total_log_bytes is None
+    assert settings.retention_max_archived_jobs == 1000
+
+
+def test_read_settings_file_runner():
+    data = """[main]
+storage_path="someplace"
+
+[runner]
+workers = 4
+process_workflows = ["Make Checksums"]
+max_concurrent_subtasks = 8
+batch_subtasks = true
+checkpoints = true
+
+[runner.workflow_limits]
+"Zip Packages" = 1
+    """
+    with patch("speedcloud.config.open", mock_open(read_data=data)):
+        settings = speedcloud.config.read_settings_file("")
+    assert settings.runner_workers == 4
+    assert settings.runner_workflow_limits == {"Zip Packages": 1}
+    assert settings.runner_process_workflows == ["Make Checksums"]
+    assert settings.runner_max_concurrent_subtasks == 8
+    assert settings.runner_batch_subtasks is True
+    assert settings.runner_checkpoints is True
+
+
+def test_checkpoints_off_by_default():
+    assert speedcloud.config.Settings(storage="").runner_checkpoints is False
+
+
+def test_read_settings_file_remote_workers():
+    data = """[main]
+storage_path="someplace"
+
+[remote_workers]
+listen = "tcp://0.0.0.0:8765"
+heartbeat_interval = 2
+token = "secret"
+    """
+    with patch("speedcloud.config.open", mock_open(read_data=data)):
+        settings = speedcloud.config.read_settings_file("")
+    assert settings.remote_workers_listen == "tcp://0.0.0.0:8765"
+    assert settings.remote_workers_heartbeat_interval == 2
+    assert settings.remote_workers_lease_timeout is None
+    assert settings.remote_workers_token == "secret"
+
+
+def test_read_settings_file_result_cache():
+    data = """[main]
+storage_path="someplace"
+
+[result_cache]
+enabled = true
+max_entries = 10
+workflows = ["Make Checksums"]
+    """
+    with patch("speedcloud.config.open", mock_open(read_data=data)):
+        settings = speedcloud.config.read_settings_file("")
+    assert settings.result_cache_enabled is True
+    assert settings.result_cache_max_entries == 10
+    assert settings.result_cache_max_bytes is None
+    assert settings.result_cache_workflows == ["Make Checksums"]
+
+
+def test_read_settings_file_admission():
+    data = """[main]
+storage_path="someplace"
+
+[admission]
+max_queued_jobs = 1000
+client_rate = 0.5
+
+[admission.workflow_limits]
+"Zip Packages" = 10
+    """
+    with patch("speedcloud.config.open", mock_open(read_data=data)):
+        settings = speedcloud.config.read_settings_file("")
+    assert settings.admission_max_queued_jobs == 1000
+    assert settings.admission_workflow_limits == {"Zip Packages": 10}
+    assert settings.admission_client_rate == 0.5
+    assert settings.admission_client_burst == 100
+
+
+def test_read_settings_file_streams():
+    data = """[main]
+storage_path="someplace"
+
+[streams]
+max_update_rate = 2.5
+    """
+    with patch("speedcloud.config.open", mock_open(read_data=data)):
+        settings = speedcloud.config.read_settings_file("")
+    assert settings.stream_max_update_rate == 2.5
+
+
 def test_generate_default_config(monkeypatch):
     file_name = "dummy.toml"
     config_generator = Mock(return_value="some data")
@@ -99,6 +229,47 @@ def test_generate_default_toml_config_has_main():
         prompt_for_input=no_op
     )
 
+def test_generate_default_toml_config_has_data_path():
+    def prompt(prompt, required=False):
+        return os.path.join(os.sep, "srv", "files") if required else ''
+    config = speedcloud.config.generate_default_toml_config(
+        prompt_for_input=prompt
+    )
+    with patch("speedcloud.config.open", mock_open(read_data=config)):
+        settings = speedcloud.config.read_settings_file("")
+    assert settings.data_path == os.path.join(os.sep, "srv", "speedcloud-data")
+
+
+def test_default_data_path_next_to_storage(tmp_path):
+    settings = speedcloud.config.Settings(storage=str(tmp_path / "files"))
+    assert speedcloud.config.get_data_path(settings) == \
+        str(tmp_path / "speedcloud-data")
+
+
+def test_temporary_data_path_warns(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(
+        speedcloud.config.tempfile, "gettempdir", lambda: str(tmp_path)
+    )
+    settings = speedcloud.config.Settings(
+        storage=str(tmp_path / "files"),
+        data_path=str(tmp_path / "data")
+    )
+    speedcloud.config.initialize_app_from_settings(settings)
+    assert "temporary directory" in caplog.text
+
+
+def test_read_settings_file_job_store():
+    data = """[main]
+storage_path="someplace"
+
+[job_store]
+enabled = false
+    """
+    with patch("speedcloud.config.open", mock_open(read_data=data)):
+        settings = speedcloud.config.read_settings_file("")
+    assert settings.job_store_enabled is False
+
+
 def test_resolve_settings_calls_only_first_valid():
     first_test = Mock(return_value=speedcloud.config.Settings(storage=''))
     second_test = Mock(return_value=speedcloud.config.Settings(storage=''))
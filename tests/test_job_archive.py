@@ -0,0 +1,123 @@
+import datetime
+import json
+
+import pytest
+
+from speedcloud.api import schema
+from speedcloud.job_archive import JobArchive
+from speedcloud.job_logs import JobLogStore
+from speedcloud.job_manager import JobQueueItem, JobLog
+
+
+@pytest.fixture()
+def archive(tmp_path):
+    return JobArchive(str(tmp_path / "archive"))
+
+
+@pytest.fixture()
+def finished_job():
+    item = JobQueueItem(
+        job={
+            "details": {"Source": "/spam"},
+            "workflow": {'id': 1, "name": "spam"}
+        },
+        order=1,
+        time_submitted=datetime.datetime.now(),
+        job_id='833f97a3-b18a-47db-aee5-f41f28d5f650',
+        state=schema.JobState.SUCCESS,
+        priority=2,
+    )
+    item.status['start_time'] = datetime.datetime.now()
+    item.status['logs'].append(JobLog(msg="spam", time=10.01))
+    item.status['report'] = "done"
+    return item
+
+
+def test_save_and_load(archive, finished_job):
+    archive.save(finished_job)
+    loaded = archive.load(finished_job.job_id)
+    assert loaded == finished_job
+
+
+def test_contains(archive, finished_job):
+    archive.save(finished_job)
+    assert finished_job.job_id in archive
+    assert len(archive) == 1
+
+
+def test_load_missing_is_none(archive):
+    assert archive.load("833f97a3-b18a-47db-aee5-f41f28d5f650") is None
+
+
+def test_load_rejects_paths(archive):
+    assert archive.load("../secret") is None
+
+
+def test_remove(archive, finished_job):
+    archive.save(finished_job)
+    archive.remove(finished_job.job_id)
+    assert finished_job.job_id not in archive
+
+
+def test_len_counts_existing_and_new_jobs(tmp_path, finished_job):
+    JobArchive(str(tmp_path)).save(finished_job)
+    archive = JobArchive(str(tmp_path))
+    assert len(archive) == 1
+    archive.save(finished_job)
+    assert len(archive) == 1
+    archive.remove(finished_job.job_id)
+    archive.remove(finished_job.job_id)
+    assert len(archive) == 0
+
+
+def test_logs_kept_in_log_store(tmp_path, finished_job):
+    log_store = JobLogStore(str(tmp_path / "logs"))
+    finished_job.status["logs"] = log_store.open(
+        finished_job.job_id, finished_job.status["logs"]
+    )
+    archive = JobArchive(str(tmp_path / "archive"), log_store=log_store)
+    archive.save(finished_job)
+    with open(archive._job_file(finished_job.job_id)) as handle:
+        assert "spam" not in json.load(handle)["status"]["logs"]
+    assert archive.load(finished_job.job_id) == finished_job
+    archive.remove(finished_job.job_id)
+    assert finished_job.job_id not in log_store
+
+
+def test_background_writes(tmp_path, finished_job):
+    archive = JobArchive(str(tmp_path), background_writes=True)
+    archive.save(finished_job)
+    assert finished_job.job_id in archive
+    assert archive.load(finished_job.job_id) == finished_job
+    archive.flush()
+    assert JobArchive(str(tmp_path)).load(finished_job.job_id) == \
+        finished_job
+    assert len(archive) == 1
+    archive.close()
+
+
+def test_background_write_skipped_if_removed(tmp_path, finished_job):
+    archive = JobArchive(str(tmp_path), background_writes=True)
+    archive.save(finished_job)
+    archive.remove(finished_job.job_id)
+    archive.flush()
+    assert finished_job.job_id not in archive
+    archive.close()
+
+
+def test_max_jobs_removes_oldest(tmp_path, finished_job):
+    log_store = JobLogStore(str(tmp_path / "logs"))
+    archive = JobArchive(
+        str(tmp_path / "archive"), log_store=log_store, max_jobs=2
+    )
+    job_ids = [f"job{index}" for index in range(3)]
+    for job_id in job_ids:
+        finished_job.job_id = job_id
+        log_store.open(job_id, [JobLog(msg="spam", time=0.0)]).flush()
+        archive.save(finished_job)
+    assert len(archive) == 2
+    assert "job0" not in archive
+    assert "job0" not in log_store
+    assert all(job_id in archive for job_id in job_ids[1:])
+    reopened = JobArchive(str(tmp_path / "archive"), max_jobs=2)
+    assert len(reopened) == 2
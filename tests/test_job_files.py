@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+from speedcloud.job_files import job_file_path
+
+
+def test_job_file_path():
+    assert job_file_path("logs", "spam", ".jsonl") == \
+        os.path.join("logs", "spam.jsonl")
+
+
+@pytest.mark.parametrize("job_id", ["", ".", "..", "../spam", "spam/eggs"])
+def test_job_file_path_rejects_paths(job_id):
+    with pytest.raises(ValueError):
+        job_file_path("logs", job_id, ".jsonl")
@@ -0,0 +1,158 @@
+import pytest
+
+import speedcloud.job_logs
+from speedcloud.job_logs import JobLogs, JobLogStore
+from speedcloud.job_manager import JobLog
+
+
+def make_logs(count, start=0):
+    return [
+        JobLog(msg=f"message {i}", time=float(i))
+        for i in range(start, start + count)
+    ]
+
+
+@pytest.fixture(params=["memory", "file"])
+def job_logs(request, tmp_path):
+    if request.param == "memory":
+        return JobLogs(index_interval=4)
+    return JobLogs(path=str(tmp_path / "job.jsonl"), index_interval=4)
+
+
+class TestJobLogs:
+    def test_append(self, job_logs):
+        job_logs.extend(make_logs(10))
+        job_logs.append(JobLog(msg="last", time=10.0))
+        assert len(job_logs) == 11
+        assert job_logs[0]["msg"] == "message 0"
+        assert job_logs[-1]["msg"] == "last"
+        assert list(job_logs) == make_logs(10) + [
+            JobLog(msg="last", time=10.0)
+        ]
+
+    @pytest.mark.parametrize(
+        "start, limit, expected",
+        [(0, None, (0, 10)), (5, None, (5, 10)), (3, 4, (3, 7)),
+         (9, 5, (9, 10)), (10, None, (10, 10))]
+    )
+    def test_read(self, job_logs, start, limit, expected):
+        job_logs.extend(make_logs(10))
+        assert job_logs.read(start, limit) == make_logs(
+            expected[1] - expected[0], start=expected[0]
+        )
+        assert job_logs[start:None if limit is None else start + limit] \
+            == job_logs.read(start, limit)
+
+    def test_read_raw(self, job_logs):
+        job_logs.extend(make_logs(2))
+        assert job_logs.read_raw(1) == [b'{"msg":"message 1","time":1.0}']
+
+    def test_message_bytes(self, job_logs):
+        job_logs.extend([JobLog(msg="spam", time=1.0)] * 3)
+        assert job_logs.message_bytes == 12
+
+    def test_equal_to_list(self, job_logs):
+        job_logs.extend(make_logs(2))
+        assert job_logs == make_logs(2)
+        assert job_logs != make_logs(3)
+
+
+class TestJobLogsFile:
+    def test_reopened(self, tmp_path):
+        path = str(tmp_path / "job.jsonl")
+        JobLogs(make_logs(10), path=path, index_interval=4)
+        reopened = JobLogs(path=path, index_interval=4)
+        assert len(reopened) == 10
+        assert reopened.read(7) == make_logs(3, start=7)
+        reopened.extend(make_logs(3, start=10))
+        assert reopened.read(9, 2) == make_logs(2, start=9)
+
+    def test_incomplete_last_line_dropped(self, tmp_path):
+        path = tmp_path / "job.jsonl"
+        JobLogs(make_logs(2), path=str(path))
+        with open(path, "ab") as handle:
+            handle.write(b'{"msg":"cut sh')
+        reopened = JobLogs(path=str(path))
+        assert len(reopened) == 2
+        reopened.append(JobLog(msg="after", time=3.0))
+        assert JobLogs(path=str(path))[-1]["msg"] == "after"
+
+
+    def test_reads_older_messages_from_file(self, tmp_path):
+        path = str(tmp_path / "job.jsonl")
+        job_logs = JobLogs(make_logs(10), path=path, index_interval=4,
+                           tail_size=3)
+        assert job_logs.read(2, 3) == make_logs(3, start=2)
+        assert job_logs.read(8) == make_logs(2, start=8)
+
+    def test_reopened_without_decoding_every_line(self, tmp_path,
+                                                  monkeypatch):
+        path = str(tmp_path / "job.jsonl")
+        JobLogs([JobLog(msg="spam", time=1.0)] * 10, path=path)
+        decoded = []
+        loads = speedcloud.job_logs.json.loads
+        monkeypatch.setattr(
+            speedcloud.job_logs.json, "loads",
+            lambda data: decoded.append(data) or loads(data)
+        )
+        reopened = JobLogs(path=path, tail_size=2)
+        assert len(decoded) == 2
+        assert len(reopened) == 10
+        assert reopened.message_bytes == 40
+
+    def test_writer_writes_later(self, tmp_path):
+        path = tmp_path / "job.jsonl"
+        scheduled = []
+        job_logs = JobLogs(path=str(path), writer=scheduled.append)
+        job_logs.extend(make_logs(2))
+        job_logs.append(JobLog(msg="last", time=2.0))
+        assert scheduled == [job_logs]
+        assert not path.exists()
+        assert job_logs.read(1) == make_logs(1, start=1) + [
+            JobLog(msg="last", time=2.0)
+        ]
+        job_logs.flush()
+        assert len(JobLogs(path=str(path))) == 3
+
+
+class TestJobLogStore:
+    def test_open_existing(self, tmp_path):
+        store = JobLogStore(str(tmp_path / "logs"))
+        store.open("spam").extend(make_logs(3))
+        assert "spam" in store
+        assert len(store.open("spam", make_logs(1))) == 3
+
+    def test_open_new_with_logs(self, tmp_path):
+        store = JobLogStore(str(tmp_path / "logs"))
+        assert store.open("spam", make_logs(2)) == make_logs(2)
+
+    def test_delete(self, tmp_path):
+        store = JobLogStore(str(tmp_path / "logs"))
+        store.open("spam")
+        store.delete("spam")
+        store.delete("spam")
+        assert "spam" not in store
+
+    def test_written_in_background(self, tmp_path):
+        store = JobLogStore(str(tmp_path / "logs"))
+        store.open("spam").extend(make_logs(3))
+        store.flush()
+        assert JobLogs(path=str(tmp_path / "logs" / "spam.jsonl")) == \
+            make_logs(3)
+        store.close()
+
+    def test_delete_discards_unwritten(self, tmp_path, monkeypatch):
+        store = JobLogStore(str(tmp_path / "logs"))
+        pending = []
+        monkeypatch.setattr(store, "_schedule_write", pending.append)
+        store.open("spam").extend(make_logs(3))
+        store.delete("spam")
+        [job_logs] = pending
+        job_logs.flush()
+        assert "spam" not in store
+
+    def test_rejects_paths(self, tmp_path):
+        store = JobLogStore(str(tmp_path / "logs"))
+        with pytest.raises(ValueError):
+            store.open("../secret")
+        assert "../secret" not in store
@@ -1,12 +1,24 @@
 import asyncio
+import datetime
 import logging
+import threading
+import time
 from typing import List, Any, Dict, Optional, Mapping
 from unittest.mock import Mock, AsyncMock, MagicMock, ANY, call
 
 import speedwagon
 from speedwagon.tasks import TaskBuilder, Result
 
+import speedcloud.exceptions
+import speedcloud.job_archive
+import speedcloud.job_logs
+import speedcloud.admission
+import speedcloud.checkpoint
 import speedcloud.job_manager
+import speedcloud.result_cache
+import speedcloud.runtime_history
+import speedcloud.scheduler
+import speedcloud.subtask_runner
 import speedcloud.workflow_manager
 from speedcloud.api import schema
 import pytest
@@ -31,6 +43,137 @@ class TestJobManager:
         await job_manager.add_job(Mock(id=1, name="dummy"), details={})
         dummy_watcher.notify.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_add_jobs_notifies_once(self, job_manager):
+        dummy_watcher = AsyncMock()
+        job_manager.add_async_watcher(dummy_watcher)
+        items = await job_manager.add_jobs(
+            [
+                speedcloud.job_manager.NewJob(
+                    Mock(id=1, name="dummy"), details={"index": i}
+                )
+                for i in range(3)
+            ]
+        )
+        dummy_watcher.notify.assert_called_once()
+        assert [item.job["details"]["index"] for item in items] == [0, 1, 2]
+        assert job_manager.job_queue() == items
+        assert [item.order for item in items] == [0, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_add_jobs_over_admission_limit_adds_none(self, queue):
+        job_manager = speedcloud.job_manager.JobManager(
+            queue,
+            admission=speedcloud.admission.AdmissionPolicy(max_queued_jobs=2)
+        )
+        await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        with pytest.raises(speedcloud.exceptions.JobAdmissionRejected):
+            await job_manager.add_jobs(
+                [
+                    speedcloud.job_manager.NewJob(
+                        Mock(id=1, name="dummy"), details={}
+                    )
+                    for _ in range(2)
+                ]
+            )
+        assert job_manager.queue_depth() == 1
+
+    @pytest.mark.asyncio
+    async def test_jobs_leaving_queue_count_towards_drain_rate(
+        self, job_manager
+    ):
+        item = await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        assert job_manager.drain_rate.rate == 0
+        item.state = schema.JobState.RUNNING
+        assert job_manager.drain_rate.rate > 0
+
+    @pytest.mark.asyncio
+    async def test_successful_jobs_recorded_in_runtime_history(self, queue):
+        history = speedcloud.runtime_history.RuntimeHistory()
+        job_manager = speedcloud.job_manager.JobManager(
+            queue, runtime_history=history
+        )
+        item = await job_manager.add_job(
+            speedcloud.workflow_manager.WorkflowData(1, "dummy"),
+            details={},
+            input_size=100,
+        )
+        item.state = schema.JobState.RUNNING
+        item.update_status(
+            {
+                "start_time": datetime.datetime.now()
+                - datetime.timedelta(seconds=30),
+                "subtask_count": 4,
+            }
+        )
+        item.state = schema.JobState.SUCCESS
+        [runtime] = history.runtimes("dummy")
+        assert runtime.duration >= 30
+        assert runtime.subtask_count == 4
+        assert runtime.input_size == 100
+
+    @pytest.mark.asyncio
+    async def test_cached_results_not_recorded_in_runtime_history(
+        self, queue
+    ):
+        history = speedcloud.runtime_history.RuntimeHistory()
+        job_manager = speedcloud.job_manager.JobManager(
+            queue, runtime_history=history
+        )
+        item = await job_manager.add_job(
+            speedcloud.workflow_manager.WorkflowData(1, "dummy"),
+            details={},
+        )
+        speedcloud.job_manager.JobRunner._use_cached_result(
+            item,
+            speedcloud.result_cache.CachedResult(report=None, logs=[])
+        )
+        assert item.state == schema.JobState.SUCCESS
+        assert "dummy" not in history
+
+    @pytest.mark.asyncio
+    async def test_estimate_start_times(self, queue):
+        history = speedcloud.runtime_history.RuntimeHistory()
+        history.record(
+            "dummy", speedcloud.runtime_history.JobRuntime(duration=60)
+        )
+        job_manager = speedcloud.job_manager.JobManager(
+            queue, runtime_history=history
+        )
+        workflow = speedcloud.workflow_manager.WorkflowData(1, "dummy")
+        running = await job_manager.add_job(workflow, details={})
+        running.state = schema.JobState.RUNNING
+        running.update_status({"progress": 50.0})
+        first = await job_manager.add_job(workflow, details={})
+        second = await job_manager.add_job(workflow, details={})
+
+        before = datetime.datetime.now()
+        estimates = job_manager.estimate_start_times(workers=2)
+        assert set(estimates) == {first.job_id, second.job_id}
+        assert estimates[first.job_id] - before < datetime.timedelta(
+            seconds=1
+        )
+        assert datetime.timedelta(seconds=29) < (
+            estimates[second.job_id] - before
+        ) < datetime.timedelta(seconds=31)
+
+    @pytest.mark.asyncio
+    async def test_logs_saved_to_log_store(self, queue, tmp_path):
+        log_store = speedcloud.job_logs.JobLogStore(str(tmp_path))
+        store = Mock(load=Mock(return_value=[]))
+        job_manager = speedcloud.job_manager.JobManager(
+            queue, store=store, log_store=log_store
+        )
+        item = await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        item.update_status({"logs": [{"msg": "spam", "time": 1.0}]})
+        assert log_store.open(item.job_id) == [{"msg": "spam", "time": 1.0}]
+        store.append_logs.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_estimate_start_times_without_history(self, job_manager):
+        await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        assert job_manager.estimate_start_times() == {}
+
     @pytest.mark.asyncio
     async def test_add(self, job_manager):
         new_job = Mock(id=1, name="dummy")
@@ -62,6 +205,177 @@ class TestJobManager:
         job_manager.set_job_state(job_id=created_job_item.job_id, state=schema.JobState.RUNNING)
         assert (job_manager.get_job_queue_item(job_id=created_job_item.job_id)).state == schema.JobState.RUNNING
 
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_produce_sends_jobs_to_queue(self, job_manager, queue):
+        first = await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        second = await job_manager.add_job(
+            Mock(id=1, name="dummy"),
+            details={}
+        )
+        job_manager.stop.set()
+        await job_manager.produce()
+        assert [queue.get_nowait(), queue.get_nowait()] == [first, second]
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_produce_wakes_up_for_new_jobs(self, job_manager, queue):
+        producer = asyncio.create_task(job_manager.produce())
+        await asyncio.sleep(0)
+        item = await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        assert await queue.get() is item
+        job_manager.shutdown()
+        await producer
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_shutdown_stops_idle_producer(self, job_manager):
+        producer = asyncio.create_task(job_manager.produce())
+        await asyncio.sleep(0)
+        job_manager.shutdown()
+        await producer
+        assert producer.done()
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_idle_producer_evicts_old_jobs(self, queue):
+        job_manager = speedcloud.job_manager.JobManager(
+            queue,
+            retention=speedcloud.job_manager.RetentionPolicy(
+                max_age=0.05, check_interval=0.01
+            )
+        )
+        item = await job_manager.add_job(
+            Mock(id=1, name="dummy"), details={}
+        )
+        producer = asyncio.create_task(job_manager.produce())
+        assert await queue.get() is item
+        item.state = schema.JobState.SUCCESS
+        assert item.job_id in job_manager._container
+        await asyncio.sleep(0.2)
+        assert item.job_id not in job_manager._container
+        job_manager.shutdown()
+        await producer
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_idle_producer_does_not_notify(self, job_manager):
+        watcher = AsyncMock()
+        job_manager.add_async_watcher(watcher)
+        producer = asyncio.create_task(job_manager.produce())
+        for _ in range(10):
+            await asyncio.sleep(0)
+        job_manager.shutdown()
+        await producer
+        watcher.notify.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_reprioritize(self, queue):
+        job_manager = speedcloud.job_manager.JobManager(
+            queue,
+            scheduler=speedcloud.scheduler.PriorityScheduler()
+        )
+        await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        second = await job_manager.add_job(
+            Mock(id=1, name="dummy"),
+            details={}
+        )
+        await job_manager.reprioritize(second.job_id, 1)
+        job_manager.stop.set()
+        await job_manager.produce()
+        assert queue.get_nowait() is second
+
+    @pytest.mark.asyncio
+    async def test_reprioritize_dispatched_job_raises(self, job_manager):
+        item = await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        job_manager.stop.set()
+        await job_manager.produce()
+        with pytest.raises(speedcloud.exceptions.JobNotQueued):
+            await job_manager.reprioritize(item.job_id, 1)
+
+    @pytest.mark.asyncio
+    async def test_workflow_limit_defers_jobs(self, queue):
+        job_manager = speedcloud.job_manager.JobManager(
+            queue,
+            workflow_limits={"slow": 1}
+        )
+        slow_workflow = Mock(id=1)
+        slow_workflow.name = "slow"
+        fast_workflow = Mock(id=2)
+        fast_workflow.name = "fast"
+        first = await job_manager.add_job(slow_workflow, details={})
+        second = await job_manager.add_job(slow_workflow, details={})
+        other = await job_manager.add_job(fast_workflow, details={})
+        job_manager.stop.set()
+        await job_manager.produce()
+        assert [queue.get_nowait(), queue.get_nowait()] == [first, other]
+        assert queue.empty()
+
+        first.state = schema.JobState.SUCCESS
+        await job_manager.produce()
+        assert queue.get_nowait() is second
+
+    @pytest.mark.asyncio
+    async def test_workflow_limit_skips_aborted_deferred_jobs(self, queue):
+        job_manager = speedcloud.job_manager.JobManager(
+            queue,
+            workflow_limits={"slow": 1}
+        )
+        workflow = Mock(id=1)
+        workflow.name = "slow"
+        first = await job_manager.add_job(workflow, details={})
+        second = await job_manager.add_job(workflow, details={})
+        third = await job_manager.add_job(workflow, details={})
+        job_manager.stop.set()
+        await job_manager.produce()
+        assert queue.get_nowait() is first
+        second.state = schema.JobState.ABORTED
+        first.state = schema.JobState.FAILED
+        await job_manager.produce()
+        assert queue.get_nowait() is third
+        assert queue.empty()
+
+    @pytest.mark.asyncio
+    async def test_requeue_dispatches_job_again(self, job_manager, queue):
+        item = await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        job_manager.stop.set()
+        await job_manager.produce()
+        assert queue.get_nowait() is item
+        item.state = schema.JobState.RUNNING
+        await job_manager.requeue(item.job_id)
+        assert item.state == schema.JobState.QUEUED
+        await job_manager.produce()
+        assert queue.get_nowait() is item
+
+    @pytest.mark.asyncio
+    async def test_requeue_stopping_job_aborts_it(self, job_manager):
+        item = await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        item.state = schema.JobState.STOPPING
+        await job_manager.requeue(item.job_id)
+        assert item.state == schema.JobState.ABORTED
+
+    @pytest.mark.asyncio
+    async def test_resume_queues_stopped_job(self, job_manager, queue):
+        item = await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        job_manager.stop.set()
+        await job_manager.produce()
+        assert queue.get_nowait() is item
+        item.state = schema.JobState.ABORTED
+        await job_manager.resume(item.job_id)
+        assert item.state == schema.JobState.QUEUED
+        await job_manager.produce()
+        assert queue.get_nowait() is item
+
+    @pytest.mark.parametrize(
+        "state", [schema.JobState.RUNNING, schema.JobState.SUCCESS]
+    )
+    @pytest.mark.asyncio
+    async def test_resume_unstopped_job_raises(self, job_manager, state):
+        item = await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        item.state = state
+        with pytest.raises(speedcloud.exceptions.JobNotResumable):
+            await job_manager.resume(item.job_id)
+
     @pytest.mark.parametrize(
         "status, expected",
         [
@@ -120,12 +434,36 @@ class TestJobRunner:
         await job_runner.consume()
         assert dummy.state == schema.JobState.SUCCESS
 
+    @pytest.mark.asyncio
+    async def test_consume_skips_job_aborted_after_handoff(
+        self, job_runner, queue, monkeypatch
+    ):
+        dummy = Mock(
+            spec=speedcloud.job_manager.JobQueueItem,
+            job_id="1",
+            status=speedcloud.job_manager.JobStatus(),
+            state=schema.JobState.QUEUED,
+            job=schema.JobQueueJobDetails(
+                details=MagicMock(),
+                workflow=schema.JobWorkflow(id=1, name='foo')
+            )
+        )
+        execute_job = AsyncMock(return_value=schema.JobState.SUCCESS)
+        monkeypatch.setattr(job_runner.executor, "execute_job", execute_job)
+        await queue.put(dummy)
+        dummy.state = schema.JobState.ABORTED
+        await queue.put(None)
+        await job_runner.consume()
+        execute_job.assert_not_called()
+        assert dummy.state == schema.JobState.ABORTED
+
     @pytest.mark.asyncio
     async def test_notify(self, job_runner, queue):
         dummy = Mock(
             spec=speedcloud.job_manager.JobQueueItem,
             job_id="1",
             status=speedcloud.job_manager.JobStatus(),
+            state=schema.JobState.QUEUED,
             job=schema.JobQueueJobDetails(
                 details=MagicMock(),
                 workflow=schema.JobWorkflow(id=1, name='foo')
@@ -139,6 +477,240 @@ class TestJobRunner:
         watcher.notify.assert_called()
 
 
+    @pytest.mark.asyncio
+    async def test_consume_reuses_cached_results(
+        self, queue, monkeypatch, tmp_path
+    ):
+        (tmp_path / "source.txt").write_text("spam")
+        workflow_manager = Mock(
+            spec_set=speedcloud.workflow_manager.AbsWorkflowManager,
+            get_workflow_info_by_id=Mock(
+                return_value={
+                    "parameters": [
+                        {"label": "Source", "widget_type": "FileSelect"}
+                    ]
+                }
+            )
+        )
+        runner = speedcloud.job_manager.JobRunner(
+            queue,
+            storage_root=str(tmp_path),
+            workflow_manager=workflow_manager,
+            result_cache=speedcloud.result_cache.ResultCache(max_logs=1),
+        )
+
+        async def execute_job():
+            runner._current_job.update_status(
+                {
+                    "report": "all done",
+                    "logs": [
+                        speedcloud.job_manager.JobLog(msg=msg, time=1.0)
+                        for msg in ["first", "last"]
+                    ],
+                }
+            )
+            return schema.JobState.SUCCESS
+
+        execute = AsyncMock(side_effect=execute_job)
+        monkeypatch.setattr(runner.executor, "execute_job", execute)
+
+        def create_job(job_id):
+            return speedcloud.job_manager.JobQueueItem(
+                job=schema.JobQueueJobDetails(
+                    details={"Source": "/source.txt"},
+                    workflow=schema.JobWorkflow(id=1, name="foo")
+                ),
+                state=schema.JobState.QUEUED,
+                order=int(job_id),
+                job_id=job_id,
+                time_submitted=datetime.datetime.now(),
+            )
+
+        jobs = [create_job("1"), create_job("2")]
+        for job in jobs:
+            await queue.put(job)
+        await queue.put(None)
+        await runner.consume()
+        execute.assert_awaited_once()
+        assert jobs[1].state == schema.JobState.SUCCESS
+        assert jobs[1].status["report"] == "all done"
+        assert jobs[1].status["progress"] == 100
+        assert jobs[1].from_cache and not jobs[0].from_cache
+        assert [log["msg"] for log in jobs[1].status["logs"]][0] == "last"
+        assert len(jobs[1].status["logs"]) == 2
+
+    @pytest.mark.asyncio
+    async def test_consume_reruns_when_input_changes(
+        self, queue, monkeypatch, tmp_path
+    ):
+        source = tmp_path / "source.txt"
+        source.write_text("spam")
+        workflow_manager = Mock(
+            spec_set=speedcloud.workflow_manager.AbsWorkflowManager,
+            get_workflow_info_by_id=Mock(
+                return_value={
+                    "parameters": [
+                        {"label": "Source", "widget_type": "FileSelect"}
+                    ]
+                }
+            )
+        )
+        runner = speedcloud.job_manager.JobRunner(
+            queue,
+            storage_root=str(tmp_path),
+            workflow_manager=workflow_manager,
+            result_cache=speedcloud.result_cache.ResultCache(),
+        )
+        execute = AsyncMock(return_value=schema.JobState.SUCCESS)
+        monkeypatch.setattr(runner.executor, "execute_job", execute)
+
+        def create_job(job_id):
+            return speedcloud.job_manager.JobQueueItem(
+                job=schema.JobQueueJobDetails(
+                    details={"Source": "/source.txt"},
+                    workflow=schema.JobWorkflow(id=1, name="foo")
+                ),
+                state=schema.JobState.QUEUED,
+                order=int(job_id),
+                job_id=job_id,
+                time_submitted=datetime.datetime.now(),
+            )
+
+        await queue.put(create_job("1"))
+        await queue.put(None)
+        await runner.consume()
+        source.write_text("spam and eggs")
+        await queue.put(create_job("2"))
+        await queue.put(None)
+        await runner.consume()
+        assert execute.await_count == 2
+
+    @pytest.mark.parametrize(
+        "workflow_name, expected_type",
+        [
+            ("heavy", speedcloud.subtask_runner.ProcessSubtaskRunner),
+            ("light", type(None)),
+        ]
+    )
+    def test_get_subtask_runner_by_workflow(
+        self, queue, workflow_name, expected_type
+    ):
+        runner = speedcloud.job_manager.JobRunner(
+            queue,
+            storage_root='.',
+            process_pool=Mock(),
+            process_workflows=["heavy"]
+        )
+        job = Mock(
+            spec=speedcloud.job_manager.JobQueueItem,
+            job=schema.JobQueueJobDetails(
+                details={},
+                workflow=schema.JobWorkflow(id=1, name=workflow_name)
+            )
+        )
+        assert isinstance(runner.get_subtask_runner(job), expected_type)
+
+
+class TestJobRunnerPool:
+
+    @pytest.fixture()
+    def queue(self):
+        return asyncio.Queue()
+
+    @pytest.fixture()
+    def workflow_manager(self):
+        return Mock(
+            spec_set=speedcloud.workflow_manager.AbsWorkflowManager,
+            get_workflow_info_by_id=Mock(return_value={"parameters": []})
+        )
+
+    @staticmethod
+    def create_job(job_id):
+        return Mock(
+            spec=speedcloud.job_manager.JobQueueItem,
+            job_id=job_id,
+            status=speedcloud.job_manager.JobStatus(),
+            state=schema.JobState.QUEUED,
+            job=schema.JobQueueJobDetails(
+                details=MagicMock(),
+                workflow=schema.JobWorkflow(id=1, name='foo')
+            )
+        )
+
+    def test_needs_workers(self, queue, workflow_manager):
+        with pytest.raises(ValueError):
+            speedcloud.job_manager.JobRunnerPool(
+                queue, ".", workflow_manager, workers=0
+            )
+
+    def test_each_runner_has_own_executor(self, queue, workflow_manager):
+        pool = speedcloud.job_manager.JobRunnerPool(
+            queue, ".", workflow_manager, workers=3
+        )
+        assert len({id(runner.executor) for runner in pool.runners}) == 3
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_runs_jobs_at_the_same_time(
+        self, queue, workflow_manager, monkeypatch
+    ):
+        pool = speedcloud.job_manager.JobRunnerPool(
+            queue, ".", workflow_manager, workers=2
+        )
+        started = asyncio.Event()
+        running = []
+
+        async def execute_job():
+            running.append(True)
+            if len(running) == 2:
+                started.set()
+            await started.wait()
+            return schema.JobState.SUCCESS
+
+        for runner in pool.runners:
+            monkeypatch.setattr(runner.executor, "execute_job", execute_job)
+        jobs = [self.create_job("1"), self.create_job("2")]
+        for job in jobs:
+            await queue.put(job)
+        await queue.put(None)
+        await queue.put(None)
+        await pool.consume()
+        assert all(job.state == schema.JobState.SUCCESS for job in jobs)
+
+    def test_abort_routes_to_runner_with_job(self, queue, workflow_manager):
+        pool = speedcloud.job_manager.JobRunnerPool(
+            queue, ".", workflow_manager, workers=2
+        )
+        runner = pool.runners[1]
+        runner._current_job = self.create_job("2")
+        runner.executor = Mock()
+        pool.abort("2")
+        runner.executor.abort_current_job.assert_called_once()
+
+    def test_closed_watcher_removed_from_every_runner(
+        self, queue, workflow_manager
+    ):
+        pool = speedcloud.job_manager.JobRunnerPool(
+            queue, ".", workflow_manager, workers=2
+        )
+        with speedcloud.job_manager.AsyncEventNotifier() as notifier:
+            pool.add_async_watcher(notifier)
+            assert all(
+                len(runner._notification_manager) == 1
+                for runner in pool.runners
+            )
+        assert all(
+            len(runner._notification_manager) == 0 for runner in pool.runners
+        )
+
+    def test_abort_job_not_running_raises(self, queue, workflow_manager):
+        pool = speedcloud.job_manager.JobRunnerPool(
+            queue, ".", workflow_manager, workers=2
+        )
+        with pytest.raises(speedcloud.exceptions.JobAlreadyAborted):
+            pool.abort("1")
+
+
 @pytest.mark.asyncio
 @pytest.mark.timeout(5)
 async def test_notify_lifts_the_lock_wait_for_update():
@@ -148,6 +720,32 @@ async def test_notify_lifts_the_lock_wait_for_update():
     await waiter
 
 
+class TestNotificationManager:
+    @pytest.mark.asyncio
+    async def test_remove_watcher(self):
+        manager = speedcloud.job_manager.NotificationManager()
+        notifier = speedcloud.job_manager.AsyncEventNotifier()
+        other = AsyncMock()
+        manager.add_async_watcher(notifier)
+        manager.add_async_watcher(other)
+        assert len(manager) == 2
+        manager.remove_async_watcher(notifier)
+        manager.remove_async_watcher(other)
+        assert len(manager) == 0
+        await manager.notify_async()
+        other.notify.assert_not_called()
+        assert len(notifier) == 0
+
+    @pytest.mark.asyncio
+    async def test_notifications_combined(self):
+        manager = speedcloud.job_manager.NotificationManager()
+        notifier = speedcloud.job_manager.AsyncEventNotifier()
+        manager.add_async_watcher(notifier)
+        for _ in range(3):
+            await manager.notify_async()
+        assert len(notifier) == 1
+
+
 class TestEmitToAsyncCallback:
     @pytest.mark.asyncio
     async def test_notifies_watcher(self):
@@ -170,6 +768,44 @@ class TestEmitToAsyncCallback:
         my_logger.info('spam')
         assert watcher.called is False
 
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_records_from_threads_batched(self):
+        watcher = AsyncMock()
+        handler = speedcloud.job_manager.EmitToAsyncCallback(
+            flush_interval=0.01
+        )
+        handler.add_async_watcher(watcher)
+        my_logger = logging.Logger("tester")
+        my_logger.addHandler(handler)
+
+        def log_messages():
+            for i in range(5):
+                my_logger.info(str(i))
+
+        await asyncio.to_thread(log_messages)
+        while not watcher.await_count:
+            await asyncio.sleep(0.01)
+        watcher.assert_awaited_once_with(
+            [{'msg': str(i), 'time': ANY} for i in range(5)]
+        )
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_full_batch_sent_without_waiting(self):
+        watcher = AsyncMock()
+        handler = speedcloud.job_manager.EmitToAsyncCallback(
+            flush_interval=60, max_batch=3
+        )
+        handler.add_async_watcher(watcher)
+        my_logger = logging.Logger("tester")
+        my_logger.addHandler(handler)
+        for i in range(3):
+            my_logger.info(str(i))
+        while not watcher.await_count:
+            await asyncio.sleep(0.01)
+        assert len(watcher.await_args.args[0]) == 3
+
 
 class TestAsyncJobExecutor:
 
@@ -279,19 +915,605 @@ class TestAsyncJobExecutor:
         with pytest.raises(ValueError):
             await job_executor.execute_job()
 
+class TestParallelSubtasks:
+
+    class SlowTask(speedwagon.tasks.Subtask):
+        lock = threading.Lock()
+        running = 0
+        most_running = 0
+
+        def __init__(self, index: int, delay: float) -> None:
+            super().__init__()
+            self.index = index
+            self.delay = delay
+
+        def work(self) -> bool:
+            cls = type(self)
+            with cls.lock:
+                cls.running += 1
+                cls.most_running = max(cls.most_running, cls.running)
+            time.sleep(self.delay)
+            with cls.lock:
+                cls.running -= 1
+            self.set_results(self.index)
+            return True
+
+    class ReportTask(speedwagon.tasks.Subtask):
+        def __init__(self, indexes: List[int]) -> None:
+            super().__init__()
+            self.indexes = indexes
+
+        def work(self) -> bool:
+            self.set_results(self.indexes)
+            return True
+
+    class SlowWorkflow(speedwagon.Workflow):
+        name = "slow"
+
+        def discover_task_metadata(
+            self, initial_results, additional_data, user_args
+        ) -> List[dict]:
+            # The first task is the slowest so they finish out of order
+            return [
+                {"index": i, "delay": 0.02 * (4 - i)} for i in range(4)
+            ]
+
+        def create_new_task(self, task_builder: TaskBuilder, job_args):
+            task_builder.add_subtask(
+                TestParallelSubtasks.SlowTask(
+                    job_args["index"], job_args["delay"]
+                )
+            )
+
+        def completion_task(self, task_builder, results, user_args):
+            task_builder.add_subtask(
+                TestParallelSubtasks.ReportTask(
+                    [result.data for result in results]
+                )
+            )
+
+        @classmethod
+        def generate_report(cls, results, user_args) -> Optional[str]:
+            return f"{[result.data for result in results]}"
+
+    @pytest.fixture(autouse=True)
+    def reset_counters(self):
+        self.SlowTask.running = 0
+        self.SlowTask.most_running = 0
+
+    def test_needs_at_least_one(self):
+        with pytest.raises(ValueError):
+            speedcloud.job_manager.AsyncJobExecutor(
+                '.', max_concurrent_subtasks=0
+            )
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_runs_main_tasks_at_the_same_time(self):
+        executor = speedcloud.job_manager.AsyncJobExecutor(
+            '.', max_concurrent_subtasks=2
+        )
+        executor.load_job(self.SlowWorkflow, {})
+        assert await executor.execute_job() == schema.JobState.SUCCESS
+        assert self.SlowTask.most_running == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_results_keep_the_order_created(self):
+        executor = speedcloud.job_manager.AsyncJobExecutor(
+            '.', max_concurrent_subtasks=4
+        )
+        status_changes = []
+        executor.add_on_job_status_change_callback(status_changes.append)
+        executor.load_job(self.SlowWorkflow, {})
+        await executor.execute_job()
+        reports = [
+            status["report"] for status in status_changes if "report" in status
+        ]
+        assert reports == ["[0, 1, 2, 3, [0, 1, 2, 3]]"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_progress_reaches_100(self):
+        executor = speedcloud.job_manager.AsyncJobExecutor(
+            '.', max_concurrent_subtasks=3
+        )
+        progress = []
+        executor.add_on_job_status_change_callback(
+            lambda status: progress.append(status.get("progress"))
+        )
+        executor.load_job(self.SlowWorkflow, {})
+        await executor.execute_job()
+        reported = [value for value in progress if value is not None]
+        assert reported == sorted(reported)
+        assert reported[-1] == 100
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_status_updated_from_the_event_loop(self):
+        executor = speedcloud.job_manager.AsyncJobExecutor(
+            '.', max_concurrent_subtasks=4
+        )
+        threads = set()
+        executor.add_on_job_status_change_callback(
+            lambda _: threads.add(threading.get_ident())
+        )
+        executor.load_job(self.SlowWorkflow, {})
+        await executor.execute_job()
+        assert threads == {threading.get_ident()}
+
+    def test_same_results_as_sequential(self):
+        sequential = speedcloud.job_manager.TaskGenerator(
+            self.SlowWorkflow(), {}
+        )
+        for task in sequential:
+            task.exec()
+        parallel = speedcloud.job_manager.ParallelTaskGenerator(
+            self.SlowWorkflow(), {}
+        )
+        for task in parallel:
+            task.exec()
+        assert [result.data for result in parallel.results()] == [
+            result.data for result in sequential.results()
+        ]
+        assert parallel.percent_completed() == \
+            sequential.percent_completed()
+
+
+class TestCheckpoints:
+
+    class CountedTask(speedwagon.tasks.Subtask):
+        ran: List[int] = []
+        fail_on: Optional[int] = None
+
+        def __init__(self, index: int) -> None:
+            super().__init__()
+            self.index = index
+
+        def work(self) -> bool:
+            if self.index == type(self).fail_on:
+                raise RuntimeError("Something went wrong")
+            type(self).ran.append(self.index)
+            self.set_results(self.index)
+            return True
+
+    class CountedWorkflow(speedwagon.Workflow):
+        name = "counted"
+
+        def discover_task_metadata(
+            self, initial_results, additional_data, user_args
+        ) -> List[dict]:
+            return [{"index": i} for i in range(4)]
+
+        def create_new_task(self, task_builder: TaskBuilder, job_args):
+            task_builder.add_subtask(
+                TestCheckpoints.CountedTask(job_args["index"])
+            )
+
+        @classmethod
+        def generate_report(cls, results, user_args) -> Optional[str]:
+            return f"{[result.data for result in results]}"
+
+    @pytest.fixture(autouse=True)
+    def reset_tasks(self):
+        self.CountedTask.ran = []
+        self.CountedTask.fail_on = None
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_resume_skips_finished_subtasks(self, tmp_path):
+        store = speedcloud.checkpoint.CheckpointStore(str(tmp_path))
+        executor = speedcloud.job_manager.AsyncJobExecutor('.')
+        self.CountedTask.fail_on = 2
+        executor.load_job(self.CountedWorkflow, {}, checkpoint=store.open("1"))
+        with pytest.raises(RuntimeError):
+            await executor.execute_job()
+        assert self.CountedTask.ran == [0, 1]
+
+        self.CountedTask.fail_on = None
+        self.CountedTask.ran = []
+        report = []
+        executor.add_on_job_status_change_callback(
+            lambda status: report.append(status.get("report"))
+        )
+        executor.load_job(self.CountedWorkflow, {}, checkpoint=store.open("1"))
+        assert await executor.execute_job() == schema.JobState.SUCCESS
+        assert self.CountedTask.ran == [2, 3]
+        assert "[0, 1, 2, 3]" in report
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_runner_deletes_checkpoint_of_successful_job(
+        self, tmp_path
+    ):
+        queue = asyncio.Queue()
+        store = speedcloud.checkpoint.CheckpointStore(str(tmp_path))
+        workflow_manager = Mock(
+            spec_set=speedcloud.workflow_manager.AbsWorkflowManager,
+            get_workflow_info_by_id=Mock(return_value={"parameters": []}),
+            get_workflow_type_by_id=Mock(return_value=self.CountedWorkflow),
+        )
+        runner = speedcloud.job_manager.JobRunner(
+            queue, ".", workflow_manager, checkpoints=store
+        )
+        item = speedcloud.job_manager.JobQueueItem(
+            job=schema.JobQueueJobDetails(
+                details={}, workflow=schema.JobWorkflow(id=1, name="counted")
+            ),
+            state=schema.JobState.QUEUED,
+            order=0,
+            job_id="1",
+            time_submitted=datetime.datetime.now(),
+        )
+        await queue.put(item)
+        await queue.put(None)
+        await runner.consume()
+        assert item.state == schema.JobState.SUCCESS
+        assert not (tmp_path / "1.checkpoint").exists()
+
+
+    @pytest.mark.asyncio
+    async def test_checkpoint_deleted_when_job_evicted(self, tmp_path):
+        store = speedcloud.checkpoint.CheckpointStore(str(tmp_path))
+        job_manager = speedcloud.job_manager.JobManager(
+            retention=speedcloud.job_manager.RetentionPolicy(
+                max_finished_jobs=0
+            ),
+            checkpoints=store,
+        )
+        item = await job_manager.add_job(Mock(id=1, name="dummy"), details={})
+        store.open(item.job_id).start_stage("main", 1)
+        assert (tmp_path / f"{item.job_id}.checkpoint").exists()
+        item.state = schema.JobState.FAILED
+        assert not (tmp_path / f"{item.job_id}.checkpoint").exists()
+
+
+class TestAdaptiveBatchSize:
+    def test_starts_with_one(self):
+        assert speedcloud.job_manager.AdaptiveBatchSize().size == 1
+
+    def test_grows_by_doubling_for_quick_tasks(self):
+        batch_size = speedcloud.job_manager.AdaptiveBatchSize(
+            target_duration=1
+        )
+        batch_size.record(count=1, elapsed=0.0001)
+        batch_size.record(count=2, elapsed=0.0002)
+        assert batch_size.size == 4
+
+    def test_shrinks_for_slow_tasks(self):
+        batch_size = speedcloud.job_manager.AdaptiveBatchSize(
+            target_duration=1
+        )
+        batch_size.size = 64
+        batch_size.record(count=64, elapsed=16)
+        assert batch_size.size == 4
+
+    def test_never_below_one(self):
+        batch_size = speedcloud.job_manager.AdaptiveBatchSize(
+            target_duration=0.1
+        )
+        batch_size.record(count=1, elapsed=10)
+        assert batch_size.size == 1
+
+    def test_capped_at_max_size(self):
+        batch_size = speedcloud.job_manager.AdaptiveBatchSize(max_size=3)
+        batch_size.size = 2
+        batch_size.record(count=2, elapsed=0)
+        assert batch_size.size == 3
+
+
+class TestBatchedSubtasks:
+
+    class QuickTask(speedwagon.tasks.Subtask):
+        def __init__(self, index: int) -> None:
+            super().__init__()
+            self.index = index
+
+        def work(self) -> bool:
+            self.set_results(self.index)
+            return True
+
+    class ManyTasksWorkflow(speedwagon.Workflow):
+        name = "many"
+
+        def discover_task_metadata(
+            self, initial_results, additional_data, user_args
+        ) -> List[dict]:
+            return [{"index": i} for i in range(200)]
+
+        def create_new_task(self, task_builder: TaskBuilder, job_args):
+            task_builder.add_subtask(
+                TestBatchedSubtasks.QuickTask(job_args["index"])
+            )
+
+        @classmethod
+        def generate_report(cls, results, user_args) -> Optional[str]:
+            return f"{sum(result.data for result in results)}"
+
+    @pytest.mark.parametrize("max_concurrent_subtasks", [1, 4])
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_fewer_status_updates(self, max_concurrent_subtasks):
+        executor = speedcloud.job_manager.AsyncJobExecutor(
+            '.',
+            max_concurrent_subtasks=max_concurrent_subtasks,
+            batch_subtasks=True
+        )
+        status_changes = []
+        executor.add_on_job_status_change_callback(status_changes.append)
+        executor.load_job(self.ManyTasksWorkflow, {})
+        assert await executor.execute_job() == schema.JobState.SUCCESS
+        progress_updates = [
+            status for status in status_changes if "progress" in status
+        ]
+        assert len(progress_updates) < 100
+        assert status_changes[-1]["report"] == str(sum(range(200)))
+        assert status_changes[-1]["progress"] == 100
+
+    @pytest.mark.parametrize("max_concurrent_subtasks", [1, 4])
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_progress_updated_after_each_batch(
+        self, max_concurrent_subtasks, monkeypatch
+    ):
+        monkeypatch.setattr(
+            speedcloud.job_manager.AdaptiveBatchSize, "record", Mock()
+        )
+        monkeypatch.setattr(
+            speedcloud.job_manager.AdaptiveBatchSize,
+            "__init__",
+            lambda self: setattr(self, "size", 1000)
+        )
+        executor = speedcloud.job_manager.AsyncJobExecutor(
+            '.',
+            max_concurrent_subtasks=max_concurrent_subtasks,
+            batch_subtasks=True
+        )
+        status_changes = []
+        executor.add_on_job_status_change_callback(status_changes.append)
+        executor.load_job(self.ManyTasksWorkflow, {})
+        await executor.execute_job()
+        progress = [
+            status["progress"] for status in status_changes
+            if "progress" in status and "report" not in status
+        ]
+        # Before the final status update
+        assert progress[-1] == 100
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_abort(self):
+        executor = speedcloud.job_manager.AsyncJobExecutor(
+            '.', batch_subtasks=True
+        )
+        executor.load_job(self.ManyTasksWorkflow, {})
+        executor.add_on_job_status_change_callback(
+            lambda _: executor._abort.set()
+        )
+        assert await executor.execute_job() == schema.JobState.ABORTED
+
+
 class TestJobContainer:
 
     @pytest.fixture()
     def job_container(self):
         return speedcloud.job_manager.JobContainer()
 
+    @staticmethod
+    def create_item(job_id, workflow_id=1, order=0,
+                    state=schema.JobState.QUEUED):
+        return speedcloud.job_manager.JobQueueItem(
+            job=schema.JobQueueJobDetails(
+                details={},
+                workflow=schema.JobWorkflow(id=workflow_id, name='foo')
+            ),
+            state=state,
+            order=order,
+            job_id=job_id,
+            time_submitted=datetime.datetime.now(),
+        )
+
     def test_empty_by_default(self, job_container):
         assert len(job_container) == 0
 
     def test_len_increase_when_adding(self, job_container):
-        job_container.add(Mock(spec=speedcloud.job_manager.JobQueueItem))
+        job_container.add(self.create_item("1"))
         assert len(job_container) == 1
 
+    def test_get(self, job_container):
+        item = self.create_item("1")
+        job_container.add(item)
+        assert job_container.get("1") is item
+
+    def test_get_missing_raises_key_error(self, job_container):
+        with pytest.raises(KeyError):
+            job_container.get("1")
+
+    def test_count_follows_state_changes(self, job_container):
+        item = self.create_item("1")
+        job_container.add(item)
+        item.state = schema.JobState.RUNNING
+        assert job_container.count(schema.JobState.QUEUED) == 0
+        assert job_container.count(schema.JobState.RUNNING) == 1
+
+    def test_state_counts_follow_state_changes(self, job_container):
+        item = self.create_item("1", 0)
+        job_container.add(item)
+        item.state = schema.JobState.RUNNING
+        counts = job_container.state_counts()
+        assert counts[schema.JobState.RUNNING] == 1
+        assert counts[schema.JobState.QUEUED] == 0
+        assert set(counts) == set(schema.JobState)
+
+    def test_filter_by_state(self, job_container):
+        job_container.add(self.create_item("1", order=0))
+        job_container.add(
+            self.create_item("2", order=1, state=schema.JobState.SUCCESS)
+        )
+        assert [
+            item.job_id
+            for item in job_container.filter(states=[schema.JobState.SUCCESS])
+        ] == ["2"]
+
+    def test_pop_next_in_order_added(self, job_container):
+        job_container.add(self.create_item("1", order=0))
+        job_container.add(self.create_item("2", order=1))
+        assert job_container.pop_next().job_id == "1"
+        assert job_container.pop_next().job_id == "2"
+        assert job_container.pop_next() is None
+
+    def test_pop_next_skips_jobs_no_longer_queued(self, job_container):
+        job_container.add(self.create_item("1", order=0))
+        job_container.add(self.create_item("2", order=1))
+        job_container.get("1").state = schema.JobState.ABORTED
+        assert job_container.pop_next().job_id == "2"
+
+    def test_pop_next_does_not_count_history(self, job_container):
+        job_container.add(self.create_item("1", order=0))
+        job_container.pop_next()
+        job_container.add(self.create_item("2", order=1))
+        assert job_container.pending_count() == 1
+
+    def test_retention_max_finished_jobs(self):
+        archive = Mock(spec=speedcloud.job_archive.JobArchive)
+        job_container = speedcloud.job_manager.JobContainer(
+            retention=speedcloud.job_manager.RetentionPolicy(
+                max_finished_jobs=1
+            ),
+            archive=archive
+        )
+        for i in range(3):
+            job_container.add(self.create_item(str(i), order=i))
+        job_container.get("0").state = schema.JobState.SUCCESS
+        job_container.get("1").state = schema.JobState.FAILED
+        assert "0" not in job_container
+        assert "1" in job_container
+        assert len(job_container.filter(states=[schema.JobState.SUCCESS])) == 0
+        archive.save.assert_called_once()
+
+    def test_retention_log_bytes(self):
+        job_container = speedcloud.job_manager.JobContainer(
+            retention=speedcloud.job_manager.RetentionPolicy(
+                max_total_log_bytes=10
+            ),
+        )
+        item = self.create_item("0")
+        item.status['logs'] = [{"msg": "a" * 11, "time": 0.0}]
+        job_container.add(item)
+        item.state = schema.JobState.SUCCESS
+        assert "0" not in job_container
+
+    def test_retention_keeps_unfinished_jobs(self):
+        job_container = speedcloud.job_manager.JobContainer(
+            retention=speedcloud.job_manager.RetentionPolicy(
+                max_finished_jobs=0
+            ),
+        )
+        job_container.add(self.create_item("0"))
+        job_container.enforce_retention()
+        assert "0" in job_container
+
+    def test_get_evicted_job_from_archive(self, tmp_path):
+        job_container = speedcloud.job_manager.JobContainer(
+            retention=speedcloud.job_manager.RetentionPolicy(
+                max_finished_jobs=0
+            ),
+            archive=speedcloud.job_archive.JobArchive(str(tmp_path))
+        )
+        item = self.create_item("0")
+        job_container.add(item)
+        item.state = schema.JobState.SUCCESS
+        assert "0" not in job_container
+        assert job_container.get("0").state == schema.JobState.SUCCESS
+
+    def test_next_order_after_eviction(self):
+        job_container = speedcloud.job_manager.JobContainer(
+            retention=speedcloud.job_manager.RetentionPolicy(
+                max_finished_jobs=0
+            ),
+        )
+        job_container.add(
+            self.create_item("0", state=schema.JobState.SUCCESS)
+        )
+        assert len(job_container) == 0
+        assert job_container.next_order == 1
+
+    def test_filter_by_state_and_workflow(self, job_container):
+        job_container.add(self.create_item("1", workflow_id=1, order=0))
+        job_container.add(self.create_item("2", workflow_id=2, order=1))
+        job_container.add(self.create_item("3", workflow_id=2, order=2))
+        job_container.get("3").state = schema.JobState.RUNNING
+        assert [
+            item.job_id
+            for item in job_container.filter(
+                states=[schema.JobState.QUEUED], workflow_id=2
+            )
+        ] == ["2"]
+
+
+class TestTaskGeneratorLogging:
+
+    class NamedTask(speedwagon.tasks.Subtask):
+        def __init__(self, name: str) -> None:
+            super().__init__()
+            self.task_name = name
+
+        def work(self) -> bool:
+            for _ in range(20):
+                self.log(self.task_name)
+            return True
+
+    class NamedWorkflow(speedwagon.Workflow):
+        name = "named"
+
+        def discover_task_metadata(
+            self, initial_results, additional_data, user_args
+        ) -> List[dict]:
+            return [user_args] * 3
+
+        def create_new_task(self, task_builder: TaskBuilder, job_args):
+            task_builder.add_subtask(
+                TestTaskGeneratorLogging.NamedTask(job_args["name"])
+            )
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(5)
+    async def test_jobs_running_together_keep_their_own_logs(self):
+        generators = {
+            name: speedcloud.job_manager.TaskGenerator(
+                self.NamedWorkflow(), {"name": name}
+            )
+            for name in ("spam", "eggs")
+        }
+        received: Dict[str, List[str]] = {name: [] for name in generators}
+        for name, generator in generators.items():
+            async def collect(logs, name=name):
+                received[name].extend(log["msg"] for log in logs)
+            generator.add_async_log_handler(collect)
+
+        def run(generator):
+            for task in generator:
+                task.exec()
+
+        await asyncio.gather(
+            *[asyncio.to_thread(run, gen) for gen in generators.values()]
+        )
+        for generator in generators.values():
+            await generator.flush_logs()
+        assert received["spam"].count("spam") == 60
+        assert "eggs" not in received["spam"]
+        assert received["eggs"].count("eggs") == 60
+        assert "spam" not in received["eggs"]
+
+    def test_job_logger_is_not_shared(self):
+        first = speedcloud.job_manager.TaskGenerator(self.NamedWorkflow(), {})
+        second = speedcloud.job_manager.TaskGenerator(
+            self.NamedWorkflow(), {}
+        )
+        assert first._job_logger is not second._job_logger
+        assert first._job_logger.propagate is False
+        assert len(first._job_logger.handlers) == 1
+
 
 def test_manager_job_log_handler():
     l = logging.Logger("spam")
@@ -0,0 +1,156 @@
+import asyncio
+import datetime
+
+import pytest
+
+from speedcloud.api import schema
+from speedcloud.job_manager import JobLog, JobManager, JobQueueItem
+from speedcloud.workflow_manager import WorkflowData
+from speedcloud.job_store import SQLiteJobStore
+
+
+@pytest.fixture()
+def store(tmp_path):
+    job_store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    job_store.start()
+    yield job_store
+    job_store.close()
+
+
+def create_item(job_id, order=0, state=schema.JobState.QUEUED):
+    return JobQueueItem(
+        job={
+            "details": {"Source": "/spam"},
+            "workflow": {"id": 1, "name": "spam"}
+        },
+        state=state,
+        order=order,
+        job_id=job_id,
+        time_submitted=datetime.datetime.now(),
+    )
+
+
+def test_uses_wal(store):
+    connection = store._connect()
+    try:
+        assert connection.execute(
+            "PRAGMA journal_mode"
+        ).fetchone()[0] == "wal"
+    finally:
+        connection.close()
+
+
+def test_save_and_load(store):
+    item = create_item("1")
+    store.save_job(item)
+    store.flush()
+    assert store.load() == [item]
+
+
+def test_state_and_logs(store):
+    item = create_item("1")
+    store.save_job(item)
+    store.update_state("1", schema.JobState.RUNNING)
+    store.append_logs("1", [JobLog(msg="spam", time=1.0)])
+    store.append_logs("1", [JobLog(msg="eggs", time=2.0)])
+    store.flush()
+    loaded, = store.load()
+    assert loaded.state == schema.JobState.RUNNING
+    assert [log["msg"] for log in loaded.status["logs"]] == ["spam", "eggs"]
+
+
+def test_update_status(store):
+    store.save_job(create_item("1"))
+    store.update_status("1", {"progress": 10.0})
+    store.update_status("1", {"progress": 20.0, "current_task": "spam"})
+    store.flush()
+    loaded, = store.load()
+    assert loaded.status["progress"] == 20.0
+    assert loaded.status["current_task"] == "spam"
+
+
+def test_delete(store):
+    store.save_job(create_item("1"))
+    store.append_logs("1", [JobLog(msg="spam", time=1.0)])
+    store.delete_job("1")
+    store.flush()
+    assert store.load() == []
+
+
+def test_close_writes_pending(tmp_path):
+    job_store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    job_store.start()
+    job_store.save_job(create_item("1"))
+    job_store.close()
+    assert len(SQLiteJobStore(str(tmp_path / "jobs.sqlite3")).load()) == 1
+
+
+class TestJobManagerRestore:
+
+    @pytest.mark.asyncio
+    async def test_changes_are_persisted(self, store):
+        job_manager = JobManager(asyncio.Queue(), store=store)
+        item = await job_manager.add_job(WorkflowData(1, "dummy"), details={})
+        item.state = schema.JobState.RUNNING
+        item.update_status({
+            "progress": 50.0,
+            "logs": [JobLog(msg="spam", time=1.0)]
+        })
+        store.flush()
+        loaded, = store.load()
+        assert loaded.state == schema.JobState.RUNNING
+        assert loaded.status["progress"] == 50.0
+        assert loaded.status["logs"] == [JobLog(msg="spam", time=1.0)]
+
+    @pytest.mark.asyncio
+    async def test_progress_saves_are_debounced(self, store, monkeypatch):
+        job_manager = JobManager(asyncio.Queue(), store=store)
+        item = await job_manager.add_job(WorkflowData(1, "dummy"), details={})
+        item.state = schema.JobState.RUNNING
+        store.flush()
+        updates = []
+        monkeypatch.setattr(
+            store,
+            "update_status",
+            lambda job_id, status: updates.append(status)
+        )
+        for progress in range(1, 101):
+            item.update_status({"progress": float(progress)})
+        assert updates == [{"progress": 1.0}]
+        item.state = schema.JobState.SUCCESS
+        assert updates[-1] == {"progress": 100.0, "current_task": None}
+
+    @pytest.mark.asyncio
+    async def test_restore(self, store):
+        store.save_job(create_item("queued", order=0))
+        store.save_job(
+            create_item("running", order=1, state=schema.JobState.RUNNING)
+        )
+        store.save_job(
+            create_item("done", order=2, state=schema.JobState.SUCCESS)
+        )
+        store.flush()
+
+        queue = asyncio.Queue()
+        job_manager = JobManager(queue, store=store)
+        assert job_manager.restore() == 3
+        assert job_manager.get_job_queue_item("running").state == \
+               schema.JobState.INTERRUPTED
+
+        job_manager.stop.set()
+        await job_manager.produce()
+        assert queue.get_nowait().job_id == "queued"
+        assert queue.empty()
+
+        store.flush()
+        states = {item.job_id: item.state for item in store.load()}
+        assert states["running"] == schema.JobState.INTERRUPTED
+
+    @pytest.mark.asyncio
+    async def test_new_jobs_ordered_after_restored(self, store):
+        store.save_job(create_item("queued", order=5))
+        store.flush()
+        job_manager = JobManager(asyncio.Queue(), store=store)
+        job_manager.restore()
+        item = await job_manager.add_job(WorkflowData(1, "dummy"), details={})
+        assert item.order == 6
@@ -0,0 +1,58 @@
+import dataclasses
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+
+from speedcloud import json_file
+
+
+@dataclasses.dataclass
+class Spam:
+    eggs: int
+
+
+def test_atomic_write_json(tmp_path):
+    path = tmp_path / "spam.json"
+    path.write_text("old")
+    json_file.atomic_write_json(str(path), {"spam": [Spam(eggs=1)]})
+    assert json.loads(path.read_text()) == {"spam": [{"eggs": 1}]}
+    assert [file.name for file in tmp_path.iterdir()] == ["spam.json"]
+
+
+class TestJsonFileWriter:
+    def test_close_writes_latest(self, tmp_path):
+        path = tmp_path / "spam.json"
+        writer = json_file.JsonFileWriter(str(path), delay=60)
+        writer.save([1])
+        writer.save([2])
+        assert not path.exists()
+        writer.close()
+        assert json.loads(path.read_text()) == [2]
+
+    def test_saves_are_combined(self, tmp_path):
+        path = tmp_path / "spam.json"
+        writer = json_file.JsonFileWriter(str(path), delay=60)
+        with patch.object(
+            json_file,
+            "atomic_write_json",
+            wraps=json_file.atomic_write_json
+        ) as write:
+            for value in range(100):
+                writer.save([value])
+            writer.flush()
+            writer.close()
+        write.assert_called_once_with(str(path), [99])
+
+    @pytest.mark.timeout(5)
+    def test_writes_after_delay(self, tmp_path):
+        path = tmp_path / "spam.json"
+        writer = json_file.JsonFileWriter(str(path), delay=0)
+        writer.save([1])
+        try:
+            while not path.exists():
+                time.sleep(0.01)
+            assert json.loads(path.read_text()) == [1]
+        finally:
+            writer.close()
@@ -195,4 +195,28 @@ def test_log_de_dup_context_manager():
                 JobLog(msg="something", time=1234),
             ]
         )
-    assert len(results) == 1
\ No newline at end of file
+    assert len(results) == 1
+
+class TestLogCursor:
+    def test_only_new_logs(self):
+        cursor = packets.LogCursor()
+        logs = [JobLog(msg="one", time=1)]
+        assert cursor.read_new(logs) == [JobLog(msg="one", time=1)]
+        assert cursor.read_new(logs) == []
+        logs.append(JobLog(msg="two", time=2))
+        assert cursor.read_new(logs) == [JobLog(msg="two", time=2)]
+        assert cursor.position == 2
+
+    def test_repeated_logs_kept(self):
+        cursor = packets.LogCursor()
+        logs = [JobLog(msg="something", time=1234)] * 2
+        assert len(cursor.read_new(logs)) == 2
+
+
+def test_memorized_packet_builder_sends_repeated_logs():
+    packet_builder = packets.MemorizedPacketBuilder()
+    for _ in range(2):
+        packet_builder.add_items(logs=[JobLog(msg="something", time=1234)])
+        assert json.loads(packet_builder.flush())["logs"] == [
+            {"msg": "something", "time": 1234}
+        ]
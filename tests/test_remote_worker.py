@@ -0,0 +1,321 @@
+import asyncio
+import contextlib
+import datetime
+import json
+import time
+from typing import List, Optional
+
+import pytest
+import speedwagon
+
+import speedcloud.job_manager
+import speedcloud.remote_worker
+from speedcloud.api import schema
+from speedcloud.workflow_manager import (
+    WorkflowData,
+    WorkflowManagerIdBaseOnSize,
+)
+
+
+class QuickTask(speedwagon.tasks.Subtask):
+    def work(self) -> bool:
+        self.log("hello from the worker")
+        self.set_results(1)
+        return True
+
+
+class SlowTask(speedwagon.tasks.Subtask):
+    def work(self) -> bool:
+        time.sleep(0.05)
+        return True
+
+
+class RemoteWorkflow(speedwagon.Workflow):
+    name = "remote test"
+    task_type = QuickTask
+
+    def discover_task_metadata(
+        self, initial_results, additional_data, user_args
+    ) -> List[dict]:
+        return [{} for _ in range(3)]
+
+    def create_new_task(self, task_builder, job_args):
+        task_builder.add_subtask(self.task_type())
+
+    @classmethod
+    def generate_report(cls, results, user_args) -> Optional[str]:
+        return f"{len(results)} done"
+
+
+class SlowRemoteWorkflow(RemoteWorkflow):
+    name = "slow remote test"
+    task_type = SlowTask
+
+    def discover_task_metadata(
+        self, initial_results, additional_data, user_args
+    ) -> List[dict]:
+        return [{} for _ in range(100)]
+
+
+def create_workflow_manager():
+    workflow_manager = WorkflowManagerIdBaseOnSize()
+    workflow_manager.add_workflow(RemoteWorkflow)
+    workflow_manager.add_workflow(SlowRemoteWorkflow)
+    return workflow_manager
+
+
+async def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting")
+        await asyncio.sleep(0.01)
+
+
+@contextlib.asynccontextmanager
+async def running_server(address="tcp://127.0.0.1:0", **kwargs):
+    queue = asyncio.Queue()
+    job_manager = speedcloud.job_manager.JobManager(queue)
+    server = speedcloud.remote_worker.RemoteWorkerServer(
+        queue, job_manager, address, heartbeat_interval=0.05, **kwargs
+    )
+    await server.start()
+    tasks = [
+        asyncio.create_task(job_manager.produce()),
+        asyncio.create_task(server.consume()),
+    ]
+    try:
+        yield server, job_manager
+    finally:
+        await server.close()
+        job_manager.shutdown()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def server_address(server):
+    host, port = server.sockets[0].getsockname()[:2]
+    return f"tcp://{host}:{port}"
+
+
+@contextlib.asynccontextmanager
+async def running_agents(address, count=1, workflow_manager=None):
+    agents = [
+        speedcloud.remote_worker.RemoteWorkerAgent(
+            address,
+            storage_root=".",
+            workflow_manager=workflow_manager or create_workflow_manager(),
+            name=f"worker {i}",
+        )
+        for i in range(count)
+    ]
+    tasks = [asyncio.create_task(agent.run()) for agent in agents]
+    try:
+        yield agents
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def fake_worker(server, token=None):
+    reader, writer = await asyncio.open_connection(
+        *server.sockets[0].getsockname()[:2]
+    )
+    writer.write(
+        speedcloud.remote_worker.encode_message(
+            {"type": "hello", "worker": "fake", "token": token}
+        )
+    )
+    return reader, writer
+
+
+def finished(*items):
+    return lambda: all(
+        item.state in speedcloud.job_manager.FINISHED_STATES for item in items
+    )
+
+
+@pytest.mark.parametrize(
+    "address, expected",
+    [
+        ("tcp://127.0.0.1:8765", ("tcp", "127.0.0.1", "8765")),
+        ("tcp://[::1]:8765", ("tcp", "::1", "8765")),
+        ("unix:///tmp/speedcloud.sock", ("unix", "/tmp/speedcloud.sock")),
+    ]
+)
+def test_parse_address(address, expected):
+    assert speedcloud.remote_worker.parse_address(address) == expected
+
+
+@pytest.mark.parametrize(
+    "address", ["127.0.0.1:8765", "tcp://127.0.0.1", "http://spam:80"]
+)
+def test_parse_invalid_address(address):
+    with pytest.raises(ValueError):
+        speedcloud.remote_worker.parse_address(address)
+
+
+def test_status_round_trip():
+    status = speedcloud.job_manager.JobStatus(
+        progress=50.0,
+        start_time=datetime.datetime.now(),
+        logs=[speedcloud.job_manager.JobLog(msg="spam", time=1.0)],
+    )
+    encoded = json.loads(
+        json.dumps(speedcloud.remote_worker.encode_status(status))
+    )
+    assert speedcloud.remote_worker.decode_status(encoded) == status
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(10)
+async def test_jobs_run_on_several_workers():
+    async with running_server() as (server, job_manager):
+        async with running_agents(server_address(server), count=3):
+            await wait_until(lambda: server.workers == 3)
+            items = [
+                await job_manager.add_job(
+                    WorkflowData(id=0, name="remote test"), details={}
+                )
+                for _ in range(6)
+            ]
+            await wait_until(finished(*items))
+    for item in items:
+        assert item.state == schema.JobState.SUCCESS
+        assert item.status["report"] == "3 done"
+        assert item.status["progress"] == 100
+        assert "hello from the worker" in [
+            log["msg"] for log in item.status["logs"]
+        ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(10)
+async def test_unix_socket(tmp_path):
+    address = f"unix://{tmp_path / 'workers.sock'}"
+    async with running_server(address) as (server, job_manager):
+        async with running_agents(address):
+            item = await job_manager.add_job(
+                WorkflowData(id=0, name="remote test"), details={}
+            )
+            await wait_until(finished(item))
+    assert item.state == schema.JobState.SUCCESS
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(10)
+async def test_worker_disconnecting_requeues_job():
+    async with running_server() as (server, job_manager):
+        reader, writer = await fake_worker(server)
+        writer.write(speedcloud.remote_worker.encode_message({"type": "lease"}))
+        item = await job_manager.add_job(
+            WorkflowData(id=0, name="remote test"), details={}
+        )
+        welcome = await speedcloud.remote_worker.read_message(reader)
+        assert welcome["type"] == "welcome"
+        leased = await speedcloud.remote_worker.read_message(reader)
+        assert leased["job"]["job_id"] == item.job_id
+        assert server.is_running(item.job_id)
+
+        writer.close()
+        await wait_until(lambda: not server.is_running(item.job_id))
+        assert item.state == schema.JobState.QUEUED
+
+        async with running_agents(server_address(server)):
+            await wait_until(finished(item))
+    assert item.state == schema.JobState.SUCCESS
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(10)
+async def test_lease_expires_without_heartbeat():
+    async with running_server(lease_timeout=0.2) as (server, job_manager):
+        reader, writer = await fake_worker(server)
+        writer.write(speedcloud.remote_worker.encode_message({"type": "lease"}))
+        item = await job_manager.add_job(
+            WorkflowData(id=0, name="remote test"), details={}
+        )
+        await wait_until(lambda: server.is_running(item.job_id))
+        writer.write(
+            speedcloud.remote_worker.encode_message(
+                {
+                    "type": "state",
+                    "job_id": item.job_id,
+                    "state": "running",
+                }
+            )
+        )
+        await wait_until(lambda: item.state == schema.JobState.RUNNING)
+        await wait_until(lambda: server.workers == 0)
+        assert item.state == schema.JobState.QUEUED
+        writer.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(10)
+async def test_abort_remote_job():
+    async with running_server() as (server, job_manager):
+        async with running_agents(server_address(server)):
+            item = await job_manager.add_job(
+                WorkflowData(id=1, name="slow remote test"), details={}
+            )
+            await wait_until(lambda: item.state == schema.JobState.RUNNING)
+            job_manager.set_job_state(item.job_id, schema.JobState.STOPPING)
+            server.abort(item.job_id)
+            await wait_until(finished(item))
+    assert item.state == schema.JobState.ABORTED
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(10)
+async def test_job_aborted_after_handoff_is_not_leased():
+    async with running_server() as (server, job_manager):
+        aborted, item = [
+            await job_manager.add_job(
+                WorkflowData(id=0, name="remote test"), details={}
+            )
+            for _ in range(2)
+        ]
+        await wait_until(lambda: server._job_queue.qsize() == 2)
+        job_manager.set_job_state(aborted.job_id, schema.JobState.ABORTED)
+        async with running_agents(server_address(server)):
+            await wait_until(finished(item))
+    assert item.state == schema.JobState.SUCCESS
+    assert aborted.state == schema.JobState.ABORTED
+    assert aborted.status["progress"] is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(10)
+async def test_abort_job_not_leased_raises():
+    async with running_server() as (server, _):
+        with pytest.raises(speedcloud.exceptions.JobAlreadyAborted):
+            server.abort("not a job")
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(10)
+async def test_invalid_token_is_refused():
+    async with running_server(token="secret") as (server, _):
+        reader, writer = await fake_worker(server, token="wrong")
+        assert await speedcloud.remote_worker.read_message(reader) is None
+        assert server.workers == 0
+        writer.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(10)
+async def test_unknown_workflow_fails_job():
+    async with running_server() as (server, job_manager):
+        async with running_agents(
+            server_address(server),
+            workflow_manager=WorkflowManagerIdBaseOnSize()
+        ):
+            item = await job_manager.add_job(
+                WorkflowData(id=0, name="remote test"), details={}
+            )
+            await wait_until(finished(item))
+    assert item.state == schema.JobState.FAILED
+    assert "not available" in item.status["logs"][-1]["msg"]
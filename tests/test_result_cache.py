@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from speedcloud.job_manager import JobLog
+from speedcloud.result_cache import CachedResult, ResultCache, fingerprint_path
+
+
+def create_result(report="done", msg="spam"):
+    return CachedResult(report=report, logs=[JobLog(msg=msg, time=1.0)])
+
+
+def test_put_and_get():
+    cache = ResultCache()
+    cache.put("key", create_result())
+    assert cache.get("key") == create_result()
+    assert cache.get("other") is None
+
+
+def test_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", create_result())
+    cache.put("b", create_result())
+    cache.get("a")
+    cache.put("c", create_result())
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+
+
+def test_evicts_over_max_bytes():
+    cache = ResultCache(max_bytes=10)
+    cache.put("a", create_result(report="12345"))
+    cache.put("b", create_result(report="67890"))
+    assert len(cache) == 1
+    assert "b" in cache
+
+
+def test_saved_to_file(tmp_path):
+    path = str(tmp_path / "cache.json")
+    ResultCache(path=path).put("key", create_result())
+    assert ResultCache(path=path).get("key") == create_result()
+
+
+def test_background_writes(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResultCache(path=path, background_writes=True)
+    cache.put("key", create_result())
+    cache.close()
+    assert ResultCache(path=path).get("key") == create_result()
+
+
+def test_invalid_file_ignored(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text("not json")
+    assert len(ResultCache(path=str(path))) == 0
+
+
+@pytest.mark.parametrize(
+    "workflows, expected",
+    [
+        (None, True),
+        (["foo"], True),
+        (["bar"], False),
+    ]
+)
+def test_is_enabled_for(workflows, expected):
+    assert ResultCache(workflows=workflows).is_enabled_for("foo") is expected
+
+
+def test_key_depends_on_options():
+    assert ResultCache.make_key("foo", {"a": 1}) == \
+        ResultCache.make_key("foo", {"a": 1})
+    assert ResultCache.make_key("foo", {"a": 1}) != \
+        ResultCache.make_key("foo", {"a": 2})
+    assert ResultCache.make_key("foo", {"a": 1}) != \
+        ResultCache.make_key("bar", {"a": 1})
+
+
+def test_key_changes_when_directory_content_changes(tmp_path):
+    (tmp_path / "one.txt").write_text("spam")
+    key = ResultCache.make_key("foo", {}, [str(tmp_path)])
+    assert ResultCache.make_key("foo", {}, [str(tmp_path)]) == key
+    (tmp_path / "two.txt").write_text("eggs")
+    assert ResultCache.make_key("foo", {}, [str(tmp_path)]) != key
+
+
+def test_fingerprint_missing_path(tmp_path):
+    path = str(tmp_path / "missing")
+    assert fingerprint_path(path) == [(path, -1, -1)]
+
+
+def test_fingerprint_file(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("spam")
+    stat = os.stat(path)
+    assert fingerprint_path(str(path)) == \
+        [(str(path), 4, stat.st_mtime_ns)]
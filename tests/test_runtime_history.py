@@ -0,0 +1,72 @@
+import pytest
+
+from speedcloud.runtime_history import (
+    JobRuntime,
+    RuntimeHistory,
+    measure_input_size,
+)
+
+
+class TestRuntimeHistory:
+    def test_no_history(self):
+        assert RuntimeHistory().estimate("spam") is None
+
+    def test_average_duration(self):
+        history = RuntimeHistory()
+        history.record("spam", JobRuntime(duration=10))
+        history.record("spam", JobRuntime(duration=20))
+        assert history.estimate("spam") == 15
+        assert history.estimate("spam", input_size=100) == 15
+
+    def test_scaled_by_input_size(self):
+        history = RuntimeHistory()
+        history.record("spam", JobRuntime(duration=10, input_size=100))
+        history.record("spam", JobRuntime(duration=30, input_size=300))
+        assert history.estimate("spam", input_size=1000) == 100
+        assert history.estimate("spam") == 20
+
+    def test_max_samples(self):
+        history = RuntimeHistory(max_samples=2)
+        for duration in (1, 2, 3):
+            history.record("spam", JobRuntime(duration=duration))
+        assert [
+            runtime.duration for runtime in history.runtimes("spam")
+        ] == [2, 3]
+
+    def test_saved(self, tmp_path):
+        path = str(tmp_path / "runtime_history.json")
+        history = RuntimeHistory(path=path)
+        history.record(
+            "spam", JobRuntime(duration=10, subtask_count=3, input_size=5)
+        )
+        restored = RuntimeHistory(path=path)
+        assert "spam" in restored
+        assert restored.runtimes("spam") == history.runtimes("spam")
+
+    def test_background_writes(self, tmp_path):
+        path = tmp_path / "runtime_history.json"
+        history = RuntimeHistory(path=str(path), background_writes=True)
+        for duration in (1, 2, 3):
+            history.record("spam", JobRuntime(duration=duration))
+        history.close()
+        restored = RuntimeHistory(path=str(path))
+        assert restored.runtimes("spam") == history.runtimes("spam")
+
+    def test_invalid_file_ignored(self, tmp_path):
+        path = tmp_path / "runtime_history.json"
+        path.write_text("{")
+        assert "spam" not in RuntimeHistory(path=str(path))
+
+
+@pytest.mark.parametrize("paths, expected", [([], None), (["nothing"], 0)])
+def test_measure_input_size_without_files(paths, expected):
+    assert measure_input_size(paths) == expected
+
+
+def test_measure_input_size(tmp_path):
+    (tmp_path / "folder").mkdir()
+    (tmp_path / "folder" / "a.txt").write_bytes(b"12345")
+    (tmp_path / "b.txt").write_bytes(b"123")
+    assert measure_input_size(
+        [str(tmp_path / "folder"), str(tmp_path / "b.txt")]
+    ) == 8
@@ -0,0 +1,189 @@
+import datetime
+
+import pytest
+
+from speedcloud import scheduler
+from speedcloud.api import schema
+from speedcloud.job_manager import JobQueueItem
+from speedcloud.runtime_history import JobRuntime, RuntimeHistory
+
+
+def create_item(
+    job_id,
+    order,
+    priority=0,
+    submitter=None,
+    workflow="spam",
+    time_submitted=None,
+):
+    return JobQueueItem(
+        job=schema.JobQueueJobDetails(
+            details={},
+            workflow=schema.JobWorkflow(id=0, name=workflow)
+        ),
+        state=schema.JobState.QUEUED,
+        order=order,
+        job_id=job_id,
+        time_submitted=time_submitted or datetime.datetime.now(),
+        priority=priority,
+        submitter=submitter,
+    )
+
+
+def drain(job_scheduler):
+    results = []
+    while (item := job_scheduler.pop()) is not None:
+        results.append(item.job_id)
+    return results
+
+
+class TestFIFOScheduler:
+    def test_order(self):
+        job_scheduler = scheduler.FIFOScheduler()
+        job_scheduler.push(create_item("b", order=1, priority=10))
+        job_scheduler.push(create_item("a", order=0))
+        assert drain(job_scheduler) == ["a", "b"]
+
+    def test_discard(self):
+        job_scheduler = scheduler.FIFOScheduler()
+        job_scheduler.push(create_item("a", order=0))
+        job_scheduler.push(create_item("b", order=1))
+        job_scheduler.discard("a")
+        assert len(job_scheduler) == 1
+        assert drain(job_scheduler) == ["b"]
+
+
+class TestPriorityScheduler:
+    def test_highest_priority_first(self):
+        job_scheduler = scheduler.PriorityScheduler()
+        job_scheduler.push(create_item("a", order=0))
+        job_scheduler.push(create_item("b", order=1, priority=5))
+        job_scheduler.push(create_item("c", order=2, priority=5))
+        assert drain(job_scheduler) == ["b", "c", "a"]
+
+    def test_reprioritize(self):
+        job_scheduler = scheduler.PriorityScheduler()
+        item = create_item("a", order=0)
+        job_scheduler.push(item)
+        job_scheduler.push(create_item("b", order=1, priority=5))
+        job_scheduler.reprioritize(item, 10)
+        assert item.priority == 10
+        assert len(job_scheduler) == 2
+        assert drain(job_scheduler) == ["a", "b"]
+
+
+class TestFairShareScheduler:
+    def test_alternates_between_submitters(self):
+        job_scheduler = scheduler.create_scheduler("fair_share_submitter")
+        for i in range(3):
+            job_scheduler.push(create_item(f"a{i}", order=i, submitter="a"))
+        job_scheduler.push(create_item("b0", order=3, submitter="b"))
+        assert drain(job_scheduler) == ["a0", "b0", "a1", "a2"]
+
+    def test_weights(self):
+        job_scheduler = scheduler.create_scheduler(
+            "fair_share_submitter",
+            weights={"a": 2}
+        )
+        for i in range(4):
+            job_scheduler.push(create_item(f"a{i}", order=i, submitter="a"))
+            job_scheduler.push(
+                create_item(f"b{i}", order=4 + i, submitter="b")
+            )
+        assert drain(job_scheduler)[:6] == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+    def test_idle_group_does_not_bank_credit(self):
+        job_scheduler = scheduler.create_scheduler("fair_share_workflow")
+        for i in range(3):
+            job_scheduler.push(create_item(f"a{i}", order=i, workflow="a"))
+        assert job_scheduler.pop().job_id == "a0"
+        assert job_scheduler.pop().job_id == "a1"
+        job_scheduler.push(create_item("b0", order=3, workflow="b"))
+        job_scheduler.push(create_item("b1", order=4, workflow="b"))
+        assert drain(job_scheduler) == ["b0", "a2", "b1"]
+
+    def test_reprioritize_within_group(self):
+        job_scheduler = scheduler.create_scheduler("fair_share_submitter")
+        first = create_item("a0", order=0, submitter="a")
+        job_scheduler.push(first)
+        job_scheduler.push(create_item("a1", order=1, submitter="a"))
+        job_scheduler.reprioritize(job_scheduler_item := first, -1)
+        assert job_scheduler_item.priority == -1
+        assert drain(job_scheduler) == ["a1", "a0"]
+
+
+class TestShortestJobFirstScheduler:
+    @pytest.fixture
+    def runtime_history(self):
+        history = RuntimeHistory()
+        history.record("short", JobRuntime(duration=10))
+        history.record("long", JobRuntime(duration=1000))
+        return history
+
+    def test_shortest_first(self, runtime_history):
+        job_scheduler = scheduler.create_scheduler(
+            "shortest_job_first", runtime_history=runtime_history, aging=0
+        )
+        job_scheduler.push(create_item("a", order=0, workflow="long"))
+        job_scheduler.push(create_item("b", order=1, workflow="short"))
+        job_scheduler.push(create_item("c", order=2, workflow="unknown"))
+        assert drain(job_scheduler) == ["c", "b", "a"]
+
+    def test_waiting_jobs_age(self, runtime_history):
+        job_scheduler = scheduler.create_scheduler(
+            "shortest_job_first", runtime_history=runtime_history, aging=1
+        )
+        now = datetime.datetime.now()
+        job_scheduler.push(
+            create_item(
+                "a",
+                order=0,
+                workflow="long",
+                time_submitted=now - datetime.timedelta(hours=1),
+            )
+        )
+        job_scheduler.push(
+            create_item("b", order=1, workflow="short", time_submitted=now)
+        )
+        assert drain(job_scheduler) == ["a", "b"]
+
+    def test_priority_first(self, runtime_history):
+        job_scheduler = scheduler.create_scheduler(
+            "shortest_job_first", runtime_history=runtime_history, aging=0
+        )
+        job_scheduler.push(create_item("a", order=0, workflow="short"))
+        job_scheduler.push(
+            create_item("b", order=1, workflow="long", priority=1)
+        )
+        assert drain(job_scheduler) == ["b", "a"]
+
+    def test_needs_runtime_history(self):
+        with pytest.raises(ValueError):
+            scheduler.create_scheduler("shortest_job_first")
+
+    def test_uses_input_size(self, runtime_history):
+        assert scheduler.create_scheduler(
+            "shortest_job_first", runtime_history=runtime_history
+        ).uses_input_size
+        assert not scheduler.create_scheduler("fifo").uses_input_size
+
+
+@pytest.mark.parametrize(
+    "policy", ["fifo", "priority", "fair_share_submitter"]
+)
+def test_ordered_matches_dispatch_order(policy):
+    job_scheduler = scheduler.create_scheduler(policy)
+    for i in range(4):
+        job_scheduler.push(
+            create_item(f"a{i}", order=i, priority=i % 2, submitter="a")
+        )
+    job_scheduler.push(create_item("b0", order=4, submitter="b"))
+    job_scheduler.discard("a3")
+    ordered = [item.job_id for item in job_scheduler.ordered()]
+    assert len(job_scheduler) == 4
+    assert ordered == drain(job_scheduler)
+
+
+def test_create_scheduler_invalid_policy():
+    with pytest.raises(ValueError):
+        scheduler.create_scheduler("bogus")
@@ -1,10 +1,13 @@
 import asyncio
 import datetime
 import json
+import threading
 from unittest.mock import Mock
 import dataclasses
 from speedcloud.api import stream, schema
+from speedcloud.job_logs import JobLogs
 from speedcloud.job_manager import (
+    AsyncEventNotifier,
     JobQueueItem,
     JobRunner,
     JobStatus,
@@ -45,6 +48,31 @@ async def test_job_progress_packet_generator_first_packet(queued_item, fake_job_
     assert res['job_id'] == fake_job_id
 
 
+@pytest.mark.asyncio
+async def test_job_progress_packet_generator_old_logs_read_off_loop(
+        queued_item, tmp_path, monkeypatch
+):
+    logs = JobLogs(
+        [JobLog(msg=str(index), time=0.0) for index in range(5)],
+        path=str(tmp_path / "logs.jsonl"),
+        tail_size=2
+    )
+    queued_item.status['logs'] = logs
+    read_raw = logs.read_raw
+    threads = []
+
+    def read_raw_in_thread(*args):
+        threads.append(threading.get_ident())
+        return read_raw(*args)
+
+    monkeypatch.setattr(logs, "read_raw", read_raw_in_thread)
+    gen = stream.job_progress_packet_generator(queued_item, Mock(JobRunner))
+    res = json.loads(await anext(gen))
+    assert [log['msg'] for log in res['logs']] == ["0", "1", "2", "3", "4"]
+    assert threads and threading.get_ident() not in threads
+    await gen.aclose()
+
+
 @pytest.mark.asyncio
 @pytest.mark.timeout(5)
 @pytest.mark.parametrize(
@@ -90,6 +118,77 @@ async def test_job_progress_packet_generator_final_packet(queued_item):
     assert res['progress'] == 100
 
 
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_job_progress_packet_generator_max_update_rate(
+        queued_item, monkeypatch
+):
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        sleeps.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(stream.asyncio, "sleep", sleep)
+    runner = Mock(spec=JobRunner)
+    gen = stream.job_progress_packet_generator(
+        queued_item, runner, max_update_rate=10
+    )
+    await anext(gen)
+    queued_item.status['progress'] = 1.0
+    await anext(gen)
+    assert sleeps == []
+
+    # Every change made while waiting is sent together in the next packet
+    next_packet = anext(gen)
+    queued_item.status['progress'] = 2.0
+    queued_item.status['current_task'] = "spam"
+    [watcher] = runner.add_async_watcher.call_args.args
+    await watcher.notify()
+    res = json.loads(await next_packet)
+    assert sleeps == [0.1]
+    assert res['progress'] == 2.0
+    assert res['currentTask'] == "spam"
+
+    final_packet = anext(gen)
+    queued_item.state = schema.JobState.SUCCESS
+    queued_item.status['progress'] = 100
+    await watcher.notify()
+    assert json.loads(await final_packet)['progress'] == 100
+    await gen.aclose()
+
+
+@pytest.mark.asyncio
+async def test_job_progress_packet_generator_stops_watching_when_closed(
+        queued_item
+):
+    runner = Mock(spec=JobRunner)
+    gen = stream.job_progress_packet_generator(queued_item, runner)
+    await anext(gen)
+    await gen.aclose()
+    [watcher] = runner.add_async_watcher.call_args.args
+    runner.remove_async_watcher.assert_called_once_with(watcher)
+
+
+@pytest.mark.asyncio
+async def test_only_new_data_closes_wrapped_generator():
+    closed = []
+
+    @stream.only_new_data
+    async def data():
+        try:
+            yield 5
+            yield 6
+        finally:
+            closed.append(True)
+
+    gen = data()
+    assert await anext(gen) == 5
+    await gen.aclose()
+    assert closed == [True]
+
+
 @pytest.mark.asyncio
 async def test_only_new_data():
     @stream.only_new_data
@@ -102,6 +201,31 @@ async def test_only_new_data():
     assert await anext(gen) == 5
     assert await anext(gen) == 6
 
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_wait_for_first_prereq_cancelled_stops_waiting():
+    waiters = []
+
+    async def wait():
+        async with stream.wait_for_first_prereq(
+            [
+                stream.WaitForAsyncEvent(
+                    AsyncEventNotifier(), name="never notified"
+                )
+            ]
+        ) as waiter:
+            waiters.append(waiter)
+
+    task = asyncio.create_task(wait())
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    waiter, = waiters
+    await asyncio.wait(waiter._tasks)
+    assert all(waiting.cancelled() for waiting in waiter._tasks)
+
+
 @pytest.fixture()
 def workflow_data():
     return WorkflowData(id=0, name="spam")
@@ -126,11 +250,130 @@ async def test_get_job_queue_data(job_manager_with_job, workflow_data):
     assert results[0]["job"]['workflow']['id'] == workflow_data.id
 
 
-@pytest.mark.asyncio
-async def test_stream_jobs_starts_with_job_info(job_manager_with_job, job_manager_shared_queue, workflow_data):
-    job_runner = JobRunner(job_manager_shared_queue, storage_root='.')
-    streamer = stream.stream_jobs(await job_manager_with_job, job_runner)
-    initial_packets = await anext(streamer)
-    assert len(initial_packets) == 1
-    assert initial_packets[0]['job']['workflow'] == dataclasses.asdict(workflow_data)
+class TestJobQueueSnapshots:
+    @pytest.fixture()
+    async def snapshots(self, job_manager_with_job, job_manager_shared_queue):
+        job_runner = JobRunner(job_manager_shared_queue, storage_root='.')
+        return stream.JobQueueSnapshots(
+            await job_manager_with_job, job_runner
+        )
+
+    @pytest.mark.asyncio
+    async def test_reused_until_changed(self, snapshots, workflow_data):
+        snapshots = await snapshots
+        first = snapshots.current()
+        assert snapshots.current() is first
+        assert json.loads(first.data)[0]['job']['workflow'] == \
+            dataclasses.asdict(workflow_data)
+
+        await snapshots.job_manager.add_job(workflow_data, details={})
+        second = snapshots.current()
+        assert second.version == first.version + 1
+        assert len(json.loads(second.data)) == 2
+
+    @pytest.mark.asyncio
+    async def test_same_version_if_nothing_changed(self, snapshots):
+        snapshots = await snapshots
+        first = snapshots.current()
+        await snapshots.job_runner._notification_manager.notify_async()
+        second = snapshots.current()
+        assert second is first
+
+    @pytest.mark.asyncio
+    async def test_stream(self, snapshots):
+        snapshots = await snapshots
+        streamer = stream.stream_job_snapshots(snapshots)
+        assert await anext(streamer) == snapshots.current()
+        await streamer.aclose()
+        snapshots.close()
+        assert len(snapshots.job_manager._notification_manager) == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_starts_with_job_info(self, snapshots, workflow_data):
+        snapshots = await snapshots
+        streamer = stream.stream_job_snapshots(snapshots)
+        jobs = json.loads((await anext(streamer)).data)
+        assert len(jobs) == 1
+        assert jobs[0]['job']['workflow'] == dataclasses.asdict(workflow_data)
+        await streamer.aclose()
+
+    @pytest.mark.asyncio
+    async def test_stream_stops_watching_when_closed(self, snapshots):
+        snapshots = await snapshots
+        streamer = stream.stream_job_snapshots(snapshots)
+        await anext(streamer)
+        assert len(snapshots.job_manager._notification_manager) == 2
+        assert len(snapshots.job_runner._notification_manager) == 2
+        await streamer.aclose()
+        assert len(snapshots.job_manager._notification_manager) == 1
+        assert len(snapshots.job_runner._notification_manager) == 1
+
+    @pytest.mark.asyncio
+    async def test_delta_has_only_changed_jobs(self, snapshots, workflow_data):
+        snapshots = await snapshots
+        first = snapshots.current()
+        new_job = \
+            await snapshots.job_manager.add_job(workflow_data, details={})
+        second = snapshots.current()
+        delta = json.loads(second.delta)
+        assert delta['type'] == 'delta'
+        assert delta['sequence'] == second.version
+        assert [job['job_id'] for job in delta['changed']] == [new_job.job_id]
+        assert delta['removed'] == []
+        assert snapshots.deltas_since(first.version) == [second.delta]
+        assert snapshots.deltas_since(second.version) == []
+
+    @pytest.mark.asyncio
+    async def test_abort_queued_job_shows_up(self, snapshots):
+        snapshots = await snapshots
+        job, = json.loads(snapshots.current().data)
+        await snapshots.job_manager.abort_queued(job['job_id'])
+        job, = json.loads(snapshots.current().data)
+        assert job['state'] == schema.JobState.ABORTED.value
+
+    @pytest.mark.asyncio
+    async def test_resumed_job_shows_up(self, snapshots):
+        snapshots = await snapshots
+        item, = snapshots.job_manager.job_queue()
+        item.state = schema.JobState.FAILED
+        await snapshots.job_manager._notification_manager.notify_async()
+        snapshots.current()
+        await snapshots.job_manager.resume(item.job_id)
+        job, = json.loads(snapshots.current().data)
+        assert job['state'] == schema.JobState.QUEUED.value
+
+    @pytest.mark.asyncio
+    async def test_requeued_job_shows_up(self, snapshots):
+        snapshots = await snapshots
+        item, = snapshots.job_manager.job_queue()
+        item.state = schema.JobState.RUNNING
+        await snapshots.job_manager._notification_manager.notify_async()
+        snapshots.current()
+        await snapshots.job_manager.requeue(item.job_id)
+        job, = json.loads(snapshots.current().data)
+        assert job['state'] == schema.JobState.QUEUED.value
+
+    @pytest.mark.asyncio
+    async def test_deltas_since_too_old(self, snapshots, workflow_data):
+        snapshots = await snapshots
+        snapshots.current()
+        assert snapshots.deltas_since(0) is None
+
+    @pytest.mark.asyncio
+    async def test_delta_stream_starts_with_snapshot(self, snapshots):
+        snapshots = await snapshots
+        streamer = stream.stream_job_deltas(snapshots)
+        message = json.loads(await anext(streamer))
+        assert message['type'] == 'snapshot'
+        assert message['sequence'] == snapshots.current().version
+        assert message['jobs'] == json.loads(snapshots.current().data)
+        await streamer.aclose()
+        snapshots.close()
+        assert len(snapshots.job_manager._notification_manager) == 0
+
 
+def test_snapshots_compared_by_version():
+    assert stream.JobQueueSnapshot(1, "spam") == \
+        stream.JobQueueSnapshot(1, "spam")
+    assert stream.JobQueueSnapshot(1, "spam") != \
+        stream.JobQueueSnapshot(2, "spam")
@@ -0,0 +1,98 @@
+import concurrent.futures
+import os
+import time
+from unittest.mock import Mock
+
+import pytest
+import speedwagon
+from speedwagon.tasks.tasks import TaskStatus
+
+import speedcloud.subtask_runner
+
+
+class SpySubtask(speedwagon.tasks.Subtask):
+    def work(self) -> bool:
+        self.log("working")
+        self.set_results({"pid": os.getpid()})
+        return True
+
+
+class FailingSubtask(speedwagon.tasks.Subtask):
+    def work(self) -> bool:
+        self.log("about to fail")
+        raise ValueError("nope")
+
+
+class UnpicklableSubtask(SpySubtask):
+    def __init__(self):
+        super().__init__()
+        self.callback = lambda: None
+
+
+class WaitForLogSubtask(speedwagon.tasks.Subtask):
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def work(self) -> bool:
+        self.log("started")
+        deadline = time.monotonic() + 2
+        while not os.path.exists(self.path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.set_results(os.path.exists(self.path))
+        return True
+
+
+@pytest.fixture(scope="module")
+def process_pool():
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1) as pool:
+        yield pool
+
+
+def test_thread_runner_runs_task():
+    task = SpySubtask()
+    log = Mock()
+    speedcloud.subtask_runner.ThreadSubtaskRunner().run(task, log)
+    assert task.results == {"pid": os.getpid()}
+    log.assert_called_once_with("working")
+
+
+class TestProcessSubtaskRunner:
+    def test_results_come_back(self, process_pool):
+        task = SpySubtask()
+        speedcloud.subtask_runner.ProcessSubtaskRunner(process_pool).run(
+            task, Mock()
+        )
+        assert task.results["pid"] != os.getpid()
+        assert task.status == TaskStatus.SUCCESS
+
+    def test_logs_come_back(self, process_pool):
+        log = Mock()
+        speedcloud.subtask_runner.ProcessSubtaskRunner(process_pool).run(
+            SpySubtask(), log
+        )
+        log.assert_called_once_with("working")
+
+    @pytest.mark.timeout(10)
+    def test_logs_passed_on_while_running(self, process_pool, tmp_path):
+        # The subtask only finishes quickly once its log message was seen
+        path = tmp_path / "seen"
+        task = WaitForLogSubtask(str(path))
+        speedcloud.subtask_runner.ProcessSubtaskRunner(process_pool).run(
+            task, lambda message: path.touch()
+        )
+        assert task.results is True
+
+    def test_errors_are_raised_after_logs(self, process_pool):
+        log = Mock()
+        runner = speedcloud.subtask_runner.ProcessSubtaskRunner(process_pool)
+        with pytest.raises(ValueError):
+            runner.run(FailingSubtask(), log)
+        log.assert_called_once_with("about to fail")
+
+    def test_unpicklable_task_runs_in_thread(self, process_pool):
+        task = UnpicklableSubtask()
+        speedcloud.subtask_runner.ProcessSubtaskRunner(process_pool).run(
+            task, Mock()
+        )
+        assert task.results == {"pid": os.getpid()}